@@ -0,0 +1,48 @@
+"""Hot predicate indexes (skins.owner_id, transactions(user_id, date DESC))
+
+Revision ID: 5d8f0b2c6e41
+Revises: c7e2d45a9f10
+Create Date: 2026-10-17 12:24:09.731560
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d8f0b2c6e41'
+down_revision: Union[str, Sequence[str], None] = 'c7e2d45a9f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY não pode correr dentro de uma transação: o
+    # autocommit_block termina a transação da migração e cria os índices sem
+    # bloquear escritas nas tabelas. O índice único em marketplace.skin_id é
+    # criado da mesma forma em c7e2d45a9f10.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_skins_owner_id', 'skins', ['owner_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_transactions_user_id_date', 'transactions', ['user_id', sa.text('date DESC')],
+            unique=False, postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_transactions_user_id_date', table_name='transactions',
+            postgresql_concurrently=True, if_exists=True
+        )
+        op.drop_index(
+            'ix_skins_owner_id', table_name='skins',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,62 @@
+"""Append-only ledger (integer cents) and per-user balance snapshots
+
+Revision ID: 8e4a1c7d3f52
+Revises: 5d8f0b2c6e41
+Create Date: 2026-10-17 18:02:41.508113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4a1c7d3f52'
+down_revision: Union[str, Sequence[str], None] = '5d8f0b2c6e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'ledger_entries',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('transaction_id', sa.Integer(), nullable=True),
+    )
+    op.create_index('ix_ledger_entries_user_id_id', 'ledger_entries', ['user_id', 'id'])
+    op.create_table(
+        'balance_snapshots',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('balance_cents', sa.BigInteger(), nullable=False),
+        sa.Column('last_entry_id', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+
+    # O histórico existente passa para o ledger (por ordem de data). Os snapshots
+    # não são criados aqui: com LEDGER_MODE=legacy (omissão) os movimentos
+    # continuam a ir só para users.funds e transactions, e um snapshot criado agora
+    # perdê-los-ia. Cada snapshot é criado na primeira utilização em modo ledger, a partir de
+    # users.funds nesse momento, depois de copiar as transactions posteriores às
+    # desta migração (transaction_id marca as já copiadas; ver ledger.py).
+    op.execute(
+        """
+        INSERT INTO ledger_entries (user_id, amount_cents, type, created_at, transaction_id)
+        SELECT user_id, CAST(ROUND(amount * 100) AS BIGINT), type, COALESCE(date, CURRENT_TIMESTAMP), id
+        FROM transactions
+        WHERE user_id IS NOT NULL
+        ORDER BY date, id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('balance_snapshots')
+    op.drop_index('ix_ledger_entries_user_id_id', table_name='ledger_entries')
+    op.drop_table('ledger_entries')
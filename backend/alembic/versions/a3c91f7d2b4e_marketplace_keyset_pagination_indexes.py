@@ -0,0 +1,45 @@
+"""Marketplace keyset pagination indexes
+
+Revision ID: a3c91f7d2b4e
+Revises: eb0026508459
+Create Date: 2026-10-17 10:12:41.218334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c91f7d2b4e'
+down_revision: Union[str, Sequence[str], None] = 'eb0026508459'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Data de listagem, necessária para ordenar o marketplace por antiguidade.
+    # As listagens existentes ficam com a data da migração.
+    op.add_column(
+        'marketplace',
+        sa.Column('listed_at', sa.DateTime(), server_default=sa.func.now(), nullable=False)
+    )
+
+    # Chaves de ordenação do cursor: (value, id) e (listed_at, id)
+    op.create_index('ix_marketplace_value_id', 'marketplace', ['value', 'id'], unique=False)
+    op.create_index('ix_marketplace_listed_at_id', 'marketplace', ['listed_at', 'id'], unique=False)
+
+    # Filtros por type / name / float_value
+    op.create_index('ix_skins_type_name_float', 'skins', ['type', 'name', 'float_value'], unique=False)
+    op.create_index('ix_skins_name', 'skins', ['name'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_skins_name', table_name='skins')
+    op.drop_index('ix_skins_type_name_float', table_name='skins')
+    op.drop_index('ix_marketplace_listed_at_id', table_name='marketplace')
+    op.drop_index('ix_marketplace_value_id', table_name='marketplace')
+    op.drop_column('marketplace', 'listed_at')
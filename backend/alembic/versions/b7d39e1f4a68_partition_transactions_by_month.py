@@ -0,0 +1,124 @@
+"""Partition transactions by month (RANGE on date) and add transactions_archive
+
+Revision ID: b7d39e1f4a68
+Revises: 8e4a1c7d3f52
+Create Date: 2026-10-17 19:41:05.227318
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d39e1f4a68'
+down_revision: Union[str, Sequence[str], None] = '8e4a1c7d3f52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Meses criados à frente do atual; a partir daqui é o `partitions ensure` que os cria
+MONTHS_AHEAD = 3
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # Sem particionamento declarativo: a tabela fica como está
+        return
+
+    # A tabela antiga sai do caminho (com os nomes dos seus índices) e a sequência
+    # dos ids passa para a nova, para que os ids continuem a crescer sem saltos.
+    op.execute("ALTER TABLE transactions RENAME TO transactions_unpartitioned")
+    op.execute("ALTER INDEX IF EXISTS transactions_pkey RENAME TO transactions_unpartitioned_pkey")
+    op.execute("ALTER INDEX IF EXISTS ix_transactions_id RENAME TO ix_transactions_unpartitioned_id")
+    op.execute("ALTER INDEX IF EXISTS ix_transactions_user_id_date RENAME TO ix_transactions_unpartitioned_user_id_date")
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY NONE")
+
+    # Numa tabela particionada a chave primária tem de incluir a chave de partição
+    op.execute("""
+        CREATE TABLE transactions (
+            id integer NOT NULL DEFAULT nextval('transactions_id_seq'),
+            user_id integer REFERENCES users (id),
+            amount double precision NOT NULL,
+            type varchar NOT NULL,
+            date timestamp without time zone NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            PRIMARY KEY (id, date)
+        ) PARTITION BY RANGE (date)
+    """)
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+    op.execute("CREATE INDEX ix_transactions_id ON transactions (id)")
+    op.execute("CREATE INDEX ix_transactions_user_id_date ON transactions (user_id, date DESC)")
+    op.execute("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT")
+
+    # Um mês por partição, desde a transação mais antiga até MONTHS_AHEAD à frente
+    current = date.today().replace(day=1)
+    oldest = bind.execute(sa.text("SELECT min(date) FROM transactions_unpartitioned")).scalar()
+    month = min(date(oldest.year, oldest.month, 1), current) if oldest else current
+    while month <= _add_months(current, MONTHS_AHEAD):
+        following = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE transactions_p{month:%Y_%m} PARTITION OF transactions "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+
+    # Linhas antigas sem data ficam na partição DEFAULT (1970-01-01)
+    op.execute("""
+        INSERT INTO transactions (id, user_id, amount, type, date)
+        SELECT id, user_id, amount, type, COALESCE(date, '1970-01-01')
+        FROM transactions_unpartitioned
+    """)
+    op.execute("DROP TABLE transactions_unpartitioned")
+
+    # Destino das partições antigas (partitions archive --to table)
+    op.execute("""
+        CREATE TABLE transactions_archive (
+            id integer NOT NULL,
+            user_id integer,
+            amount double precision NOT NULL,
+            type varchar NOT NULL,
+            date timestamp without time zone NOT NULL
+        ) PARTITION BY RANGE (date)
+    """)
+    op.execute("CREATE INDEX ix_transactions_archive_user_id_date ON transactions_archive (user_id, date DESC)")
+    op.execute("ANALYZE transactions")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Volta a uma tabela simples com as transações ativas e as arquivadas em tabela
+    op.execute("""
+        CREATE TABLE transactions_unpartitioned (
+            id integer NOT NULL DEFAULT nextval('transactions_id_seq'),
+            user_id integer REFERENCES users (id),
+            amount double precision NOT NULL,
+            type varchar NOT NULL,
+            date timestamp without time zone,
+            CONSTRAINT transactions_unpartitioned_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("""
+        INSERT INTO transactions_unpartitioned (id, user_id, amount, type, date)
+        SELECT id, user_id, amount, type, date FROM transactions_archive
+        UNION ALL
+        SELECT id, user_id, amount, type, date FROM transactions
+    """)
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE transactions_archive")
+    op.execute("DROP TABLE transactions")
+    op.execute("ALTER TABLE transactions_unpartitioned RENAME TO transactions")
+    op.execute("ALTER INDEX transactions_unpartitioned_pkey RENAME TO transactions_pkey")
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+    op.create_index('ix_transactions_id', 'transactions', ['id'], unique=False)
+    op.create_index('ix_transactions_user_id_date', 'transactions', ['user_id', sa.text('date DESC')], unique=False)
@@ -0,0 +1,75 @@
+"""Marketplace unique skin_id
+
+Revision ID: c7e2d45a9f10
+Revises: a3c91f7d2b4e
+Create Date: 2026-10-17 11:03:27.554102
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e2d45a9f10'
+down_revision: Union[str, Sequence[str], None] = 'a3c91f7d2b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # As listagens duplicadas da mesma skin (fica a mais antiga) saem do
+    # marketplace para marketplace_duplicates, onde podem ser revistas, antes de
+    # criar o índice único usado pelo INSERT ... ON CONFLICT (skin_id)
+    op.create_table(
+        'marketplace_duplicates',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('skin_id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('listed_at', sa.DateTime(), nullable=False),
+        sa.Column('removed_at', sa.DateTime(), nullable=False),
+    )
+    moved = op.get_bind().execute(sa.text(
+        """
+        WITH duplicates AS (
+            DELETE FROM marketplace m
+            USING marketplace older
+            WHERE m.skin_id = older.skin_id AND m.id > older.id
+            RETURNING m.id, m.skin_id, m.value, m.listed_at
+        )
+        INSERT INTO marketplace_duplicates (id, skin_id, value, listed_at, removed_at)
+        SELECT id, skin_id, value, listed_at, CURRENT_TIMESTAMP FROM duplicates
+        """
+    )).rowcount
+    if moved:
+        logger.warning("%d listagens duplicadas movidas para marketplace_duplicates", moved)
+
+    # CREATE INDEX CONCURRENTLY fora da transação da migração (que fica confirmada
+    # aqui), sem bloquear as escritas no marketplace enquanto o índice é criado
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_marketplace_skin_id', 'marketplace', ['skin_id'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_marketplace_skin_id', table_name='marketplace',
+            postgresql_concurrently=True, if_exists=True
+        )
+    # Sem o índice único, as listagens duplicadas podem voltar ao marketplace
+    op.execute(
+        """
+        INSERT INTO marketplace (id, skin_id, value, listed_at)
+        SELECT id, skin_id, value, listed_at FROM marketplace_duplicates
+        """
+    )
+    op.drop_table('marketplace_duplicates')
@@ -0,0 +1,47 @@
+"""Trigram indexes for skin search (pg_trgm on lower(name), lower(type))
+
+Revision ID: d4f8a2c61b93
+Revises: b7d39e1f4a68
+Create Date: 2026-10-17 21:12:37.904215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f8a2c61b93'
+down_revision: Union[str, Sequence[str], None] = 'b7d39e1f4a68'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        # Sem pg_trgm: a pesquisa usa o índice em memória (utils/search.py)
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Índices GIN de trigramas para o operador % (similaridade) e para LIKE
+    # 'prefixo%' / '% palavra%' usados por DatabaseService.search_skins; as
+    # expressões têm de ser iguais às da query (lower(...)).
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_skins_name_trgm', 'skins', [sa.text('lower(name) gin_trgm_ops')],
+            unique=False, postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_skins_type_trgm', 'skins', [sa.text('lower(type) gin_trgm_ops')],
+            unique=False, postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_skins_type_trgm', table_name='skins', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_skins_name_trgm', table_name='skins', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,59 @@
+"""Incrementally maintained market statistics per skin (type, name, float_value)
+
+Revision ID: f2a6c9d41e87
+Revises: d4f8a2c61b93
+Create Date: 2026-10-17 22:40:12.318254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a6c9d41e87'
+down_revision: Union[str, Sequence[str], None] = 'd4f8a2c61b93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'market_stats',
+        sa.Column('type', sa.String(), primary_key=True),
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('float_value', sa.String(), primary_key=True),
+        sa.Column('listing_count', sa.Integer(), nullable=False),
+        sa.Column('floor_price', sa.Float(), nullable=True),
+        sa.Column('last_sale_price', sa.Float(), nullable=True),
+        sa.Column('last_sale_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    op.create_table(
+        'market_stats_hourly',
+        sa.Column('type', sa.String(), primary_key=True),
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('float_value', sa.String(), primary_key=True),
+        sa.Column('hour', sa.DateTime(), primary_key=True),
+        sa.Column('sales', sa.Integer(), nullable=False),
+        sa.Column('volume', sa.Float(), nullable=False),
+    )
+
+    # Listagens e floor das listagens existentes. As transações não guardam a
+    # skin vendida, pelo que a última venda e o volume começam vazios.
+    op.execute(
+        """
+        INSERT INTO market_stats (type, name, float_value, listing_count, floor_price, updated_at)
+        SELECT skins.type, skins.name, skins.float_value, COUNT(marketplace.id), MIN(marketplace.value), CURRENT_TIMESTAMP
+        FROM marketplace JOIN skins ON skins.id = marketplace.skin_id
+        GROUP BY skins.type, skins.name, skins.float_value
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('market_stats_hourly')
+    op.drop_table('market_stats')
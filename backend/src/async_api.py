@@ -0,0 +1,269 @@
+from typing import Union, Dict, List, Optional
+from datetime import datetime
+from fastapi import APIRouter, Body, Query, Response, status, HTTPException
+from fastapi.params import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.src.models import DepositRequest, MarketplaceSkinDisplay, AddMarketplaceSkinRequest, MarketplacePage, Identity, BatchPurchaseRequest, BatchPurchaseResult, BulkListRequest, BulkDelistRequest, BulkListingResponse
+from backend.src.utils.security import get_current_user, get_current_identity
+from backend.src.async_database import AsyncDatabaseService, get_async_db
+from backend.src.database import BatchPurchaseError
+from backend.src.settings import settings
+from backend.src.utils.fast_json import dumps_envelope
+
+# ----------------------------------------------------
+# ENDPOINTS ASSÍNCRONOS (modo async)
+#
+# Versões `async def` dos endpoints de inventário, carteira e marketplace,
+# servidas sob o prefixo /async. Usam o AsyncEngine/AsyncSession, pelo que um
+# pedido à espera do Postgres não ocupa uma thread do threadpool. Os endpoints
+# síncronos originais mantêm-se, para que os dois modos possam ser comparados.
+# ----------------------------------------------------
+
+router = APIRouter(prefix="/async", tags=["async"])
+async_db_service = AsyncDatabaseService()
+
+
+@router.get("/inventory", status_code=status.HTTP_200_OK, response_model=Dict[str, Union[str, List]])
+async def get_my_skins(identity: Identity = Depends(get_current_identity), db: AsyncSession = Depends(get_async_db)) -> Dict[str, Union[str, List]]:
+    """
+    Recupera todas as skins que pertencem ao utilizador autenticado (o seu inventário).
+    """
+    try:
+        skins = await async_db_service.get_user_skins_json(identity.user_id, db)
+        return Response(
+            content=dumps_envelope({"message": "Skins do utilizador recuperadas com sucesso"}, "skins", skins),
+            media_type="application/json"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins do utilizador: {str(e)}") from e
+
+
+@router.post("/wallet/deposit", status_code=status.HTTP_200_OK)
+async def deposit_funds(
+    deposit: DepositRequest = Body(..., description="Montante a depositar"),
+    identity: Identity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Permite ao utilizador autenticado depositar fundos na sua carteira.
+    """
+    try:
+        new_balance = await async_db_service.deposit_funds(identity, deposit.amount, db)
+        return {
+            "message": "Depósito realizado com sucesso.",
+            "new_balance": new_balance
+        }
+    except ValueError as e:
+        if "não encontrado" in str(e):
+            raise HTTPException(status_code=404, detail="Utilizador não encontrado")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao processar depósito: {str(e)}")
+
+
+@router.get("/transactions/history", status_code=status.HTTP_200_OK, response_model=List[Dict[str, str]])
+async def get_transaction_history(
+    since: Optional[datetime] = Query(None, description="Só transações a partir desta data (inclusive)"),
+    until: Optional[datetime] = Query(None, description="Só transações anteriores a esta data"),
+    identity: Identity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_async_db)
+    ) -> List[Dict[str, str]]:
+    """
+    Obtém o histórico de transações financeiras do utilizador autenticado,
+    opcionalmente limitado ao intervalo [since, until).
+    """
+    try:
+        content = await async_db_service.get_transactions_by_user_json(identity.user_id, db, since, until)
+        return Response(content=content, media_type="application/json")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar histórico de transações: {str(e)}") from e
+
+
+@router.get("/marketplace/skins", status_code=status.HTTP_200_OK, response_model=List[MarketplaceSkinDisplay])
+async def get_marketplace_skins(
+    identity: Identity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    """
+    Lista todas as skins que estão ativamente disponíveis para compra no marketplace.
+    """
+    try:
+        content = await async_db_service.get_marketplace_skins_json(identity, db)
+        return Response(content=content, media_type="application/json")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins do marketplace: {str(e)}") from e
+
+
+@router.get("/marketplace/skins/page", status_code=status.HTTP_200_OK, response_model=MarketplacePage)
+async def get_marketplace_skins_page(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    sort: str = Query("listed_at", pattern="^(price|listed_at)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    skin_type: Optional[str] = Query(None, alias="type"),
+    name: Optional[str] = Query(None),
+    float_value: Optional[str] = Query(None, alias="float"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    identity: Identity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    """
+    Lista as skins do marketplace por páginas (paginação por cursor).
+    """
+    try:
+        return await async_db_service.get_marketplace_skins_page(
+            identity, db,
+            limit=limit, cursor=cursor, sort=sort, order=order,
+            skin_type=skin_type, name=name, float_value=float_value,
+            min_price=min_price, max_price=max_price
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins do marketplace: {str(e)}") from e
+
+
+@router.post("/marketplace/add/skin", status_code=status.HTTP_201_CREATED, response_model=Dict[str, Union[str, int]])
+async def marketplace_add_skin(
+    skin_data: AddMarketplaceSkinRequest = Body(..., description="ID da UserSkin e valor de venda"),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    """
+    Adiciona uma skin do inventário do utilizador autenticado ao marketplace para venda.
+    """
+    try:
+        skin_id = await async_db_service.add_marketplace_skin(skin_data.skin_id, skin_data.value, db)
+        return {"message": "Skin adicionada com sucesso ao mercado", "skin_id": int(skin_id)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao adicionar skin ao mercado: {str(e)}") from e
+
+
+@router.delete("/marketplace/remove/skin/{marketplace_skin_id}", status_code=status.HTTP_200_OK, response_model=Dict[str, str])
+async def marketplace_remove_skin(
+    marketplace_skin_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+    ) -> Dict[str, str]:
+    """
+    Remove uma skin que o utilizador autenticado listou para venda do marketplace.
+    """
+    try:
+        await async_db_service.remove_marketplace_skin(marketplace_skin_id, db)
+        return {"message": "Skin removida com sucesso do mercado"}
+    except ValueError as e:
+        error_msg = str(e)
+        if "not found" in error_msg or "not listed" in error_msg:
+            raise HTTPException(status_code=404, detail=error_msg)
+        raise HTTPException(status_code=400, detail=error_msg)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao remover skin: {str(e)}") from e
+
+
+@router.post("/marketplace/add/skins", status_code=status.HTTP_200_OK, response_model=BulkListingResponse)
+async def marketplace_add_skins(
+    request: BulkListRequest = Body(..., description="Skins a listar e respetivos preços"),
+    identity: Identity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_async_db)
+    ) -> Dict:
+    """
+    Lista várias skins do inventário do utilizador autenticado de uma vez.
+
+    - Cada skin tem o seu resultado (listed, not_found, not_owner, already_listed, duplicate).
+    """
+    if len(request.items) > settings.marketplace_bulk_max_items:
+        raise HTTPException(status_code=422, detail=f"Máximo de {settings.marketplace_bulk_max_items} skins por pedido")
+    try:
+        items = [(item.skin_id, item.value) for item in request.items]
+        return await async_db_service.add_marketplace_skins(identity.user_id, items, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao adicionar skins ao mercado: {str(e)}") from e
+
+
+@router.post("/marketplace/remove/skins", status_code=status.HTTP_200_OK, response_model=BulkListingResponse)
+async def marketplace_remove_skins(
+    request: BulkDelistRequest = Body(..., description="IDs das listagens a remover"),
+    identity: Identity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_async_db)
+    ) -> Dict:
+    """
+    Remove várias listagens do utilizador autenticado de uma vez.
+
+    - Cada listagem tem o seu resultado (removed, not_found, not_owner, duplicate).
+    """
+    if len(request.marketplace_skin_ids) > settings.marketplace_bulk_max_items:
+        raise HTTPException(status_code=422, detail=f"Máximo de {settings.marketplace_bulk_max_items} listagens por pedido")
+    try:
+        return await async_db_service.remove_marketplace_skins(identity.user_id, request.marketplace_skin_ids, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao remover skins do mercado: {str(e)}") from e
+
+
+@router.post("/marketplace/buy/skin/{marketplace_skin_id}", status_code=status.HTTP_200_OK, response_model=Dict[str, str])
+async def marketplace_buy_skin(
+    marketplace_skin_id: int,
+    identity: Identity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_async_db)
+    ) -> Dict[str, str]:
+    """
+    Processa a compra de uma skin listada no marketplace.
+    """
+    try:
+        await async_db_service.buy_marketplace_skin(marketplace_skin_id, identity.user_id, db)
+        return {"message": "Skin comprada com sucesso"}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        error_message = str(e)
+        if "not found" in error_message:
+            raise HTTPException(status_code=404, detail=error_message)
+        raise HTTPException(status_code=400, detail=error_message)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao comprar skin: {str(e)}") from e
+
+
+@router.post("/marketplace/buy/batch", status_code=status.HTTP_200_OK, response_model=BatchPurchaseResult)
+async def marketplace_buy_skins(
+    request: BatchPurchaseRequest = Body(..., description="IDs das skins a comprar e modo do lote"),
+    identity: Identity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_async_db)
+    ) -> Dict:
+    """
+    Compra várias skins listadas numa só transação (tudo ou nada, ou o que estiver disponível).
+    """
+    if len(request.skin_ids) > settings.purchase_batch_max_items:
+        raise HTTPException(status_code=422, detail=f"Máximo de {settings.purchase_batch_max_items} skins por lote")
+    try:
+        return await async_db_service.buy_marketplace_skins(request.skin_ids, identity.user_id, request.all_or_nothing, db)
+    except BatchPurchaseError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e), "items": e.items})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao comprar skins: {str(e)}") from e
+
+
+@router.get("/marketplace/user/skins", status_code=status.HTTP_200_OK, response_model=List[MarketplaceSkinDisplay])
+async def get_my_marketplace_skins(
+    identity: Identity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    """
+    Lista todas as skins que o utilizador autenticado colocou à venda.
+    """
+    try:
+        content = await async_db_service.get_user_marketplace_skins_json(identity, db)
+        return Response(content=content, media_type="application/json")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins listadas: {str(e)}") from e
@@ -0,0 +1,253 @@
+from backend.src.settings import settings
+from backend.src.database import DATABASE_URL, DatabaseService, BatchPurchaseError
+from backend.src.pool import engine_options, instrument_engine, pgbouncer_url
+from backend.src.query_stats import instrument_queries
+from backend.src.utils.retry import is_retryable_db_error, backoff_delay
+from backend.src.cache import response_cache, ALL_SKINS_KEY, MARKETPLACE_SNAPSHOT_KEY
+from backend.src.events import marketplace_events, LISTING_SOLD
+from backend.src.models import User, CreateSkinRequest, EditSkinRequest, Identity
+from backend.src.db_models import UserTable
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from typing import List, Dict, Optional, Tuple, Union
+from datetime import datetime
+import asyncio
+import os
+
+# Drivers assíncronos equivalentes aos drivers síncronos usados no DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql+psycopg": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Converte um URL de base de dados síncrono no URL do driver assíncrono equivalente."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+if settings.database_pgbouncer_mode:
+    ASYNC_DATABASE_URL = pgbouncer_url(ASYNC_DATABASE_URL)
+
+# O engine assíncrono é criado apenas na primeira utilização, para que o modo
+# síncrono continue a funcionar mesmo sem o driver assíncrono instalado.
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """Devolve (criando se necessário) o AsyncEngine partilhado pela aplicação."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, settings, name="async", is_async=True)
+        )
+        instrument_engine(_async_engine.sync_engine, name="async")
+        instrument_queries(_async_engine.sync_engine)
+    return _async_engine
+
+
+def created_async_engine() -> Optional[AsyncEngine]:
+    """Devolve o AsyncEngine se já tiver sido criado (sem o criar)."""
+    return _async_engine
+
+
+def get_async_session_factory() -> async_sessionmaker:
+    """Devolve a fábrica de AsyncSession (equivalente assíncrono do SessionLocal)."""
+    global _async_session_factory
+    if _async_session_factory is None:
+        # expire_on_commit=False evita lazy loads (I/O implícito) depois do commit
+        _async_session_factory = async_sessionmaker(
+            bind=get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory
+
+
+class AsyncDatabaseService:
+    """
+    Variante assíncrona do DatabaseService.
+
+    Expõe os mesmos métodos, com a mesma semântica e os mesmos erros, mas recebe uma
+    AsyncSession. Cada método corre a lógica do DatabaseService através de
+    `AsyncSession.run_sync`, pelo que o I/O é feito pelo driver assíncrono sem ocupar
+    uma thread do threadpool enquanto espera pela base de dados.
+    """
+    def __init__(self, sync_service: Optional[DatabaseService] = None):
+        """Inicialização do serviço."""
+        self._sync = sync_service or DatabaseService()
+
+    async def create_user(self, user: User, db: AsyncSession) -> str:
+        """Cria um novo utilizador na tabela UserTable."""
+        return await db.run_sync(lambda session: self._sync.create_user(user, session))
+
+    async def create_admin(self, user: User, db: AsyncSession) -> str:
+        """Cria um utilizador com a role de administrador. (Uso restrito)."""
+        return await db.run_sync(lambda session: self._sync.create_admin(user, session))
+
+    async def get_user_by_email(self, email: str, db: AsyncSession) -> UserTable | None:
+        """Busca um utilizador na DB pelo seu endereço de email."""
+        return await db.run_sync(lambda session: self._sync.get_user_by_email(email, session))
+
+    async def get_all_users(self, db: AsyncSession) -> List[Dict]:
+        """Recupera e formata todos os registos de utilizadores."""
+        return await db.run_sync(lambda session: self._sync.get_all_users(session))
+
+    async def get_user_skins(self, user_id: int, db: AsyncSession) -> List[Dict]:
+        """Recupera as skins de um utilizador que não estão listadas no marketplace."""
+        return await db.run_sync(lambda session: self._sync.get_user_skins(user_id, session))
+
+    async def get_user_skins_json(self, user_id: int, db: AsyncSession) -> bytes:
+        """Skins do inventário de um utilizador, já serializadas em JSON."""
+        return await db.run_sync(lambda session: self._sync.get_user_skins_json(user_id, session))
+
+    async def create_skin(self, skin: CreateSkinRequest, db: AsyncSession) -> str:
+        """Cria uma nova skin base na tabela SkinTable (usada por admins)."""
+        return await db.run_sync(lambda session: self._sync.create_skin(skin, session))
+
+    async def edit_skin(self, skin_id: int, skin: EditSkinRequest, db: AsyncSession) -> str:
+        """Atualiza os detalhes de uma skin base pelo ID."""
+        return await db.run_sync(lambda session: self._sync.edit_skin(skin_id, skin, session))
+
+    async def get_all_skins(self, db: AsyncSession) -> List[Dict]:
+        """Recupera todas as skins base, ordenadas por tipo."""
+        return await db.run_sync(lambda session: self._sync.get_all_skins(session))
+
+    async def get_all_skins_json(self, db: AsyncSession) -> bytes:
+        """Todas as skins base já serializadas, a partir da cache."""
+        return await db.run_sync(lambda session: self._sync.get_all_skins_json(session))
+
+    async def delete_skin(self, skin_id: int, db: AsyncSession) -> None:
+        """Elimina uma skin base pelo ID."""
+        return await db.run_sync(lambda session: self._sync.delete_skin(skin_id, session))
+
+    async def create_transaction(self, user_id: int, amount: float, transaction_type: str, db: AsyncSession):
+        """Cria um novo registo de transação (depósito, compra ou venda)."""
+        return await db.run_sync(
+            lambda session: self._sync.create_transaction(user_id, amount, transaction_type, session)
+        )
+
+    async def deposit_funds(self, user: Union[Identity, str], amount: float, db: AsyncSession) -> float:
+        """Deposita fundos na carteira de um utilizador e regista a transação."""
+        return await db.run_sync(lambda session: self._sync.deposit_funds(user, amount, session))
+
+    async def get_marketplace_skins(self, user: Union[Identity, str], db: AsyncSession) -> List[Dict]:
+        """Recupera as skins listadas no marketplace, excluindo as do utilizador."""
+        return await db.run_sync(lambda session: self._sync.get_marketplace_skins(user, session))
+
+    async def get_marketplace_skins_json(self, user: Union[Identity, str], db: AsyncSession) -> bytes:
+        """Skins do marketplace (excluindo as do utilizador) já serializadas, a partir da cache."""
+        return await db.run_sync(lambda session: self._sync.get_marketplace_skins_json(user, session))
+
+    async def get_marketplace_skins_page(self, user: Union[Identity, str], db: AsyncSession, **filters) -> Dict:
+        """Recupera uma página do marketplace (paginação por cursor)."""
+        return await db.run_sync(
+            lambda session: self._sync.get_marketplace_skins_page(user, session, **filters)
+        )
+
+    async def add_marketplace_skin(self, skin_id: int, value: float, db: AsyncSession) -> str:
+        """Adiciona uma skin à listagem do marketplace."""
+        return await db.run_sync(lambda session: self._sync.add_marketplace_skin(skin_id, value, session))
+
+    async def add_marketplace_skins(self, owner_id: int, items: List[Tuple[int, float]], db: AsyncSession) -> Dict:
+        """Lista várias skins do utilizador de uma vez."""
+        return await db.run_sync(lambda session: self._sync.add_marketplace_skins(owner_id, items, session))
+
+    async def remove_marketplace_skins(self, owner_id: int, marketplace_skin_ids: List[int], db: AsyncSession) -> Dict:
+        """Remove várias listagens do utilizador de uma vez."""
+        return await db.run_sync(
+            lambda session: self._sync.remove_marketplace_skins(owner_id, marketplace_skin_ids, session)
+        )
+
+    async def buy_marketplace_skin(self, skin_id: int, buyer_id: int, db: AsyncSession) -> None:
+        """
+        [OPERAÇÃO CRÍTICA/ATÓMICA] Processa a compra de uma skin no marketplace.
+
+        Mesma política de repetição do DatabaseService, mas a espera entre
+        tentativas é feita com asyncio.sleep para não bloquear o event loop.
+        """
+        attempt = 0
+        while True:
+            try:
+                sold = await db.run_sync(lambda session: self._sync._purchase_attempt(skin_id, buyer_id, session))
+                response_cache.invalidate(ALL_SKINS_KEY, MARKETPLACE_SNAPSHOT_KEY)
+                marketplace_events.publish(LISTING_SOLD, sold)
+                return
+            except Exception as e:
+                await db.rollback()
+                if is_retryable_db_error(e) and attempt < settings.purchase_max_retries:
+                    await asyncio.sleep(backoff_delay(attempt, settings.purchase_retry_base_delay, settings.purchase_retry_max_delay))
+                    attempt += 1
+                    continue
+                if is_retryable_db_error(e):
+                    raise ValueError("Erro ao comprar skin do marketplace: a listagem está ocupada por outra compra, tente novamente") from e
+                raise ValueError(f"Erro ao comprar skin do marketplace: {str(e)}") from e
+
+    async def buy_marketplace_skins(self, skin_ids: List[int], buyer_id: int, all_or_nothing: bool,
+                                    db: AsyncSession) -> Dict:
+        """[OPERAÇÃO CRÍTICA/ATÓMICA] Compra várias skins do marketplace numa só transação."""
+        attempt = 0
+        while True:
+            try:
+                result, sold = await db.run_sync(
+                    lambda session: self._sync._batch_purchase_attempt(skin_ids, buyer_id, all_or_nothing, session)
+                )
+                if sold:
+                    response_cache.invalidate(ALL_SKINS_KEY, MARKETPLACE_SNAPSHOT_KEY)
+                    for event in sold:
+                        marketplace_events.publish(LISTING_SOLD, event)
+                return result
+            except BatchPurchaseError:
+                await db.rollback()
+                raise
+            except Exception as e:
+                await db.rollback()
+                if is_retryable_db_error(e) and attempt < settings.purchase_max_retries:
+                    await asyncio.sleep(backoff_delay(attempt, settings.purchase_retry_base_delay, settings.purchase_retry_max_delay))
+                    attempt += 1
+                    continue
+                if is_retryable_db_error(e):
+                    raise ValueError("Erro ao comprar skins do marketplace: uma das listagens está ocupada por outra compra, tente novamente") from e
+                raise ValueError(f"Erro ao comprar skins do marketplace: {str(e)}") from e
+
+    async def remove_marketplace_skin(self, marketplace_skin_id: int, db: AsyncSession) -> None:
+        """Remove uma skin da listagem do marketplace (cancelamento de venda)."""
+        return await db.run_sync(
+            lambda session: self._sync.remove_marketplace_skin(marketplace_skin_id, session)
+        )
+
+    async def get_user_marketplace_skins(self, user: Union[Identity, str], db: AsyncSession) -> List[Dict]:
+        """Recupera as skins listadas para venda pelo utilizador autenticado."""
+        return await db.run_sync(lambda session: self._sync.get_user_marketplace_skins(user, session))
+
+    async def get_user_marketplace_skins_json(self, user: Union[Identity, str], db: AsyncSession) -> bytes:
+        """Skins listadas para venda pelo utilizador, já serializadas em JSON."""
+        return await db.run_sync(lambda session: self._sync.get_user_marketplace_skins_json(user, session))
+
+    async def get_transactions_by_user(self, user_id: int, db: AsyncSession, since: Optional[datetime] = None,
+                                       until: Optional[datetime] = None) -> List[Dict]:
+        """Recupera o histórico de transações de um utilizador, ordenado por data."""
+        return await db.run_sync(lambda session: self._sync.get_transactions_by_user(user_id, session, since, until))
+
+    async def get_transactions_by_user_json(self, user_id: int, db: AsyncSession, since: Optional[datetime] = None,
+                                            until: Optional[datetime] = None) -> bytes:
+        """Histórico de transações de um utilizador, já serializado em JSON."""
+        return await db.run_sync(lambda session: self._sync.get_transactions_by_user_json(user_id, session, since, until))
+
+
+# Alias para facilitar o uso
+AsyncDatabase = AsyncDatabaseService
+
+
+async def get_async_db():
+    """
+    Dependência assíncrona do FastAPI para gerir a AsyncSession.
+    Garante que a sessão é fechada após a requisição.
+    """
+    async with get_async_session_factory()() as db:
+        yield db
@@ -0,0 +1,382 @@
+"""
+Testes de carga HTTP da API com cenários padrão.
+
+Arranca a app (`backend.src.main:app`) sobre uma base de dados local (SQLite ou
+Postgres), carrega um dataset sintético (generate_dataset) se a base de dados
+estiver vazia e corre, um de cada vez, os cenários escolhidos com N clientes
+concorrentes durante `--duration` segundos:
+
+- browse:    GET /marketplace/skins e uma página de /marketplace/skins/page
+- inventory: GET /inventory
+- list:      POST /marketplace/add/skin seguido do cancelamento da listagem
+- buy:       POST /marketplace/buy/skin/{id} sobre listagens de outros utilizadores
+- deposit:   POST /wallet/deposit
+- login:     POST /login em ciclo (pico de logins)
+
+Para cada cenário reporta débito, latências (p50/p95/p99), respostas 4xx
+(rejeições de negócio, ex. skin já vendida), taxa de erros (5xx e falhas de
+ligação) e o número de consultas SQL emitidas pela app. Os resultados podem ser
+escritos em JSON (com o commit e a configuração) e comparados entre commits.
+
+Modos:
+- por omissão a app corre no mesmo processo (ASGI via httpx), o que permite
+  contar as consultas SQL;
+- `--server` arranca um uvicorn em subprocesso (pedidos HTTP reais);
+- `--base-url` usa uma API já em execução (sem contagem de consultas).
+
+Uso:
+    python -m backend.src.benchmarks.load_test --database-url sqlite:///load.db --json before.json
+    python -m backend.src.benchmarks.load_test --database-url postgresql://... --server --concurrency 64
+    python -m backend.src.benchmarks.load_test --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import create_engine, event, func, select, update
+
+from backend.src.benchmarks.stats import summarize_latencies
+from backend.src.db_models import Base, UserTable
+
+SCENARIOS = ["browse", "inventory", "list", "buy", "deposit", "login"]
+
+
+class VirtualUser:
+    def __init__(self, user_id: int, email: str, token: str):
+        self.user_id = user_id
+        self.email = email
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.inventory: List[int] = []
+
+
+class Recorder:
+    """Latências e códigos de resposta de um cenário, por operação."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    async def request(self, client: httpx.AsyncClient, operation: str, method: str, path: str,
+                      **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.latencies[operation].append(time.perf_counter() - started)
+            self.statuses[operation][type(e).__name__] += 1
+            return None
+        self.latencies[operation].append(time.perf_counter() - started)
+        self.statuses[operation][str(response.status_code)] += 1
+        return response
+
+    def summary(self, elapsed: float, queries: Optional[int]) -> Dict:
+        latencies = [value for values in self.latencies.values() for value in values]
+        statuses = sum(self.statuses.values(), Counter())
+        requests = len(latencies)
+        rejected = sum(count for code, count in statuses.items() if code.startswith("4"))
+        errors = requests - rejected - sum(count for code, count in statuses.items() if code.startswith(("2", "3")))
+        return {
+            "requests": requests,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+            "latency": summarize_latencies(latencies),
+            "statuses": dict(statuses),
+            "rejected_rate": round(rejected / requests, 4) if requests else 0.0,
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "db_queries": queries,
+            "db_queries_per_request": round(queries / requests, 2) if queries is not None and requests else None,
+            "operations": {
+                operation: {"requests": len(values), "latency": summarize_latencies(values),
+                            "statuses": dict(self.statuses[operation])}
+                for operation, values in self.latencies.items()
+            },
+        }
+
+
+class QueryCounter:
+    """Conta as consultas SQL emitidas pelo engine da app (modo no mesmo processo)."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._increment)
+
+    def _increment(self, *args) -> None:
+        self.count += 1
+
+
+# --- PREPARAÇÃO ---
+
+def prepare_database(database_url: str, users: int, skins: int, listings: int, transactions: int,
+                     password: str, vus: int) -> Dict:
+    """Cria as tabelas e o dataset (se vazio) e dá fundos aos utilizadores virtuais."""
+    from backend.src.generate_dataset import generate
+
+    engine = create_engine(database_url)
+    try:
+        Base.metadata.create_all(engine)
+        with engine.connect() as conn:
+            existing = conn.execute(select(func.count()).select_from(UserTable)).scalar_one()
+        dataset = None
+        if not existing:
+            dataset = generate(engine, users, skins, listings, transactions, password=password)
+        with engine.begin() as conn:
+            accounts = conn.execute(
+                select(UserTable.id, UserTable.email)
+                .where(UserTable.email.like("%@synthetic.cstrader"))
+                .order_by(UserTable.id).limit(vus)
+            ).all()
+            # Fundos suficientes para o cenário de compra não esbarrar no saldo
+            conn.execute(update(UserTable).where(UserTable.id.in_([a.id for a in accounts])).values(funds=1e9))
+        return {"existing_users": existing, "dataset": dataset, "accounts": [a._asdict() for a in accounts]}
+    finally:
+        engine.dispose()
+
+
+async def login_virtual_users(client: httpx.AsyncClient, accounts: List[Dict], password: str) -> List[VirtualUser]:
+    vus = []
+    for account in accounts:
+        response = await client.post("/login", json={"email": account["email"], "password": password})
+        response.raise_for_status()
+        vus.append(VirtualUser(account["id"], account["email"], response.json()["access_token"]))
+    if not vus:
+        raise SystemExit("Sem utilizadores sintéticos na base de dados (use uma base de dados vazia ou gerada)")
+    return vus
+
+
+# --- CENÁRIOS ---
+
+Scenario = Callable[[httpx.AsyncClient, VirtualUser, Recorder], Awaitable[None]]
+
+
+async def browse(client, vu, recorder):
+    await recorder.request(client, "marketplace", "GET", "/marketplace/skins", headers=vu.headers)
+    await recorder.request(client, "marketplace_page", "GET", "/marketplace/skins/page",
+                           params={"limit": 50, "sort": random.choice(["price", "listed_at"])}, headers=vu.headers)
+
+
+async def inventory(client, vu, recorder):
+    await recorder.request(client, "inventory", "GET", "/inventory", headers=vu.headers)
+
+
+async def list_skin(client, vu, recorder):
+    if not vu.inventory:
+        response = await client.get("/inventory", headers=vu.headers)
+        vu.inventory = [skin["id"] for skin in response.json().get("skins", [])] if response.is_success else []
+        if not vu.inventory:
+            await asyncio.sleep(0.01)
+            return
+    skin_id = vu.inventory.pop()
+    response = await recorder.request(client, "list", "POST", "/marketplace/add/skin",
+                                      json={"skin_id": skin_id, "value": round(random.uniform(5, 500), 2)},
+                                      headers=vu.headers)
+    if response is not None and response.status_code == 201:
+        # Cancela logo a seguir: o inventário do utilizador não se esgota
+        await recorder.request(client, "delist", "DELETE", f"/marketplace/remove/skin/{response.json()['skin_id']}",
+                               headers=vu.headers)
+        vu.inventory.insert(0, skin_id)
+
+
+def buy_skin_factory() -> Scenario:
+    available: List[int] = []
+
+    async def buy(client, vu, recorder):
+        if not available:
+            response = await client.get("/marketplace/skins", headers=vu.headers)
+            if response.is_success:
+                available.extend(skin["id"] for skin in response.json())
+                random.shuffle(available)
+            if not available:
+                await asyncio.sleep(0.01)
+                return
+        await recorder.request(client, "buy", "POST", f"/marketplace/buy/skin/{available.pop()}", headers=vu.headers)
+
+    return buy
+
+
+async def deposit(client, vu, recorder):
+    await recorder.request(client, "deposit", "POST", "/wallet/deposit", json={"amount": 1.0}, headers=vu.headers)
+
+
+def login_factory(password: str) -> Scenario:
+    async def login(client, vu, recorder):
+        await recorder.request(client, "login", "POST", "/login", json={"email": vu.email, "password": password})
+    return login
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, vus: List[VirtualUser], concurrency: int,
+                       duration: float, counter: Optional[QueryCounter]) -> Dict:
+    recorder = Recorder()
+    queries_before = counter.count if counter else None
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def worker(index: int):
+        vu = vus[index % len(vus)]
+        while time.perf_counter() < deadline:
+            await scenario(client, vu, recorder)
+
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    queries = counter.count - queries_before if counter else None
+    return recorder.summary(elapsed, queries)
+
+
+# --- EXECUÇÃO ---
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    """Arranca o uvicorn com a app e espera que responda."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.src.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("O uvicorn terminou durante o arranque")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/openapi.json", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("O uvicorn não respondeu em 30s")
+
+
+async def run(args) -> Dict:
+    prepared = prepare_database(args.database_url, args.users, args.skins, args.listings, args.transactions,
+                                args.password, args.vus)
+    transport = None
+    counter = None
+    base_url = args.base_url
+    server = None
+    if args.server:
+        server = start_server(args.port, args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+    elif not args.base_url:
+        from backend.src.main import app
+        from backend.src.database import engine
+        transport = httpx.ASGITransport(app=app)
+        counter = QueryCounter(engine)
+        base_url = "http://load-test"
+
+    scenarios: Dict[str, Scenario] = {
+        "browse": browse,
+        "inventory": inventory,
+        "list": list_skin,
+        "buy": buy_skin_factory(),
+        "deposit": deposit,
+        "login": login_factory(args.password),
+    }
+    limits = httpx.Limits(max_connections=args.concurrency + 8)
+    results: Dict = {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "mode": "server" if args.server else ("external" if args.base_url else "in-process"),
+            "database": args.database_url.split(":", 1)[0],
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "virtual_users": len(prepared["accounts"]),
+            "dataset": prepared["dataset"],
+        },
+        "scenarios": {},
+    }
+    try:
+        async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=60, limits=limits) as client:
+            vus = await login_virtual_users(client, prepared["accounts"], args.password)
+            for name in args.scenarios:
+                print(f">> {name} ({args.concurrency} clientes, {args.duration}s)", file=sys.stderr)
+                results["scenarios"][name] = await run_scenario(
+                    client, scenarios[name], vus, args.concurrency, args.duration, counter)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+    return results
+
+
+def compare(before: Dict, after: Dict, threshold: float) -> List[str]:
+    """Linhas com a variação por cenário; as regressões acima do limiar são marcadas."""
+    lines = [f"{'cenário':<10} {'rps':>18} {'p95 ms':>20} {'erros':>14}"]
+    regressions = []
+    for name, new in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        if old is None:
+            continue
+        rps_change = (new["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] if old["throughput_rps"] else 0.0
+        p95_old, p95_new = old["latency"]["p95_ms"], new["latency"]["p95_ms"]
+        p95_change = (p95_new - p95_old) / p95_old if p95_old else 0.0
+        regressed = rps_change < -threshold or p95_change > threshold or new["error_rate"] > old["error_rate"]
+        if regressed:
+            regressions.append(name)
+        lines.append(
+            f"{name:<10} {old['throughput_rps']:>7} -> {new['throughput_rps']:<7} "
+            f"{p95_old:>8} -> {p95_new:<9} {old['error_rate']:>5} -> {new['error_rate']:<5}"
+            + ("  REGRESSÃO" if regressed else "")
+        )
+    lines.append(f"commits: {before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+    return lines if not regressions else lines + [f"regressões: {', '.join(regressions)}"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Testes de carga HTTP da API com cenários padrão")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:///load_test.db"))
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes concorrentes por cenário")
+    parser.add_argument("--duration", type=float, default=15.0, help="Duração de cada cenário (segundos)")
+    parser.add_argument("--vus", type=int, default=32, help="Utilizadores distintos (cada um com o seu token)")
+    parser.add_argument("--password", default="password", help="Password dos utilizadores gerados")
+    parser.add_argument("--users", type=int, default=2_000, help="Dataset: utilizadores (só se a base de dados estiver vazia)")
+    parser.add_argument("--skins", type=int, default=20_000)
+    parser.add_argument("--listings", type=int, default=2_000)
+    parser.add_argument("--transactions", type=int, default=50_000)
+    parser.add_argument("--server", action="store_true", help="Arranca um uvicorn em subprocesso")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="Workers do uvicorn (com --server)")
+    parser.add_argument("--base-url", help="Usa uma API já em execução neste URL")
+    parser.add_argument("--json", help="Escreve os resultados em JSON neste ficheiro")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DEPOIS"), help="Compara dois ficheiros de resultados")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Variação considerada regressão (--compare)")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            lines = compare(json.load(before), json.load(after), args.threshold)
+        print("\n".join(lines))
+        if lines[-1].startswith("regressões"):
+            raise SystemExit(1)
+        return
+
+    # A app lê a configuração do ambiente ao ser importada (e o uvicorn herda-o)
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("SECRET_KEY", secrets.token_hex(32))
+    os.environ.setdefault("ALGORITHM", "HS256")
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
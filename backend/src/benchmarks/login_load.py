@@ -0,0 +1,137 @@
+"""
+Benchmark do impacto de um pico de logins nos restantes endpoints.
+
+Corre contra uma API em execução, em duas fases com a mesma carga de fundo num
+endpoint barato (por omissão /marketplace/skins):
+
+1. baseline: só a carga de fundo;
+2. burst: a carga de fundo mais `--login-concurrency` clientes a fazer login em ciclo.
+
+Reporta o débito de logins (ok e 503), as latências do endpoint barato em cada
+fase (p50/p95/p99) e o fator de abrandamento provocado pelos logins.
+
+Uso:
+    python -m backend.src.benchmarks.login_load --base-url http://localhost:8000 \\
+        --email bench@example.com --password 'Bench#12345' --duration 20
+    DATABASE_URL=sqlite:///bench.db python -m backend.src.benchmarks.login_load --in-process
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+from backend.src.benchmarks.stats import summarize_latencies
+
+
+async def ensure_token(client: httpx.AsyncClient, email: str, password: str) -> str:
+    """Faz login (registando o utilizador de benchmark se ainda não existir)."""
+    response = await client.post("/login", json={"email": email, "password": password})
+    if response.status_code == 401:
+        await client.post("/register_user", json={"name": "bench", "email": email, "password": password})
+        response = await client.post("/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def background_load(client: httpx.AsyncClient, path: str, token: str, concurrency: int,
+                          deadline: float) -> Dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    async def worker():
+        headers = {"Authorization": f"Bearer {token}"}
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"requests": len(latencies), "statuses": dict(statuses), "latency": summarize_latencies(latencies)}
+
+
+async def login_load(client: httpx.AsyncClient, email: str, password: str, concurrency: int,
+                     deadline: float) -> Dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.post("/login", json={"email": email, "password": password})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"attempts": len(latencies), "statuses": dict(statuses), "latency": summarize_latencies(latencies)}
+
+
+async def run(base_url: str, email: str, password: str, duration: float, background_path: str,
+              background_concurrency: int, login_concurrency: int, in_process: bool = False) -> Dict:
+    limits = httpx.Limits(max_connections=background_concurrency + login_concurrency + 4)
+    transport = None
+    if in_process:
+        # A app corre no mesmo processo (um único worker), sem servidor HTTP
+        from backend.src.main import app
+        transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits, transport=transport) as client:
+        token = await ensure_token(client, email, password)
+
+        deadline = time.perf_counter() + duration
+        baseline = await background_load(client, background_path, token, background_concurrency, deadline)
+
+        started = time.perf_counter()
+        deadline = started + duration
+        burst_background, logins = await asyncio.gather(
+            background_load(client, background_path, token, background_concurrency, deadline),
+            login_load(client, email, password, login_concurrency, deadline),
+        )
+        elapsed = time.perf_counter() - started
+
+    ok_logins = logins["statuses"].get(200, 0)
+    baseline_p95 = baseline["latency"]["p95_ms"]
+    results = {
+        "config": {"duration_s": duration, "background_path": background_path,
+                   "background_concurrency": background_concurrency, "login_concurrency": login_concurrency},
+        "logins": {**logins, "ok_per_s": round(ok_logins / elapsed, 1),
+                   "rejected_503": logins["statuses"].get(503, 0)},
+        "background_baseline": baseline,
+        "background_during_logins": burst_background,
+        "background_p95_slowdown": round(burst_background["latency"]["p95_ms"] / baseline_p95, 2) if baseline_p95 else None,
+    }
+    if in_process:
+        from backend.src.hashing import password_hasher
+        results["hashing"] = password_hasher.stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débito de logins e impacto nos restantes endpoints")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", default="bench-login@example.com")
+    parser.add_argument("--password", default="Bench#12345")
+    parser.add_argument("--duration", type=float, default=15.0, help="Duração de cada fase (segundos)")
+    parser.add_argument("--background-path", default="/marketplace/skins")
+    parser.add_argument("--background-concurrency", type=int, default=8)
+    parser.add_argument("--login-concurrency", type=int, default=64)
+    parser.add_argument("--in-process", action="store_true",
+                        help="Chama a app diretamente (ASGI, usa o DATABASE_URL) em vez de --base-url")
+    parser.add_argument("--json", help="Escreve os resultados em JSON neste ficheiro")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(
+        args.base_url, args.email, args.password, args.duration, args.background_path,
+        args.background_concurrency, args.login_concurrency, in_process=args.in_process,
+    ))
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Benchmark de stress do caminho de compra (DatabaseService.buy_marketplace_skin).
+
+Lança N compradores concorrentes (uma thread e uma sessão cada) contra M listagens.
+Cada comprador tenta comprar todas as listagens por uma ordem aleatória, de forma
+a que várias threads disputem a mesma listagem ao mesmo tempo.
+
+No fim reporta throughput, latências (p50/p95/p99) e verifica que nenhuma listagem
+foi vendida duas vezes e que o total de fundos se manteve.
+
+Uso:
+    python -m backend.src.benchmarks.purchase_stress --buyers 32 --listings 200
+    python -m backend.src.benchmarks.purchase_stress --database-url postgresql://... --json results.json
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.src.benchmarks.stats import summarize_latencies
+from backend.src.database import DatabaseService
+from backend.src.db_models import Base, LedgerEntry, Marketplace, SkinTable, Transaction, UserTable
+from backend.src.pool import engine_options
+from backend.src.settings import settings
+
+
+def build_engine(database_url: str, threads: int):
+    """Engine dedicado ao benchmark, com pool suficiente para todas as threads."""
+    if database_url.startswith("sqlite"):
+        # Espera pelo lock de escrita em vez de falhar de imediato
+        engine = create_engine(database_url, connect_args={"timeout": 30, "check_same_thread": False})
+        Base.metadata.create_all(engine)
+        return engine
+    options = engine_options(database_url, settings, name="benchmark")
+    if "pool_size" in options:
+        options["pool_size"] = max(options["pool_size"], threads)
+    return create_engine(database_url, **options)
+
+
+def setup_dataset(session_factory, buyers: int, listings: int, funds: float) -> Dict:
+    """Cria um vendedor, `buyers` compradores e `listings` skins listadas (prefixo único por execução)."""
+    tag = uuid.uuid4().hex[:8]
+    with session_factory() as db:
+        db.execute(insert(UserTable), [
+            {"name": f"bench-{tag}-seller", "email": f"bench-{tag}-seller@example.com",
+             "password": "x", "role": "player", "funds": 0.0}
+        ] + [
+            {"name": f"bench-{tag}-buyer{i}", "email": f"bench-{tag}-buyer{i}@example.com",
+             "password": "x", "role": "player", "funds": funds}
+            for i in range(buyers)
+        ])
+        users = dict(db.execute(
+            select(UserTable.email, UserTable.id).where(UserTable.email.like(f"bench-{tag}-%"))
+        ).all())
+        seller_id = users[f"bench-{tag}-seller@example.com"]
+        buyer_ids = [users[f"bench-{tag}-buyer{i}@example.com"] for i in range(buyers)]
+
+        db.execute(insert(SkinTable), [
+            {"name": f"bench-{tag}-{i}", "type": "Karambit", "float_value": "Factory New", "owner_id": seller_id}
+            for i in range(listings)
+        ])
+        skin_ids = list(db.execute(
+            select(SkinTable.id).where(SkinTable.name.like(f"bench-{tag}-%"))
+        ).scalars())
+        db.execute(insert(Marketplace), [
+            {"skin_id": skin_id, "value": round(random.uniform(1, 50), 2)} for skin_id in skin_ids
+        ])
+        db.commit()
+    return {"tag": tag, "seller_id": seller_id, "buyer_ids": buyer_ids, "skin_ids": skin_ids}
+
+
+def total_funds(session_factory, user_ids: List[int]) -> float:
+    """Soma dos saldos de `user_ids` (no modo ledger, snapshot + cauda: users.funds deixa de ser atualizado)."""
+    with session_factory() as db:
+        return db.execute(
+            select(func.sum(DatabaseService._funds_column())).where(UserTable.id.in_(user_ids))
+        ).scalar() or 0.0
+
+
+def run(database_url: str, buyers: int, listings: int, funds: float, seed: int) -> Dict:
+    random.seed(seed)
+    engine = build_engine(database_url, buyers)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    dataset = setup_dataset(session_factory, buyers, listings, funds)
+    user_ids = [dataset["seller_id"]] + dataset["buyer_ids"]
+    funds_before = total_funds(session_factory, user_ids)
+
+    service = DatabaseService()
+    lock = threading.Lock()
+    latencies: List[float] = []
+    sold: List[tuple] = []
+    failures: Counter = Counter()
+    start_barrier = threading.Barrier(buyers)
+
+    def buyer_worker(buyer_id: int):
+        order = dataset["skin_ids"][:]
+        random.Random(buyer_id).shuffle(order)
+        local_latencies, local_sold, local_failures = [], [], Counter()
+        with session_factory() as db:
+            start_barrier.wait()
+            for skin_id in order:
+                started = time.perf_counter()
+                try:
+                    service.buy_marketplace_skin(skin_id, buyer_id, db)
+                    local_sold.append((skin_id, buyer_id))
+                except ValueError as e:
+                    message = str(e)
+                    if "não está listada" in message:
+                        local_failures["already_sold"] += 1
+                    elif "fundos" in message:
+                        local_failures["insufficient_funds"] += 1
+                    elif "ocupada" in message:
+                        local_failures["retries_exhausted"] += 1
+                    else:
+                        local_failures["other"] += 1
+                local_latencies.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local_latencies)
+            sold.extend(local_sold)
+            failures.update(local_failures)
+
+    threads = [threading.Thread(target=buyer_worker, args=(buyer_id,)) for buyer_id in dataset["buyer_ids"]]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # Verificações de integridade: zero vendas duplicadas e fundos conservados
+    with session_factory() as db:
+        remaining = db.execute(
+            select(func.count()).select_from(Marketplace).where(Marketplace.skin_id.in_(dataset["skin_ids"]))
+        ).scalar()
+        # As compras ficam em transactions, ou em ledger_entries no modo ledger
+        movements = LedgerEntry if settings.ledger_mode == "ledger" else Transaction
+        purchases_recorded = db.execute(
+            select(func.count()).select_from(movements)
+            .where(movements.type == "purchase", movements.user_id.in_(dataset["buyer_ids"]))
+        ).scalar()
+        owners = dict(db.execute(
+            select(SkinTable.id, SkinTable.owner_id).where(SkinTable.id.in_(dataset["skin_ids"]))
+        ).all())
+    funds_after = total_funds(session_factory, user_ids)
+
+    sales_per_skin = Counter(skin_id for skin_id, _ in sold)
+    double_sales = sorted(skin_id for skin_id, count in sales_per_skin.items() if count > 1)
+    owner_mismatches = sorted(skin_id for skin_id, buyer_id in sold if owners.get(skin_id) != buyer_id)
+    checks = {
+        "double_sales": len(double_sales),
+        "owner_mismatches": len(owner_mismatches),
+        "listings_accounted": remaining + len(sold) == listings,
+        "transactions_match_sales": purchases_recorded == len(sold),
+        "funds_conserved": abs(funds_after - funds_before) < 1e-6,
+    }
+    checks["ok"] = (
+        checks["double_sales"] == 0 and checks["owner_mismatches"] == 0 and checks["listings_accounted"]
+        and checks["transactions_match_sales"] and checks["funds_conserved"]
+    )
+    engine.dispose()
+
+    return {
+        "config": {"buyers": buyers, "listings": listings, "lock_mode": settings.purchase_lock_mode,
+                   "max_retries": settings.purchase_max_retries, "backend": engine.dialect.name},
+        "elapsed_s": round(elapsed, 3),
+        "attempts": len(latencies),
+        "purchases": len(sold),
+        "attempts_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "purchases_per_s": round(len(sold) / elapsed, 1) if elapsed else 0.0,
+        "latency": summarize_latencies(latencies),
+        "failures": dict(failures),
+        "checks": checks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress test concorrente de buy_marketplace_skin")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="URL da base de dados (por omissão DATABASE_URL)")
+    parser.add_argument("--buyers", type=int, default=16, help="Número de compradores concorrentes (threads)")
+    parser.add_argument("--listings", type=int, default=100, help="Número de listagens disputadas")
+    parser.add_argument("--funds", type=float, default=1_000_000.0, help="Fundos iniciais de cada comprador")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Escreve os resultados em JSON neste ficheiro")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Indique --database-url ou defina DATABASE_URL")
+
+    results = run(args.database_url, args.buyers, args.listings, args.funds, args.seed)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if not results["checks"]["ok"]:
+        raise SystemExit("FALHA: verificação de integridade falhou (ver 'checks')")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Micro-benchmark do custo por linha dos endpoints de leitura.
+
+Compara, para o inventário, as skins listadas pelo utilizador e o histórico de
+transações, os dois caminhos até aos bytes da resposta:
+
+- antes: método de listagem (entidades ORM ou linhas copiadas para dicts) seguido
+  da validação e serialização pelo response_model, como o FastAPI faz;
+- depois: método *_json (colunas como linhas Core, codificadas diretamente).
+
+Reporta o tempo por linha (µs) de cada caminho, o ganho e o encoder em uso
+(orjson se estiver instalado, senão o json da biblioteca padrão).
+
+Uso:
+    python -m backend.src.benchmarks.serialization --rows 5000
+    python -m backend.src.benchmarks.serialization --database-url postgresql://... --json results.json
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Union
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.src.database import DatabaseService
+from backend.src.db_models import Base, Marketplace, SkinTable, Transaction, UserTable
+from backend.src.models import MarketplaceSkinDisplay
+from backend.src.utils import fast_json
+
+USER_ID = 1
+USER_EMAIL = "bench-serialization@example.com"
+
+
+def seed(engine, rows: int) -> None:
+    """Um utilizador com `rows` skins no inventário, `rows` skins listadas e `rows` transações."""
+    anchor = datetime(2026, 1, 1)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(UserTable), [{"id": USER_ID, "name": "bench", "email": USER_EMAIL,
+                                          "password": "x", "role": "player", "funds": 0.0}])
+        conn.execute(insert(SkinTable), [
+            {"id": i + 1, "name": f"Skin {i}", "type": "Karambit" if i % 2 else "Bayonet",
+             "float_value": "Factory New", "owner_id": USER_ID, "date_created": anchor + timedelta(minutes=i),
+             "link": f"https://example.com/skins/{i}.png"}
+            for i in range(2 * rows)
+        ])
+        conn.execute(insert(Marketplace), [
+            {"id": i + 1, "skin_id": rows + i + 1, "value": 10.0 + i % 500, "listed_at": anchor}
+            for i in range(rows)
+        ])
+        conn.execute(insert(Transaction), [
+            {"id": i + 1, "user_id": USER_ID, "amount": float(i % 100), "type": "deposit",
+             "date": anchor + timedelta(seconds=i)}
+            for i in range(rows)
+        ])
+
+
+def _best_per_row(function: Callable[[], bytes], rows: int, repeat: int) -> float:
+    """Melhor tempo de `repeat` execuções, em µs por linha."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best / rows * 1_000_000
+
+
+def run(database_url: str, rows: int, repeat: int) -> Dict:
+    if database_url.startswith("sqlite"):
+        engine = create_engine(database_url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+    else:
+        engine = create_engine(database_url)
+    seed(engine, rows)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    service = DatabaseService()
+
+    # Mesmo trabalho que o FastAPI faz com o response_model de cada endpoint
+    inventory_model = TypeAdapter(Dict[str, Union[str, List]])
+    listed_model = TypeAdapter(List[MarketplaceSkinDisplay])
+    history_model = TypeAdapter(List[Dict[str, str]])
+
+    def validated(adapter: TypeAdapter, value) -> bytes:
+        return adapter.dump_json(adapter.validate_python(value))
+
+    def fresh(function):
+        # Sessão limpa em cada execução: as entidades ORM não vêm do identity map
+        def call():
+            session.expunge_all()
+            return function()
+        return call
+
+    scenarios = {
+        "inventory": (
+            lambda: validated(inventory_model, {"message": "ok", "skins": service.get_user_skins(USER_ID, session)}),
+            lambda: fast_json.dumps_envelope({"message": "ok"}, "skins", service.get_user_skins_json(USER_ID, session)),
+        ),
+        "marketplace_user_skins": (
+            lambda: validated(listed_model, service.get_user_marketplace_skins(USER_EMAIL, session)),
+            lambda: service.get_user_marketplace_skins_json(USER_EMAIL, session),
+        ),
+        "transactions_history": (
+            lambda: validated(history_model, service.get_transactions_by_user(USER_ID, session)),
+            lambda: service.get_transactions_by_user_json(USER_ID, session),
+        ),
+    }
+
+    results = {"config": {"rows": rows, "repeat": repeat, "encoder": fast_json.BACKEND}}
+    try:
+        for name, (before, after) in scenarios.items():
+            assert json.loads(before()) == json.loads(after()), f"{name}: os dois caminhos divergem"
+            before_us = _best_per_row(fresh(before), rows, repeat)
+            after_us = _best_per_row(fresh(after), rows, repeat)
+            results[name] = {
+                "before_us_per_row": round(before_us, 3),
+                "after_us_per_row": round(after_us, 3),
+                "speedup": round(before_us / after_us, 2) if after_us else None,
+            }
+    finally:
+        session.close()
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo por linha da serialização dos endpoints de leitura")
+    parser.add_argument("--database-url", default="sqlite://",
+                        help="Base de dados vazia onde criar o dataset (por omissão SQLite em memória)")
+    parser.add_argument("--rows", type=int, default=5000, help="Linhas por endpoint")
+    parser.add_argument("--repeat", type=int, default=5, help="Execuções por caminho (conta a melhor)")
+    parser.add_argument("--json", help="Escreve os resultados em JSON neste ficheiro")
+    args = parser.parse_args()
+
+    results = run(args.database_url, args.rows, args.repeat)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
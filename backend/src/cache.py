@@ -0,0 +1,146 @@
+"""
+Cache em memória (por processo) de respostas já serializadas.
+
+Usado pelas leituras que todas as páginas do frontend fazem e que raramente
+mudam (`/skins/all` e `/marketplace/skins`). As entradas expiram por TTL e,
+quando o limite de entradas é atingido, sai a menos usada recentemente (LRU).
+
+A invalidação é feita pelos métodos de escrita do DatabaseService, logo após o
+commit. Cada chave tem um contador de geração: um valor carregado da base de
+dados só é guardado se nenhuma invalidação dessa chave tiver ocorrido durante a
+carga, para que uma leitura lenta não volte a pôr em cache dados já obsoletos.
+
+Com várias réplicas da API a invalidação é apenas local; o TTL limita o tempo
+durante o qual as restantes réplicas servem a versão anterior.
+
+A classe ResponseCache é genérica (TTL + LRU) e é também usada pela cache de
+tokens já verificados em `utils/auth_utils.py`, com um TTL por entrada.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from backend.src.settings import settings
+
+# Chaves das respostas partilhadas
+ALL_SKINS_KEY = "skins:all"
+MARKETPLACE_SNAPSHOT_KEY = "marketplace:snapshot"
+# Vocabulário da pesquisa de skins (TermIndex, utils/search.py)
+SEARCH_TERMS_KEY = "skins:search_terms"
+
+
+class ResponseCache:
+    """Cache TTL + LRU, segura para várias threads, com contadores de hits/misses."""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 10.0, enabled: bool = True,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._generations: Dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_loads = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Devolve o valor em cache (ou None se não existir ou tiver expirado)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, key: Hashable) -> int:
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None, ttl: Optional[float] = None) -> bool:
+        """
+        Guarda um valor. Se `generation` for indicado e a chave tiver sido
+        invalidada entretanto, o valor é descartado (devolve False).
+        `ttl` substitui o TTL por omissão para esta entrada.
+        """
+        with self._lock:
+            if generation is not None and self._generations.get(key, 0) != generation:
+                self.stale_loads += 1
+                return False
+            self._entries[key] = (self._clock() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], store: bool = True,
+                    ttl: Optional[float] = None) -> Any:
+        """
+        Devolve o valor em cache ou carrega-o com `loader` e guarda-o (com `ttl`,
+        se indicado). Com `store=False` (ex. carga de uma réplica possivelmente
+        atrasada) o valor carregado é devolvido sem ser guardado.
+        """
+        if not self.enabled:
+            return loader()
+        value = self.get(key)
+        if value is not None:
+            return value
+        if not store:
+            return loader()
+        generation = self.generation(key)
+        value = loader()
+        self.set(key, value, generation, ttl)
+        return value
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """Remove as chaves e avança a sua geração (cargas em curso são descartadas)."""
+        with self._lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._entries.pop(key, None)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in self._entries:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_loads": self.stale_loads,
+            }
+
+
+# Cache partilhada por todas as instâncias do DatabaseService (síncrono e assíncrono)
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    ttl=settings.response_cache_ttl,
+    enabled=settings.response_cache_enabled,
+)
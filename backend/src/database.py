@@ -1,13 +1,27 @@
 from backend.src.settings import settings
-from backend.src.models import User, CreateSkinRequest,EditSkinRequest
+from backend.src.models import User, CreateSkinRequest,EditSkinRequest,Identity
+from backend.src.cache import response_cache, ALL_SKINS_KEY, MARKETPLACE_SNAPSHOT_KEY, SEARCH_TERMS_KEY
+from backend.src.events import marketplace_events, LISTING_ADDED, LISTING_REMOVED, LISTING_SOLD
+from backend.src.metrics import PURCHASES, PURCHASE_VALUE, DEPOSITS, DEPOSIT_AMOUNT, LISTINGS
 from backend.src.db_models import UserTable, SkinTable, Transaction, Marketplace
-from sqlalchemy import create_engine, select, insert,text,distinct
+from backend.src.pool import engine_options, instrument_engine
+from backend.src.replicas import ReplicaRouter, mark_write, parse_replica_urls
+from backend.src.query_stats import instrument_queries
+from backend.src.utils.retry import is_retryable_db_error, backoff_delay
+from backend.src.utils.pagination import MARKETPLACE_SORT_FIELDS, SORT_ORDERS, encode_cursor, decode_cursor
+from backend.src.utils.bulk_import import ImportRow
+from backend.src.utils import fast_json
+from backend.src.utils.search import PREFIX_BONUS, TermIndex, normalize
+from backend.src import ledger, market_stats
+from sqlalchemy import create_engine, select, insert, update, delete,text,distinct,tuple_,literal,DateTime,case,or_,bindparam,func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import IntegrityError
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional, Tuple, Union
 from datetime import datetime,timezone
 from dotenv import load_dotenv
 import os
+import time
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -20,12 +34,54 @@ if not DATABASE_URL:
         f"{settings.database_name}"
     )
 
-# Criação do Engine SQLAlchemy
-engine = create_engine(DATABASE_URL)
+# Criação do Engine SQLAlchemy (pool configurável pelo Settings)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, settings, name="primary"))
+instrument_engine(engine, name="primary")
+# Statements e tempo de base de dados atribuídos ao pedido HTTP em curso
+instrument_queries(engine)
 
 # Criação da Sessão Local para a DB
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Réplicas de leitura (opcionais) para os endpoints só de leitura (ver get_read_db)
+read_router = ReplicaRouter(
+    SessionLocal,
+    parse_replica_urls(settings.database_replica_urls),
+    read_your_writes_seconds=settings.replica_read_your_writes_seconds,
+    retry_after=settings.replica_retry_after,
+)
+
+# Colunas devolvidas pelos caminhos rápidos (*_json), pela ordem dos campos do
+# response_model de cada endpoint; as linhas são serializadas diretamente, sem
+# entidades ORM nem validação Pydantic
+_SKIN_DISPLAY_COLUMNS = (SkinTable.id, SkinTable.name, SkinTable.type, SkinTable.float_value,
+                         SkinTable.owner_id, SkinTable.link)
+_MARKETPLACE_DISPLAY_COLUMNS = _SKIN_DISPLAY_COLUMNS + (Marketplace.value,)
+_INVENTORY_COLUMNS = (SkinTable.id, SkinTable.name, SkinTable.type, SkinTable.float_value,
+                      SkinTable.owner_id, SkinTable.date_created, SkinTable.link)
+
+
+# Campos que uma linha `update` da importação em massa pode alterar (EditSkinRequest)
+_SKIN_IMPORT_FIELDS = ("name", "type", "float_value", "owner_id", "link")
+
+
+def dialect_insert(db: Session, table):
+    """
+    INSERT específico do dialeto da sessão, com suporte a ON CONFLICT.
+    (Postgres em produção; SQLite em desenvolvimento e testes.)
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+class BatchPurchaseError(ValueError):
+    """Compra em lote recusada (tudo ou nada); `items` tem o resultado de cada skin."""
+
+    def __init__(self, message: str, items: List[Dict]):
+        super().__init__(message)
+        self.items = items
+
+
 class DatabaseService:
     """
     Classe de Serviço de Base de Dados (DatabaseService)
@@ -38,19 +94,31 @@ class DatabaseService:
         pass
         
     def create_user(self, user: User, db: Session) -> str:       
-        """Cria um novo utilizador na tabela UserTable."""
+        """
+        Cria um novo utilizador na tabela UserTable.
+
+        INSERT ... ON CONFLICT (email) DO NOTHING RETURNING id: um email duplicado
+        não devolve id, sem precisar de um SELECT prévio nem de um refresh.
+        """
         try:
-            db_user = UserTable(
-                name=user.name,
-                email=user.email,
-                password=user.password,
-                role=user.role,
-                funds=user.funds
+            query = (
+                dialect_insert(db, UserTable)
+                .values(
+                    name=user.name,
+                    email=user.email,
+                    password=user.password,
+                    role=user.role,
+                    funds=user.funds
+                )
+                .on_conflict_do_nothing(index_elements=[UserTable.email])
+                .returning(UserTable.id)
             )
-            db.add(db_user)
+            user_id = db.execute(query).scalar_one_or_none()
+            if user_id is None:
+                db.rollback()
+                raise ValueError("User with this email already exists")
             db.commit()
-            db.refresh(db_user)
-            return str(db_user.id)
+            return str(user_id)
         except IntegrityError as e:
                 # Rollback em caso de erro de integridade (e.g., email duplicado)
                 db.rollback()
@@ -75,6 +143,15 @@ class DatabaseService:
                 db.rollback()
                 raise ValueError("Administrador com este id ou email já existe") from e
     
+    def _resolve_user_id(self, user: Union[Identity, str], db: Session) -> Optional[int]:
+        """
+        Id do utilizador. Com uma Identity (resolvida a partir do token) não há
+        consulta à base de dados; com um email é feita a pesquisa pelo índice de email.
+        """
+        if isinstance(user, Identity):
+            return user.user_id
+        return db.execute(select(UserTable.id).where(UserTable.email == user)).scalar_one_or_none()
+
     def get_user_by_email(self, email: str, db: Session) -> UserTable | None:
         """Busca um utilizador na DB pelo seu endereço de email."""
         try:
@@ -85,21 +162,25 @@ class DatabaseService:
             raise ValueError(f"Erro ao buscar utilizador por email: {str(e)}")
 
         
+    def update_password_hash(self, user_id: int, password_hash: str, db: Session) -> None:
+        """Grava um novo hash de password (rehash transparente após mudança do custo)."""
+        try:
+            db.execute(update(UserTable).where(UserTable.id == user_id).values(password=password_hash))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro ao atualizar password: {str(e)}") from e
+
     def get_all_users(self,db: Session) -> List[Dict]:
         """Recupera e formata todos os registos de utilizadores."""
-        query = select(UserTable)
-        db_users = db.scalars(query).all()
-        users_data = []
-        for user in db_users:
-            # Filtra os dados sensíveis (e.g., password) antes de retornar
-            users_data.append({
-                "id": user.id,
-                "name": user.name,
-                "email": user.email,
-                "role": user.role,
-                "funds": user.funds
-            })
-        return users_data
+        # Só as colunas públicas (sem a password); o saldo vem do ledger no modo ledger
+        query = select(UserTable.id, UserTable.name, UserTable.email, UserTable.role, self._funds_column().label("funds"))
+        return [row._asdict() for row in db.execute(query)]
+
+    @staticmethod
+    def _funds_column():
+        """Saldo de cada utilizador em listagens: `users.funds`, ou snapshot + cauda no modo ledger."""
+        return ledger.balance_column() if settings.ledger_mode == "ledger" else UserTable.funds
     
     def get_user_skins(self,user_id:int,db: Session) -> List[Dict]:
         """
@@ -127,22 +208,38 @@ class DatabaseService:
                 "link": skin.link
             })
         return skins_data
+
+    def get_user_skins_json(self, user_id: int, db: Session) -> bytes:
+        """
+        Mesmo resultado que get_user_skins, já serializado em JSON (array).
+        Seleciona apenas as colunas necessárias e codifica as linhas diretamente.
+        """
+        query = (
+            select(*_INVENTORY_COLUMNS)
+            .outerjoin(Marketplace, Marketplace.skin_id == SkinTable.id)
+            .where(SkinTable.owner_id == user_id, Marketplace.skin_id == None)
+        )
+        return fast_json.dumps_rows(db.execute(query))
     
     def create_skin(self, skin: CreateSkinRequest, db: Session) -> str:       
         """Cria uma nova skin base na tabela SkinTable (usada por admins)."""
         try:
-            db_skin = SkinTable(
-                name=skin.name,
-                type=skin.type,
-                float_value=skin.float_value,
-                owner_id=0, # ID 0 pode ser um owner "admin/system"
-                date_created=datetime.now(timezone.utc),
-                link=skin.link
+            query = (
+                insert(SkinTable)
+                .values(
+                    name=skin.name,
+                    type=skin.type,
+                    float_value=skin.float_value,
+                    owner_id=0, # ID 0 pode ser um owner "admin/system"
+                    date_created=datetime.now(timezone.utc),
+                    link=skin.link
+                )
+                .returning(SkinTable.id)
             )
-            db.add(db_skin)
+            skin_id = db.execute(query).scalar_one()
             db.commit()
-            db.refresh(db_skin)
-            return str(db_skin.id)
+            response_cache.invalidate(ALL_SKINS_KEY, MARKETPLACE_SNAPSHOT_KEY, SEARCH_TERMS_KEY)
+            return str(skin_id)
         except IntegrityError as e:
                 db.rollback()
                 raise ValueError("Erro ao criar skin") from e
@@ -153,6 +250,8 @@ class DatabaseService:
             skin_update = db.get(SkinTable, skin_id)
             if not skin_update:
                 raise ValueError("Skin não encontrada")
+            # Uma skin listada que muda de nome, tipo ou float muda de chave nas estatísticas
+            listed = market_stats.listed_keys(db, [skin_id])
             
             # Atualiza apenas os campos que não são None
             if skin.name is not None:
@@ -165,8 +264,12 @@ class DatabaseService:
                 skin_update.owner_id = skin.owner_id
             if skin.link is not None:
                 skin_update.link = skin.link  
+            if listed:
+                db.flush()
+                market_stats.refresh(db, listed + market_stats.listed_keys(db, [skin_id]))
                 
             db.commit()
+            response_cache.invalidate(ALL_SKINS_KEY, MARKETPLACE_SNAPSHOT_KEY, SEARCH_TERMS_KEY)
             return str(skin_id) 
             
         except IntegrityError as e:
@@ -176,46 +279,278 @@ class DatabaseService:
             db.rollback()
             raise ValueError(f"Erro ao atualizar skin: {str(e)}") from e
         
+    def apply_skin_import(self, rows: List[ImportRow], db: Session) -> Dict:
+        """
+        Aplica um lote da importação em massa do catálogo (ver utils/bulk_import)
+        e confirma-o com um commit.
+
+        Um SELECT verifica os ids de todas as atualizações e eliminações do lote;
+        depois, um INSERT (executemany) para as novas skins, um UPDATE (executemany,
+        COALESCE mantém os campos ausentes) e um DELETE ... IN para as eliminações
+        (antes dele, outro para as listagens dessas skins, publicadas como
+        listing-removed).
+        Devolve os contadores e os erros por linha; se o lote falhar na base de
+        dados, todas as suas linhas são reportadas com o erro.
+        """
+        skins = SkinTable.__table__
+        ids = [row.skin_id for row in rows if row.skin_id is not None]
+        try:
+            existing = set(db.execute(select(skins.c.id).where(skins.c.id.in_(ids))).scalars()) if ids else set()
+            now = datetime.now(timezone.utc)
+            creates, updates, deletes, errors = [], [], [], []
+            for row in rows:
+                if row.op == "create":
+                    # Mesmo dono "admin/system" que create_skin
+                    creates.append({**row.fields, "owner_id": 0, "date_created": now})
+                elif row.skin_id not in existing:
+                    errors.append((row.line, f"Skin com id: {row.skin_id} não encontrada"))
+                elif row.op == "update":
+                    updates.append({"b_id": row.skin_id, **{f"b_{name}": row.fields.get(name) for name in _SKIN_IMPORT_FIELDS}})
+                else:
+                    deletes.append(row.skin_id)
+
+            # Chaves das estatísticas de mercado das skins listadas alteradas ou eliminadas
+            listed = market_stats.listed_keys(db, [update["b_id"] for update in updates] + deletes)
+            if creates:
+                db.execute(insert(skins), creates)
+            if updates:
+                db.execute(
+                    update(skins)
+                    .where(skins.c.id == bindparam("b_id"))
+                    .values({name: func.coalesce(bindparam(f"b_{name}"), skins.c[name]) for name in _SKIN_IMPORT_FIELDS}),
+                    updates,
+                )
+            removed = []
+            if deletes:
+                # As listagens das skins eliminadas saem explicitamente (não só pelo
+                # ON DELETE CASCADE) para publicar listing-removed depois do commit
+                removed = db.execute(
+                    delete(Marketplace).where(Marketplace.skin_id.in_(deletes)).returning(Marketplace.skin_id, Marketplace.id)
+                ).all()
+                db.execute(delete(skins).where(skins.c.id.in_(deletes)))
+            if listed:
+                market_stats.refresh(db, listed + market_stats.listed_keys(db, [update["b_id"] for update in updates]))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            message = f"Erro ao aplicar o lote: {str(e).splitlines()[0]}"
+            return {"created": 0, "updated": 0, "deleted": 0, "errors": [(row.line, message) for row in rows]}
+
+        response_cache.invalidate(ALL_SKINS_KEY, MARKETPLACE_SNAPSHOT_KEY, SEARCH_TERMS_KEY)
+        for skin_id, marketplace_skin_id in removed:
+            marketplace_events.publish(LISTING_REMOVED, {"id": skin_id, "marketplace_skin_id": marketplace_skin_id})
+        return {"created": len(creates), "updated": len(updates), "deleted": len(deletes), "errors": errors}
+
     def get_all_skins(self,db: Session) -> List[Dict]:
         """Recupera todas as skins base, ordenadas por tipo."""
         query = select(SkinTable).order_by(SkinTable.type)
         result = db.execute(query).scalars().all()
         return result
+
+    def get_all_skins_json(self, db: Session) -> bytes:
+        """
+        Lista de todas as skins base já serializada em JSON.
+
+        Servida a partir da cache de respostas; invalidada por create_skin,
+        edit_skin, delete_skin e buy_marketplace_skin (mudança de owner_id).
+        """
+        query = select(*_SKIN_DISPLAY_COLUMNS).order_by(SkinTable.type)
+        return response_cache.get_or_load(ALL_SKINS_KEY, lambda: fast_json.dumps_rows(db.execute(query)),
+                                          store=not read_router.may_be_stale(db))
     
+    # --- PESQUISA ---
+
+    def _search_terms(self, db: Session) -> TermIndex:
+        """Vocabulário da pesquisa (nomes e tipos distintos), em cache; invalidado pelas escritas no catálogo."""
+        def load():
+            names = db.execute(select(SkinTable.name).distinct()).scalars().all()
+            types = db.execute(select(SkinTable.type).distinct()).scalars().all()
+            return TermIndex(names + types)
+        return response_cache.get_or_load(SEARCH_TERMS_KEY, load, store=not read_router.may_be_stale(db),
+                                          ttl=settings.search_terms_ttl)
+
+    def autocomplete_skins(self, prefix: str, db: Session, limit: int = 10) -> List[str]:
+        """Nomes e tipos de skins com uma palavra a começar por `prefix` (os que começam por ele primeiro)."""
+        try:
+            return self._search_terms(db).autocomplete(prefix, limit)
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro no autocomplete de skins: {str(e)}") from e
+
+    def search_skins(self, query: str, db: Session, scope: str = "catalog", limit: int = 20, offset: int = 0) -> Dict:
+        """
+        Pesquisa skins (scope="catalog") ou listagens ativas (scope="marketplace")
+        por nome ou tipo, com tolerância a erros, ordenadas por relevância e id.
+
+        Em Postgres o filtro e a pontuação usam o pg_trgm (índices GIN em
+        lower(name) e lower(type)); noutros dialetos os termos correspondentes são
+        escolhidos pelo TermIndex em memória e as linhas lidas por name/type IN (...).
+        Devolve {"items", "next_offset"}.
+        """
+        normalized = normalize(query)
+        if not normalized:
+            raise ValueError("A pesquisa tem de conter pelo menos uma letra ou algarismo")
+        try:
+            columns = [SkinTable.id, SkinTable.name, SkinTable.type, SkinTable.float_value,
+                       SkinTable.owner_id, SkinTable.link]
+            if scope == "marketplace":
+                columns += [Marketplace.value, Marketplace.id.label("marketplace_skin_id")]
+
+            if db.get_bind().dialect.name == "postgresql":
+                name, skin_type = func.lower(SkinTable.name), func.lower(SkinTable.type)
+                # `normalized` só tem letras, algarismos e espaços: nada a escapar no LIKE
+                is_prefix = or_(name.like(f"{normalized}%"), name.like(f"% {normalized}%"),
+                                skin_type.like(f"{normalized}%"))
+                score = (case((is_prefix, PREFIX_BONUS), else_=0.0)
+                         + func.greatest(func.similarity(name, normalized), func.similarity(skin_type, normalized)))
+                matches = or_(name.op("%")(normalized), skin_type.op("%")(normalized), is_prefix)
+                if settings.search_min_similarity != 0.3:
+                    # Limite do operador % (só nesta transação)
+                    db.execute(select(func.set_config("pg_trgm.similarity_threshold",
+                                                      str(settings.search_min_similarity), True)))
+            else:
+                ranked = self._search_terms(db).match(query, settings.search_min_similarity)[:200]
+                if not ranked:
+                    return {"items": [], "next_offset": None}
+                terms = [term for term, _ in ranked]
+                term_score = dict(ranked)
+                score = func.max(case(term_score, value=SkinTable.name, else_=0.0),
+                                 case(term_score, value=SkinTable.type, else_=0.0))
+                matches = or_(SkinTable.name.in_(terms), SkinTable.type.in_(terms))
+
+            query = select(*columns, score.label("score")).where(matches)
+            if scope == "marketplace":
+                query = query.join(Marketplace, Marketplace.skin_id == SkinTable.id)
+            # Pede mais um registo para saber se existe página seguinte
+            rows = db.execute(query.order_by(score.desc(), SkinTable.id).limit(limit + 1).offset(offset)).all()
+            items = [row._asdict() for row in rows[:limit]]
+            return {"items": items, "next_offset": offset + limit if len(rows) > limit else None}
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro na pesquisa de skins: {str(e)}") from e
+
     def delete_skin(self, skin_id: int, db: Session) -> None:
         """Elimina uma skin base pelo ID."""
         try:
             skin_to_delete = db.get(SkinTable, skin_id)
             if not skin_to_delete:
                 raise ValueError("Skin não encontrada")
+            # A eliminação remove também as listagens da skin (cascade)
+            removed = [{"id": skin_id, "marketplace_skin_id": listing.id} for listing in skin_to_delete.marketplace_items]
             db.delete(skin_to_delete)
+            if removed:
+                db.flush()
+                market_stats.refresh(db, [market_stats.skin_key(skin_to_delete)])
             db.commit()
+            response_cache.invalidate(ALL_SKINS_KEY, MARKETPLACE_SNAPSHOT_KEY, SEARCH_TERMS_KEY)
+            for listing in removed:
+                marketplace_events.publish(LISTING_REMOVED, listing)
         except Exception as e:
             db.rollback()
             raise ValueError(f"Erro ao eliminar skin: {str(e)}") from e
         
     def create_transaction(self, user_id: int, amount: float, transaction_type: str, db: Session):
         """Cria um novo registo de transação (depósito, compra ou venda)."""
-        transaction = Transaction(
-            user_id=user_id,
-            amount=amount,
-            type=transaction_type,
-            date=datetime.now(timezone.utc) # Adicionado timestamp
+        query = (
+            insert(Transaction)
+            .values(
+                user_id=user_id,
+                amount=amount,
+                type=transaction_type,
+                date=datetime.now(timezone.utc) # Adicionado timestamp
+            )
+            .returning(Transaction.id)
         )
-        db.add(transaction)
+        transaction_id = db.execute(query).scalar_one()
         db.commit()
-        db.refresh(transaction)
-        return transaction.id
+        return transaction_id
+
+    def deposit_funds(self, user: Union[Identity, str], amount: float, db: Session) -> float:
+        """
+        Deposita fundos na carteira de um utilizador e regista a transação.
+
+        O saldo é atualizado na base de dados (UPDATE ... SET funds = funds + :x
+        RETURNING funds), pelo que depósitos concorrentes nunca se perdem. Em Postgres
+        o UPDATE e o INSERT da transação seguem numa única instrução (CTE), ou seja,
+        uma só ida à base de dados antes do commit.
+
+        `user` é a Identity do pedido (UPDATE pela chave primária) ou um email.
+        Devolve o novo saldo. Levanta ValueError se o utilizador não existir.
+        """
+        if settings.ledger_mode == "ledger":
+            return self._ledger_deposit(user, amount, db)
+        now = datetime.now(timezone.utc)
+        user_filter = UserTable.id == user.user_id if isinstance(user, Identity) else UserTable.email == user
+        try:
+            credited = (
+                update(UserTable)
+                .where(user_filter)
+                .values(funds=UserTable.funds + amount)
+                .returning(UserTable.id, UserTable.funds)
+            )
+            if db.get_bind().dialect.name == "postgresql":
+                credited = credited.cte("credited")
+                recorded = (
+                    insert(Transaction)
+                    .from_select(
+                        ["user_id", "amount", "type", "date"],
+                        select(credited.c.id, literal(amount), literal("deposit"), literal(now, DateTime))
+                    )
+                    .cte("recorded")
+                )
+                row = db.execute(select(credited.c.id, credited.c.funds).add_cte(recorded)).one_or_none()
+                # Para o ORM é um SELECT: a escrita é marcada à mão para o read-your-writes
+                mark_write(db)
+            else:
+                row = db.execute(credited).one_or_none()
+                if row is not None:
+                    db.execute(insert(Transaction).values(user_id=row.id, amount=amount, type="deposit", date=now))
+
+            if row is None:
+                db.rollback()
+                raise ValueError("Utilizador não encontrado")
+            db.commit()
+            DEPOSITS.inc()
+            DEPOSIT_AMOUNT.inc(amount=amount)
+            return row.funds
+        except ValueError:
+            raise
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro ao processar depósito: {str(e)}") from e
     
-    def get_marketplace_skins(self, user_email: str, db: Session) -> List[Dict]:
+    def _ledger_deposit(self, user: Union[Identity, str], amount: float, db: Session) -> float:
+        """Depósito no modo ledger: uma entrada nova no ledger, sem UPDATE de saldo."""
+        try:
+            user_id = self._resolve_user_id(user, db)
+            new_balance = ledger.deposit(db, user_id, amount) if user_id is not None else None
+            if new_balance is None:
+                db.rollback()
+                raise ValueError("Utilizador não encontrado")
+            db.commit()
+            DEPOSITS.inc()
+            DEPOSIT_AMOUNT.inc(amount=amount)
+            return new_balance
+        except ValueError:
+            raise
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro ao processar depósito: {str(e)}") from e
+
+    def get_balance(self, user_id: int, db: Session) -> Optional[float]:
+        """Saldo atual de um utilizador (None se não existir)."""
+        if settings.ledger_mode == "ledger":
+            return ledger.get_balance(db, user_id)
+        return db.execute(select(UserTable.funds).where(UserTable.id == user_id)).scalar_one_or_none()
+
+    def get_marketplace_skins(self, user: Union[Identity, str], db: Session) -> List[Dict]:
         """
         Recupera todas as skins listadas no marketplace, excluindo aquelas
         que pertencem ao utilizador que está a consultar.
         """
         try:
             # 1. Obter o ID do utilizador logado
-            query = select(UserTable.id).where(UserTable.email == user_email)
-            user_id = db.execute(query).scalar_one_or_none()
+            user_id = self._resolve_user_id(user, db)
             
             # 2. Consultar skins no marketplace onde o owner_id não é o ID do utilizador
             query = (
@@ -243,99 +578,508 @@ class DatabaseService:
         except Exception as e:
             db.rollback()
             raise ValueError(f"Erro ao buscar skins do marketplace: {str(e)}") from e
-        
+
+    def _marketplace_snapshot(self, db: Session) -> List[Tuple[int, bytes]]:
+        """Todas as listagens do marketplace, como pares (owner_id, item serializado em JSON)."""
+        query = (
+            select(*_MARKETPLACE_DISPLAY_COLUMNS)
+            .join(Marketplace, Marketplace.skin_id == SkinTable.id)
+            .order_by(Marketplace.id)
+        )
+        return [(row.owner_id, fast_json.dumps(row._asdict())) for row in db.execute(query)]
+
+    def get_marketplace_skins_json(self, user: Union[Identity, str], db: Session) -> bytes:
+        """
+        Skins listadas no marketplace (excluindo as do utilizador), já serializadas em JSON.
+
+        Todos os utilizadores partilham um único snapshot em cache; o filtro
+        "excluir as minhas listagens" é aplicado sobre esse snapshot.
+        """
+        try:
+            user_id = self._resolve_user_id(user, db)
+            if user_id is None:
+                return b"[]"
+            snapshot = response_cache.get_or_load(MARKETPLACE_SNAPSHOT_KEY, lambda: self._marketplace_snapshot(db),
+                                                  store=not read_router.may_be_stale(db))
+            return b"[" + b",".join(item for owner_id, item in snapshot if owner_id != user_id) + b"]"
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro ao buscar skins do marketplace: {str(e)}") from e
+
+    def get_marketplace_skins_page(
+        self,
+        user: Union[Identity, str],
+        db: Session,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "listed_at",
+        order: str = "desc",
+        skin_type: Optional[str] = None,
+        name: Optional[str] = None,
+        float_value: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+    ) -> Dict:
+        """
+        Recupera uma página do marketplace usando paginação por cursor (keyset).
+
+        A página seguinte começa imediatamente a seguir à chave (valor, id) do último
+        registo devolvido, pelo que o custo de cada página é o mesmo independentemente
+        da profundidade do cursor (não há OFFSET). Os filtros são aplicados no servidor.
+        """
+        if sort not in MARKETPLACE_SORT_FIELDS:
+            raise ValueError(f"Ordenação inválida: {sort}")
+        if order not in SORT_ORDERS:
+            raise ValueError(f"Direção de ordenação inválida: {order}")
+        try:
+            user_id = self._resolve_user_id(user, db)
+
+            sort_column = Marketplace.value if sort == "price" else Marketplace.listed_at
+            query = (
+                select(SkinTable.id, SkinTable.name, SkinTable.type, SkinTable.float_value,
+                       SkinTable.date_created, SkinTable.link, SkinTable.owner_id, Marketplace.value,
+                       Marketplace.listed_at, Marketplace.id.label('marketplace_skin_id'))
+                .join(Marketplace, Marketplace.skin_id == SkinTable.id)
+                .where(SkinTable.owner_id != user_id)
+            )
+
+            # Filtros (suportados pelos índices de skins e marketplace)
+            if skin_type is not None:
+                query = query.where(SkinTable.type == skin_type)
+            if name is not None:
+                query = query.where(SkinTable.name == name)
+            if float_value is not None:
+                query = query.where(SkinTable.float_value == float_value)
+            if min_price is not None:
+                query = query.where(Marketplace.value >= min_price)
+            if max_price is not None:
+                query = query.where(Marketplace.value <= max_price)
+
+            # Posição do cursor: (chave, id) estritamente depois do último registo
+            if cursor:
+                last_value, last_id = decode_cursor(cursor, sort, order)
+                if sort == "listed_at":
+                    last_value = datetime.fromisoformat(last_value)
+                key = tuple_(sort_column, Marketplace.id)
+                query = query.where(key > tuple_(last_value, last_id) if order == "asc" else key < tuple_(last_value, last_id))
+
+            if order == "asc":
+                query = query.order_by(sort_column.asc(), Marketplace.id.asc())
+            else:
+                query = query.order_by(sort_column.desc(), Marketplace.id.desc())
+
+            # Pede mais um registo para saber se existe página seguinte
+            rows = db.execute(query.limit(limit + 1)).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+
+            items = []
+            for row in rows:
+                items.append({
+                    "id": row.id,
+                    "name": row.name,
+                    "type": row.type,
+                    "float_value": row.float_value,
+                    "date_created": row.date_created,
+                    "owner_id": row.owner_id,
+                    "link": row.link,
+                    "value": row.value,
+                    "listed_at": row.listed_at,
+                    "marketplace_skin_id": row.marketplace_skin_id
+                })
+
+            next_cursor = None
+            if has_more:
+                last = rows[-1]
+                last_value = last.value if sort == "price" else last.listed_at.isoformat()
+                next_cursor = encode_cursor(sort, order, last_value, last.marketplace_skin_id)
+            return {"items": items, "next_cursor": next_cursor}
+        except ValueError:
+            raise
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro ao buscar página do marketplace: {str(e)}") from e
+
     def add_marketplace_skin(self, skin_id: int, value: float, db : Session ) -> str :
         """
         Adiciona uma skin à listagem do marketplace.
 
-        Verifica se a skin já está listada antes de adicionar para evitar duplicados.
+        Os duplicados são rejeitados pelo índice único em marketplace.skin_id
+        (INSERT ... ON CONFLICT DO NOTHING RETURNING id), numa só instrução.
         """
         try:
-            # 1. Verifica se a skin já está no marketplace
-            verify_existing_skin_query = select(Marketplace.id).where(Marketplace.skin_id == skin_id)
-            verify_existing_skin = db.execute(verify_existing_skin_query).scalar_one_or_none()
-            if verify_existing_skin:
-                raise ValueError(f"Skin com id: {skin_id} já está listada no marketplace")
-                
-            # 2. Cria o novo registo de marketplace
-            marketplace_skin = Marketplace(
-                skin_id=skin_id,
-                value=value
+            now = datetime.now(timezone.utc)
+            query = (
+                dialect_insert(db, Marketplace)
+                .values(skin_id=skin_id, value=value, listed_at=now)
+                .on_conflict_do_nothing(index_elements=[Marketplace.skin_id])
+                .returning(Marketplace.id)
             )
-            db.add(marketplace_skin)
+            marketplace_skin_id = db.execute(query).scalar_one_or_none()
+            if marketplace_skin_id is None:
+                raise ValueError(f"Skin com id: {skin_id} já está listada no marketplace")
+            # Dados da listagem para o feed em tempo real, lidos na mesma transação
+            listing = db.execute(
+                select(*_MARKETPLACE_DISPLAY_COLUMNS, Marketplace.id.label("marketplace_skin_id"))
+                .join(Marketplace, Marketplace.skin_id == SkinTable.id)
+                .where(Marketplace.id == marketplace_skin_id)
+            ).one()
+            market_stats.record_listings(db, [(market_stats.skin_key(listing), listing.value)], now)
             db.commit()
-            db.refresh(marketplace_skin)
-            return str(marketplace_skin.id)
+            LISTINGS.inc("added")
+            response_cache.invalidate(MARKETPLACE_SNAPSHOT_KEY)
+            marketplace_events.publish(LISTING_ADDED, listing._asdict())
+            return str(marketplace_skin_id)
         except Exception as e:
             db.rollback()
             raise ValueError(f"Erro ao adicionar skin ao marketplace: {str(e)}") from e
         
+    def add_marketplace_skins(self, owner_id: int, items: List[Tuple[int, float]], db: Session) -> Dict:
+        """
+        Lista várias skins do utilizador de uma vez (`items`: pares skin_id, preço).
+
+        Existência, posse e listagens existentes são verificadas para o conjunto
+        inteiro numa só query; as listagens são criadas com um único INSERT de
+        várias linhas (ON CONFLICT DO NOTHING RETURNING). O número de statements
+        não depende do tamanho do lote. Cada skin tem o seu resultado: `listed`,
+        `not_found`, `not_owner`, `already_listed` ou `duplicate` (repetida no pedido).
+        """
+        try:
+            skin_ids = [skin_id for skin_id, _ in items]
+            skins = {
+                row.id: row
+                for row in db.execute(
+                    select(SkinTable.id, SkinTable.owner_id, Marketplace.id.label("marketplace_skin_id"))
+                    .outerjoin(Marketplace, Marketplace.skin_id == SkinTable.id)
+                    .where(SkinTable.id.in_(skin_ids))
+                )
+            }
+
+            results, rows, seen = [], [], set()
+            now = datetime.now(timezone.utc)
+            for skin_id, value in items:
+                skin = skins.get(skin_id)
+                if skin_id in seen:
+                    status = "duplicate"
+                elif skin is None:
+                    status = "not_found"
+                elif skin.owner_id != owner_id:
+                    status = "not_owner"
+                elif skin.marketplace_skin_id is not None:
+                    status = "already_listed"
+                else:
+                    status = "listed"
+                    rows.append({"skin_id": skin_id, "value": value, "listed_at": now})
+                seen.add(skin_id)
+                results.append({"skin_id": skin_id, "marketplace_skin_id": None, "status": status})
+
+            listings = []
+            if rows:
+                created = dict(db.execute(
+                    dialect_insert(db, Marketplace)
+                    .values(rows)
+                    .on_conflict_do_nothing(index_elements=[Marketplace.skin_id])
+                    .returning(Marketplace.skin_id, Marketplace.id)
+                ).all())
+                for result in results:
+                    if result["status"] == "listed":
+                        # Listada por outro pedido entre a verificação e o INSERT
+                        result["marketplace_skin_id"] = created.get(result["skin_id"])
+                        if result["marketplace_skin_id"] is None:
+                            result["status"] = "already_listed"
+                if created:
+                    # Dados das listagens para o feed em tempo real, lidos na mesma transação
+                    listings = db.execute(
+                        select(*_MARKETPLACE_DISPLAY_COLUMNS, Marketplace.id.label("marketplace_skin_id"))
+                        .join(Marketplace, Marketplace.skin_id == SkinTable.id)
+                        .where(Marketplace.id.in_(list(created.values())))
+                        .order_by(Marketplace.id)
+                    ).all()
+                    market_stats.record_listings(db, [(market_stats.skin_key(row), row.value) for row in listings], now)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro ao adicionar skins ao marketplace: {str(e)}") from e
+
+        if listings:
+            LISTINGS.inc("added", amount=len(listings))
+            response_cache.invalidate(MARKETPLACE_SNAPSHOT_KEY)
+            for listing in listings:
+                marketplace_events.publish(LISTING_ADDED, listing._asdict())
+        return {"succeeded": len(listings), "items": results}
+
     def buy_marketplace_skin(self, skin_id: int, buyer_id: int, db: Session) -> None:
         """
         [OPERAÇÃO CRÍTICA/ATÓMICA] Processa a compra de uma skin no marketplace.
 
         Este método garante que a transferência de fundos, a mudança de propriedade
         e a remoção da listagem ocorram todas com sucesso (atomicidade da transação).
+
+        Conflitos transitórios com outras compras (listagem bloqueada, deadlock ou
+        falha de serialização) levam a repetir a transação inteira, com backoff
+        exponencial limitado, até `settings.purchase_max_retries` vezes.
         """
-        try:
-            # 1. Recupera a listagem do marketplace
-            marketplace_skin_query = select(Marketplace).where(Marketplace.skin_id == skin_id)
-            marketplace_skin = db.execute(marketplace_skin_query).scalar_one_or_none()
-            if not marketplace_skin:
-                raise ValueError(f"Skin com id: {skin_id} não está listada no marketplace")
-                
-            # 2. Recupera a Skin, Comprador e Vendedor
-            skin = db.get(SkinTable, skin_id)
-            buyer = db.get(UserTable, buyer_id)
-            
-            if not skin:
-                raise ValueError(f"Skin com id: {skin_id} não existe")
-            if not buyer:
+        attempt = 0
+        while True:
+            try:
+                sold = self._purchase_attempt(skin_id, buyer_id, db)
+                # A listagem sai do marketplace e a skin muda de dono
+                response_cache.invalidate(ALL_SKINS_KEY, MARKETPLACE_SNAPSHOT_KEY)
+                marketplace_events.publish(LISTING_SOLD, sold)
+                return
+            except Exception as e:
+                # Rollback em qualquer falha para reverter todas as alterações
+                db.rollback()
+                if is_retryable_db_error(e) and attempt < settings.purchase_max_retries:
+                    time.sleep(backoff_delay(attempt, settings.purchase_retry_base_delay, settings.purchase_retry_max_delay))
+                    attempt += 1
+                    continue
+                if is_retryable_db_error(e):
+                    raise ValueError("Erro ao comprar skin do marketplace: a listagem está ocupada por outra compra, tente novamente") from e
+                raise ValueError(f"Erro ao comprar skin do marketplace: {str(e)}") from e
+
+    def _purchase_attempt(self, skin_id: int, buyer_id: int, db: Session) -> Dict:
+        """
+        Uma tentativa de compra. As linhas são bloqueadas sempre pela mesma ordem
+        (listagem -> skin -> utilizadores por id crescente) para evitar deadlocks
+        entre compras concorrentes. Os saldos são alterados com UPDATEs atómicos
+        (funds = funds +/- valor), pelo que nunca há atualizações perdidas.
+
+        Devolve os dados do evento `listing-sold` (publicado pelo chamador).
+        """
+        # 1. Bloqueia a listagem do marketplace. Com NOWAIT uma listagem que já está a
+        #    ser comprada falha de imediato (e é repetida); com SKIP LOCKED é ignorada.
+        lock_mode = {"skip_locked": True} if settings.purchase_lock_mode == "skip_locked" else {"nowait": True}
+        marketplace_skin_query = (
+            select(Marketplace.id, Marketplace.value, SkinTable.owner_id, SkinTable.type, SkinTable.name,
+                   SkinTable.float_value)
+            .join(SkinTable, SkinTable.id == Marketplace.skin_id)
+            .where(Marketplace.skin_id == skin_id)
+            .with_for_update(of=Marketplace, **lock_mode)
+        )
+        marketplace_skin = db.execute(marketplace_skin_query).one_or_none()
+        if not marketplace_skin:
+            raise ValueError(f"Skin com id: {skin_id} não está listada no marketplace")
+
+        value = marketplace_skin.value
+        seller_id = marketplace_skin.owner_id
+
+        # 2. Remove a skin da listagem do marketplace. Se outra compra já a removeu
+        #    (bases de dados sem FOR UPDATE, e.g. SQLite), a compra é abortada.
+        removed = db.execute(delete(Marketplace).where(Marketplace.id == marketplace_skin.id))
+        if removed.rowcount != 1:
+            raise ValueError(f"Skin com id: {skin_id} não está listada no marketplace")
+
+        # 3. Transferência de propriedade da skin
+        transferred = db.execute(
+            update(SkinTable)
+            .where(SkinTable.id == skin_id, SkinTable.owner_id == seller_id)
+            .values(owner_id=buyer_id)
+        )
+        if transferred.rowcount != 1:
+            raise ValueError(f"Skin com id: {skin_id} não existe")
+
+        now = datetime.now(timezone.utc)
+        if settings.ledger_mode == "ledger":
+            # 4-5. Modo ledger: saldo verificado sob o lock do snapshot do comprador;
+            #      débito e crédito ficam como entradas novas no ledger
+            balance = ledger.lock_for_transfer(db, buyer_id, [seller_id])
+            if balance is None:
                 raise ValueError(f"Comprador com id: {buyer_id} não existe")
-                
-            value = marketplace_skin.value
-            
-            if buyer.funds < value:
+            if balance < ledger.to_cents(value):
                 raise ValueError("O comprador não tem fundos suficientes")
-                
-            seller = db.get(UserTable, skin.owner_id)
-            if not seller:
+            ledger.record_transfer(db, buyer_id, [(seller_id, ledger.to_cents(value))], now)
+            market_stats.record_sales(db, [(market_stats.skin_key(marketplace_skin), value)], now)
+            db.commit()
+            PURCHASES.inc()
+            PURCHASE_VALUE.inc(amount=value)
+            return {"id": skin_id, "marketplace_skin_id": marketplace_skin.id, "value": value}
+
+        # 4. Executa as operações financeiras, por ordem de id do utilizador
+        debit = (
+            update(UserTable)
+            .where(UserTable.id == buyer_id, UserTable.funds >= value)
+            .values(funds=UserTable.funds - value)
+        )
+        credit = update(UserTable).where(UserTable.id == seller_id).values(funds=UserTable.funds + value)
+        for user_id, statement in sorted([(buyer_id, debit), (seller_id, credit)], key=lambda item: item[0]):
+            result = db.execute(statement)
+            if result.rowcount == 1:
+                continue
+            if user_id == seller_id and statement is credit:
                 # Isto não deve acontecer se a FK estiver configurada corretamente
-                raise ValueError(f"Vendedor com id: {skin.owner_id} não existe") 
-                
-            # 3. Executa as operações financeiras e de propriedade
-            
-            # Débito no comprador
-            buyer.funds -= value
-            # Crédito no vendedor
-            seller.funds += value
-            # Transferência de propriedade da skin
-            skin.owner_id = buyer_id
-            
-            # 4. Regista as transações
-            transaction_query_buyer = Transaction(
-                user_id=buyer_id,
-                amount= -value, # Débito é valor negativo
-                type="purchase"
-            )
-            transaction_query_seller = Transaction(
-                user_id=seller.id,
-                amount= value, # Crédito é valor positivo
-                type="sale"
+                raise ValueError(f"Vendedor com id: {seller_id} não existe")
+            if db.get(UserTable, buyer_id) is None:
+                raise ValueError(f"Comprador com id: {buyer_id} não existe")
+            raise ValueError("O comprador não tem fundos suficientes")
+
+        # 5. Regista as transações
+        db.execute(insert(Transaction), [
+            {"user_id": buyer_id, "amount": -value, "type": "purchase", "date": now},  # Débito é valor negativo
+            {"user_id": seller_id, "amount": value, "type": "sale", "date": now},      # Crédito é valor positivo
+        ])
+
+        # 6. Estatísticas de mercado da skin (floor, listagens, última venda, volume)
+        market_stats.record_sales(db, [(market_stats.skin_key(marketplace_skin), value)], now)
+
+        # 7. Finaliza a transação atómica
+        db.commit()
+        PURCHASES.inc()
+        PURCHASE_VALUE.inc(amount=value)
+        return {"id": skin_id, "marketplace_skin_id": marketplace_skin.id, "value": value}
+
+    def buy_marketplace_skins(self, skin_ids: List[int], buyer_id: int, all_or_nothing: bool, db: Session) -> Dict:
+        """
+        [OPERAÇÃO CRÍTICA/ATÓMICA] Compra várias skins do marketplace numa só transação.
+
+        - all_or_nothing=True: se alguma skin não estiver listada ou o saldo não
+          chegar para o total, nada é comprado (BatchPurchaseError com o resultado
+          de cada skin).
+        - all_or_nothing=False: compra, pela ordem pedida, as skins disponíveis
+          enquanto o saldo chegar; as restantes vêm marcadas no resultado.
+
+        Mesma política de repetição de `buy_marketplace_skin` para conflitos transitórios.
+        """
+        attempt = 0
+        while True:
+            try:
+                result, sold = self._batch_purchase_attempt(skin_ids, buyer_id, all_or_nothing, db)
+                if sold:
+                    response_cache.invalidate(ALL_SKINS_KEY, MARKETPLACE_SNAPSHOT_KEY)
+                    for event in sold:
+                        marketplace_events.publish(LISTING_SOLD, event)
+                return result
+            except BatchPurchaseError:
+                db.rollback()
+                raise
+            except Exception as e:
+                db.rollback()
+                if is_retryable_db_error(e) and attempt < settings.purchase_max_retries:
+                    time.sleep(backoff_delay(attempt, settings.purchase_retry_base_delay, settings.purchase_retry_max_delay))
+                    attempt += 1
+                    continue
+                if is_retryable_db_error(e):
+                    raise ValueError("Erro ao comprar skins do marketplace: uma das listagens está ocupada por outra compra, tente novamente") from e
+                raise ValueError(f"Erro ao comprar skins do marketplace: {str(e)}") from e
+
+    def _batch_purchase_attempt(self, skin_ids: List[int], buyer_id: int, all_or_nothing: bool,
+                                db: Session) -> Tuple[Dict, List[Dict]]:
+        """
+        Uma tentativa de compra em lote, com um número fixo de statements seja qual
+        for o tamanho do lote:
+
+        1. bloqueia todas as listagens num só SELECT ... FOR UPDATE, por id crescente;
+        2. bloqueia o comprador e os vendedores, por id crescente (mesma ordem que
+           `_purchase_attempt`, pelo que compras simples e em lote não se bloqueiam
+           mutuamente em deadlock);
+        3. verifica o saldo uma vez contra o total;
+        4. remove as listagens, transfere as skins e atualiza todos os saldos com um
+           UPDATE agrupado (CASE por utilizador);
+        5. regista todas as transações num único INSERT de várias linhas;
+        6. atualiza as estatísticas de mercado das skins vendidas (market_stats).
+
+        Devolve o resultado por skin e os eventos `listing-sold` (publicados pelo chamador).
+        """
+        requested = list(dict.fromkeys(skin_ids))  # sem repetições, pela ordem pedida
+        lock_mode = {"skip_locked": True} if settings.purchase_lock_mode == "skip_locked" else {"nowait": True}
+        listings = {
+            row.skin_id: row
+            for row in db.execute(
+                select(Marketplace.id, Marketplace.skin_id, Marketplace.value, SkinTable.owner_id,
+                       SkinTable.type, SkinTable.name, SkinTable.float_value)
+                .join(SkinTable, SkinTable.id == Marketplace.skin_id)
+                .where(Marketplace.skin_id.in_(requested))
+                .order_by(Marketplace.id)
+                .with_for_update(of=Marketplace, **lock_mode)
             )
-            db.add(transaction_query_buyer)
-            db.add(transaction_query_seller)
-            
-            # 5. Remove a skin da listagem do marketplace
-            db.delete(marketplace_skin)
-            
-            # 6. Finaliza a transação atómica
-            db.commit()
-        except Exception as e:
-            # Rollback em qualquer falha para reverter todas as alterações
+        }
+
+        if settings.ledger_mode == "ledger":
+            balance = ledger.lock_for_transfer(db, buyer_id, [row.owner_id for row in listings.values()])
+            funds = {} if balance is None else {buyer_id: ledger.from_cents(balance)}
+        else:
+            user_ids = sorted({buyer_id} | {row.owner_id for row in listings.values()})
+            funds = dict(db.execute(
+                select(UserTable.id, UserTable.funds)
+                .where(UserTable.id.in_(user_ids))
+                .order_by(UserTable.id)
+                .with_for_update()
+            ).all())
+        if buyer_id not in funds:
+            raise ValueError(f"Comprador com id: {buyer_id} não existe")
+
+        # Seleção das skins a comprar e verificação do saldo contra o total
+        items, bought, total = [], [], 0.0
+        for skin_id in requested:
+            listing = listings.get(skin_id)
+            if listing is None:
+                items.append({"skin_id": skin_id, "status": "not_listed", "value": None})
+            elif all_or_nothing or total + listing.value <= funds[buyer_id]:
+                items.append({"skin_id": skin_id, "status": "purchased", "value": listing.value})
+                bought.append(listing)
+                total += listing.value
+            else:
+                items.append({"skin_id": skin_id, "status": "insufficient_funds", "value": listing.value})
+
+        if all_or_nothing:
+            if len(bought) != len(requested):
+                raise BatchPurchaseError("Algumas skins não estão listadas no marketplace", items)
+            if total > funds[buyer_id]:
+                for item in items:
+                    item["status"] = "insufficient_funds"
+                raise BatchPurchaseError("O comprador não tem fundos suficientes", items)
+
+        result = {"purchased": len(bought), "total": total, "items": items}
+        if not bought:
             db.rollback()
-            raise ValueError(f"Erro ao comprar skin do marketplace: {str(e)}") from e
-        
+            return result, []
+
+        # Remoção das listagens (bases de dados sem FOR UPDATE, e.g. SQLite: outra
+        # compra pode ter levado alguma entretanto, e o lote é abortado)
+        removed = db.execute(delete(Marketplace).where(Marketplace.id.in_([row.id for row in bought])))
+        if removed.rowcount != len(bought):
+            raise ValueError("Algumas skins deixaram de estar listadas no marketplace")
+
+        db.execute(
+            update(SkinTable)
+            .where(SkinTable.id.in_([row.skin_id for row in bought]))
+            .values(owner_id=buyer_id)
+        )
+
+        now = datetime.now(timezone.utc)
+        if settings.ledger_mode == "ledger":
+            ledger.record_transfer(db, buyer_id, [(row.owner_id, ledger.to_cents(row.value)) for row in bought], now)
+            return self._finish_batch_purchase(db, result, bought, total, now)
+
+        # Variação do saldo por utilizador (o comprador pode também ser vendedor)
+        deltas: Dict[int, float] = {buyer_id: -total}
+        for row in bought:
+            deltas[row.owner_id] = deltas.get(row.owner_id, 0.0) + row.value
+        delta = case(deltas, value=UserTable.id)
+        updated = db.execute(
+            update(UserTable)
+            .where(UserTable.id.in_(list(deltas)), or_(UserTable.id != buyer_id, UserTable.funds + delta >= 0))
+            .values(funds=UserTable.funds + delta)
+        )
+        if updated.rowcount != len(deltas):
+            raise ValueError("O comprador não tem fundos suficientes")
+
+        rows = []
+        for row in bought:
+            rows.append({"user_id": buyer_id, "amount": -row.value, "type": "purchase", "date": now})
+            rows.append({"user_id": row.owner_id, "amount": row.value, "type": "sale", "date": now})
+        db.execute(insert(Transaction).values(rows))
+        return self._finish_batch_purchase(db, result, bought, total, now)
+
+    def _finish_batch_purchase(self, db: Session, result: Dict, bought: List, total: float,
+                               now: datetime) -> Tuple[Dict, List[Dict]]:
+        market_stats.record_sales(db, [(market_stats.skin_key(row), row.value) for row in bought], now)
+        db.commit()
+        PURCHASES.inc(amount=len(bought))
+        PURCHASE_VALUE.inc(amount=total)
+        sold = [{"id": row.skin_id, "marketplace_skin_id": row.id, "value": row.value} for row in bought]
+        return result, sold
+
     def remove_marketplace_skin(self, marketplace_skin_id: int, db: Session) -> None:
         """Remove uma skin da listagem do marketplace (cancelamento de venda)."""
         try:
@@ -345,19 +1089,98 @@ class DatabaseService:
             if not marketplace_skin:
                 raise ValueError(f"Registo de marketplace com id: {marketplace_skin_id} não encontrado")
             
+            removed = {"id": marketplace_skin.skin_id, "marketplace_skin_id": marketplace_skin.id}
+            listing = (market_stats.skin_key(marketplace_skin.skin), marketplace_skin.value)
             db.delete(marketplace_skin)
+            db.flush()
+            market_stats.record_removals(db, [listing], datetime.now(timezone.utc))
             db.commit()
+            LISTINGS.inc("removed")
+            response_cache.invalidate(MARKETPLACE_SNAPSHOT_KEY)
+            marketplace_events.publish(LISTING_REMOVED, removed)
         except Exception as e:
             db.rollback()
             raise ValueError(f"Erro ao remover skin do marketplace: {str(e)}") from e
         
-    def get_user_marketplace_skins(self, user_email: str, db: Session) -> List[Dict]:
+    def remove_marketplace_skins(self, owner_id: int, marketplace_skin_ids: List[int], db: Session) -> Dict:
+        """
+        Remove várias listagens do utilizador de uma vez.
+
+        Existência e posse são verificadas numa só query e as listagens são
+        removidas com um único DELETE ... RETURNING. Cada listagem tem o seu
+        resultado: `removed`, `not_found`, `not_owner` ou `duplicate`.
+        """
+        try:
+            listings = {
+                row.id: row
+                for row in db.execute(
+                    select(Marketplace.id, Marketplace.skin_id, Marketplace.value, SkinTable.owner_id,
+                           SkinTable.type, SkinTable.name, SkinTable.float_value)
+                    .join(SkinTable, SkinTable.id == Marketplace.skin_id)
+                    .where(Marketplace.id.in_(marketplace_skin_ids))
+                )
+            }
+
+            results, owned, seen = [], [], set()
+            for marketplace_skin_id in marketplace_skin_ids:
+                listing = listings.get(marketplace_skin_id)
+                if marketplace_skin_id in seen:
+                    status = "duplicate"
+                elif listing is None:
+                    status = "not_found"
+                elif listing.owner_id != owner_id:
+                    status = "not_owner"
+                else:
+                    status = "removed"
+                    owned.append(marketplace_skin_id)
+                seen.add(marketplace_skin_id)
+                results.append({"skin_id": listing.skin_id if listing else None,
+                                "marketplace_skin_id": marketplace_skin_id, "status": status})
+
+            removed = {}
+            if owned:
+                removed = dict(db.execute(
+                    delete(Marketplace).where(Marketplace.id.in_(owned)).returning(Marketplace.id, Marketplace.skin_id)
+                ).all())
+                for result in results:
+                    # Comprada ou removida por outro pedido entre a verificação e o DELETE
+                    if result["status"] == "removed" and result["marketplace_skin_id"] not in removed:
+                        result["status"] = "not_found"
+                market_stats.record_removals(
+                    db,
+                    [(market_stats.skin_key(listings[marketplace_skin_id]), listings[marketplace_skin_id].value)
+                     for marketplace_skin_id in removed],
+                    datetime.now(timezone.utc),
+                )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro ao remover skins do marketplace: {str(e)}") from e
+
+        if removed:
+            LISTINGS.inc("removed", amount=len(removed))
+            response_cache.invalidate(MARKETPLACE_SNAPSHOT_KEY)
+            for marketplace_skin_id, skin_id in removed.items():
+                marketplace_events.publish(LISTING_REMOVED, {"id": skin_id, "marketplace_skin_id": marketplace_skin_id})
+        return {"succeeded": len(removed), "items": results}
+
+    def get_market_stats(self, skin_type: str, name: str, float_value: Optional[str], db: Session) -> List[Dict]:
+        """
+        Estatísticas de mercado de uma skin por float: listagens ativas, floor,
+        última venda e vendas/volume das últimas 24 horas (ver market_stats.py).
+        """
+        try:
+            return market_stats.get_stats(db, skin_type, name, float_value)
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro ao obter estatísticas de mercado: {str(e)}") from e
+
+    def get_user_marketplace_skins(self, user: Union[Identity, str], db: Session) -> List[Dict]:
         """Recupera as skins listadas para venda pelo utilizador autenticado."""
         try:
-            query_user = select(UserTable.id).where(UserTable.email == user_email)
-            user_id = db.execute(query_user).scalar_one_or_none()
+            user_id = self._resolve_user_id(user, db)
             if user_id is None:
-                raise ValueError(f"Utilizador com email: {user_email} não existe")
+                raise ValueError(f"Utilizador com email: {user} não existe")
             
             # Consulta por skins onde o owner_id é o utilizador, E estão no Marketplace
             query = (
@@ -385,12 +1208,60 @@ class DatabaseService:
         except Exception as e:
             db.rollback()
             raise ValueError(f"Erro ao buscar skins listadas pelo utilizador: {str(e)}") from e
+
+    def get_user_marketplace_skins_json(self, user: Union[Identity, str], db: Session) -> bytes:
+        """
+        Skins listadas para venda pelo utilizador, já serializadas em JSON com os
+        campos de MarketplaceSkinDisplay.
+        """
+        try:
+            user_id = self._resolve_user_id(user, db)
+            if user_id is None:
+                raise ValueError(f"Utilizador com email: {user} não existe")
+            query = (
+                select(*_MARKETPLACE_DISPLAY_COLUMNS)
+                .join(Marketplace, Marketplace.skin_id == SkinTable.id)
+                .where(SkinTable.owner_id == user_id)
+            )
+            return fast_json.dumps_rows(db.execute(query))
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro ao buscar skins listadas pelo utilizador: {str(e)}") from e
         
-    def get_transactions_by_user(self, user_id: int, db: Session) -> List[Dict]:
-        """Recupera o histórico de transações de um utilizador, ordenado por data."""
+    @staticmethod
+    def _history_window(since: Optional[datetime], until: Optional[datetime]) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """Limites da janela em UTC sem fuso horário, como as datas guardadas."""
+        def naive_utc(value):
+            if value is None or value.tzinfo is None:
+                return value
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return naive_utc(since), naive_utc(until)
+
+    def _transactions_query(self, user_id: int, since: Optional[datetime], until: Optional[datetime]):
+        """
+        Histórico de um utilizador (mais recentes primeiro), opcionalmente limitado a
+        [since, until). Com janela, o Postgres só lê as partições mensais desses meses.
+        """
+        query = (
+            select(Transaction.id, Transaction.user_id, Transaction.amount, Transaction.type, Transaction.date)
+            .where(Transaction.user_id == user_id)
+            .order_by(Transaction.date.desc())
+        )
+        if since is not None:
+            query = query.where(Transaction.date >= since)
+        if until is not None:
+            query = query.where(Transaction.date < until)
+        return query
+
+    def get_transactions_by_user(self, user_id: int, db: Session, since: Optional[datetime] = None,
+                                 until: Optional[datetime] = None) -> List[Dict]:
+        """Recupera o histórico de transações de um utilizador, ordenado por data (opcionalmente entre since e until)."""
         try:
-            query = select(Transaction).where(Transaction.user_id == user_id).order_by(Transaction.date.desc())
-            result = db.execute(query).scalars().all()
+            since, until = self._history_window(since, until)
+            if settings.ledger_mode == "ledger":
+                return [ledger.history_row(row) for row in db.execute(ledger.history_query(user_id, since, until))]
+            query = self._transactions_query(user_id, since, until)
+            result = db.execute(query).all()
             transactions_data = []
             for transaction in result:
                 transactions_data.append({
@@ -405,6 +1276,73 @@ class DatabaseService:
             db.rollback()
             raise ValueError(f"Erro ao buscar transações para o utilizador {user_id}: {str(e)}") from e
 
+    def get_transactions_by_user_json(self, user_id: int, db: Session, since: Optional[datetime] = None,
+                                      until: Optional[datetime] = None) -> bytes:
+        """Mesmo resultado que get_transactions_by_user (campos como texto), já serializado em JSON."""
+        try:
+            since, until = self._history_window(since, until)
+            if settings.ledger_mode == "ledger":
+                history = db.execute(ledger.history_query(user_id, since, until))
+                return fast_json.dumps([ledger.history_row(row) for row in history])
+            result = db.execute(self._transactions_query(user_id, since, until))
+            keys = tuple(result.keys())
+            return fast_json.dumps([dict(zip(keys, map(str, row))) for row in result])
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erro ao buscar transações para o utilizador {user_id}: {str(e)}") from e
+
+    # --- LEITURAS EM STREAMING ---
+    #
+    # Variantes dos métodos de listagem para os endpoints de streaming: a consulta é
+    # executada de imediato (erros surgem antes de a resposta começar), mas as linhas
+    # são lidas com um cursor do lado do servidor, em lotes de
+    # `settings.stream_batch_size`, e devolvidas uma a uma como dicts. Não são
+    # criados objetos ORM nem listas intermédias, pelo que a memória não cresce
+    # com o tamanho da tabela.
+
+    def _stream_rows(self, query, db: Session) -> Iterator[Dict]:
+        result = db.execute(query.execution_options(yield_per=settings.stream_batch_size))
+        return (row._asdict() for row in result)
+
+    def stream_all_users(self, db: Session) -> Iterator[Dict]:
+        """Todos os utilizadores (sem dados sensíveis), lidos em streaming."""
+        query = (
+            select(UserTable.id, UserTable.name, UserTable.email, UserTable.role, self._funds_column().label("funds"))
+            .order_by(UserTable.id)
+        )
+        return self._stream_rows(query, db)
+
+    def stream_all_skins(self, db: Session) -> Iterator[Dict]:
+        """Todas as skins base, ordenadas por tipo, lidas em streaming."""
+        query = (
+            select(SkinTable.id, SkinTable.name, SkinTable.type, SkinTable.float_value, SkinTable.owner_id, SkinTable.link)
+            .order_by(SkinTable.type)
+        )
+        return self._stream_rows(query, db)
+
+    def stream_user_skins(self, user_id: int, db: Session) -> Iterator[Dict]:
+        """Skins de um utilizador que não estão listadas no marketplace, lidas em streaming."""
+        query = (
+            select(SkinTable.id, SkinTable.name, SkinTable.type, SkinTable.float_value,
+                   SkinTable.owner_id, SkinTable.date_created, SkinTable.link)
+            .outerjoin(Marketplace, Marketplace.skin_id == SkinTable.id)
+            .where(SkinTable.owner_id == user_id, Marketplace.skin_id == None)
+        )
+        return self._stream_rows(query, db)
+
+    def stream_transactions_by_user(self, user_id: int, db: Session, since: Optional[datetime] = None,
+                                    until: Optional[datetime] = None) -> Iterator[Dict]:
+        """Histórico de transações de um utilizador (mais recentes primeiro), lido em streaming."""
+        since, until = self._history_window(since, until)
+        if settings.ledger_mode == "ledger":
+            query = ledger.history_query(user_id, since, until)
+            result = db.execute(query.execution_options(yield_per=settings.stream_batch_size))
+            return (ledger.history_row(row) for row in result)
+        query = self._transactions_query(user_id, since, until)
+        # Mesmo formato que get_transactions_by_user (todos os campos como texto)
+        return ({key: str(value) for key, value in row.items()} for row in self._stream_rows(query, db))
+
+
 # Alias para facilitar o uso
 Database = DatabaseService
 
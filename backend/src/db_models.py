@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime,ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime,ForeignKey,Index,desc
 import sqlalchemy.orm 
 from datetime import datetime,timezone
 
@@ -13,34 +13,123 @@ class UserTable(Base):
     password = Column(String, nullable=False)
     role = Column(String, default="player")
     funds = Column(Float, default=0.0)
-    date_created = Column(DateTime, default=datetime.now(timezone.utc)) 
+    date_created = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
 
 class SkinTable(Base):
     __tablename__ = "skins"
+    __table_args__ = (
+        # Filtros do marketplace (type, name, float_value)
+        Index("ix_skins_type_name_float", "type", "name", "float_value"),
+        Index("ix_skins_name", "name"),
+        # Inventário e listagens de um utilizador (get_user_skins, get_user_marketplace_skins)
+        Index("ix_skins_owner_id", "owner_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     type = Column(String, nullable=False)
     float_value = Column(String, nullable=False)
     owner_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    date_created = Column(DateTime, default=datetime.now(timezone.utc))
+    date_created = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     link = Column(String,default="https://community.akamai.steamstatic.com/economy/image/i0CoZ81Ui0m-9KwlBY1L_18myuGuq1wfhWSaZgMttyVfPaERSR0Wqmu7LAocGJKz2lu_XuWbwcuyMESA4Fdl-4nnpU7iQA3-kKnr8ytd6s2te7cjd6HHXmHBxep157VtTi_rzUR-5WiHnt39c3_EZg4pW5UjQOZbsBCxw8qnab32FBG7RA/280x210")
     marketplace_items = sqlalchemy.orm.relationship(
         "Marketplace", backref="skin", cascade="all, delete"
     )
      
 class Transaction(Base):
+    """
+    Em Postgres é particionada por mês em `date` (ver partitions.py): a chave
+    primária na base de dados é (id, date), mas `id` continua único (sequência
+    própria) e é a identidade usada pelo ORM.
+    """
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Histórico de um utilizador, do mais recente para o mais antigo (get_transactions_by_user)
+        Index("ix_transactions_user_id_date", "user_id", desc("date")),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     amount = Column(Float, nullable=False)
     type = Column(String, nullable=False)
-    date = Column(DateTime, default=datetime.now(timezone.utc))
+    # Chave de partição: obrigatória e calculada em cada inserção (não no import do módulo)
+    date = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
 
 class Marketplace(Base):
     __tablename__ = "marketplace"
+    __table_args__ = (
+        # Índices para a paginação por cursor (keyset) ordenada por preço ou data
+        Index("ix_marketplace_value_id", "value", "id"),
+        Index("ix_marketplace_listed_at_id", "listed_at", "id"),
+        # Uma skin só pode estar listada uma vez (alvo do ON CONFLICT)
+        Index("ix_marketplace_skin_id", "skin_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True,index=True)
     skin_id = Column(Integer,ForeignKey('skins.id', ondelete="CASCADE"), nullable=False)
-    value = Column(Float, nullable = False)
\ No newline at end of file
+    value = Column(Float, nullable = False)
+    listed_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+
+class LedgerEntry(Base):
+    """
+    Razão (ledger) só de inserções: cada movimento de saldo em cêntimos inteiros
+    (positivo = crédito, negativo = débito). Nunca é alterado nem apagado.
+    """
+    __tablename__ = "ledger_entries"
+    __table_args__ = (
+        # Cauda de um utilizador depois do último snapshot e histórico por utilizador
+        Index("ix_ledger_entries_user_id_id", "user_id", "id"),
+    )
+
+    # BIGINT em Postgres; INTEGER em SQLite (só este é autoincrementado)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)
+    type = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    # Linha de `transactions` de origem (histórico copiado do modo legacy); vazio nas entradas novas
+    transaction_id = Column(Integer, nullable=True)
+
+
+class BalanceSnapshot(Base):
+    """
+    Saldo de um utilizador até à entrada `last_entry_id` do ledger (inclusive).
+    O saldo atual é balance_cents + soma das entradas posteriores (a cauda).
+    """
+    __tablename__ = "balance_snapshots"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    balance_cents = Column(BigInteger, nullable=False, default=0)
+    last_entry_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+
+class MarketStats(Base):
+    """
+    Agregados do marketplace por skin (type, name, float_value), mantidos de forma
+    incremental na mesma transação das listagens e compras (ver market_stats.py).
+    """
+    __tablename__ = "market_stats"
+
+    type = Column(String, primary_key=True)
+    name = Column(String, primary_key=True)
+    float_value = Column(String, primary_key=True)
+    listing_count = Column(Integer, nullable=False, default=0)
+    # Preço mais baixo entre as listagens ativas (None sem listagens)
+    floor_price = Column(Float)
+    last_sale_price = Column(Float)
+    last_sale_at = Column(DateTime)
+    updated_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+
+class MarketStatsHourly(Base):
+    """Vendas por skin e hora (UTC), somadas para o volume das últimas 24 horas."""
+    __tablename__ = "market_stats_hourly"
+
+    type = Column(String, primary_key=True)
+    name = Column(String, primary_key=True)
+    float_value = Column(String, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    sales = Column(Integer, nullable=False, default=0)
+    volume = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,173 @@
+"""
+Difusão (por processo) dos eventos do marketplace para os clientes ligados.
+
+O DatabaseService publica, logo após o commit, um evento por alteração às
+listagens:
+
+- `listing-added`: listagem nova (campos de MarketplaceSkinDisplay + marketplace_skin_id);
+- `listing-removed`: listagem cancelada pelo vendedor;
+- `listing-sold`: listagem comprada.
+
+Cada evento é serializado uma única vez como uma mensagem Server-Sent Events e
+entregue a cada subscritor através de uma fila limitada. Um subscritor lento
+que deixe a sua fila encher é desligado: recebe um último evento `resync` e o
+cliente volta a carregar o marketplace completo antes de se voltar a ligar, em
+vez de acumular memória no servidor ou perder eventos em silêncio.
+
+Os últimos eventos ficam num histórico limitado; um cliente que se volte a
+ligar com `Last-Event-ID` recebe os que perdeu (ou `resync`, se já não
+estiverem no histórico).
+
+Com várias réplicas da API cada uma difunde apenas as alterações feitas por si;
+o `resync` e a recarga inicial do cliente cobrem o resto.
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from backend.src.settings import settings
+from backend.src.utils import fast_json
+
+LISTING_ADDED = "listing-added"
+LISTING_REMOVED = "listing-removed"
+LISTING_SOLD = "listing-sold"
+
+# Mensagem final enviada a um subscritor desligado por estar atrasado
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+class TooManySubscribers(Exception):
+    """O limite de clientes ligados ao feed foi atingido."""
+
+
+class Subscription:
+    """Fila de um cliente ligado, consumida no event loop do servidor."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.loop = loop
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=max_queue)
+        self.closed = False
+
+
+class MarketplaceEvents:
+    """Broadcaster com filas por subscritor e histórico curto para reconexões."""
+
+    def __init__(self, max_queue: int = 256, history: int = 256, max_subscribers: int = 1000):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscription] = set()
+        self._history: Deque[Tuple[int, bytes]] = deque(maxlen=history)
+        self._sequence = 0
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        """
+        Publica um evento para todos os subscritores. Pode ser chamado de qualquer
+        thread (endpoints síncronos correm no threadpool). Devolve o id do evento.
+        """
+        with self._lock:
+            self._sequence += 1
+            event_id = self._sequence
+            frame = b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event_type.encode(), fast_json.dumps(data))
+            self._history.append((event_id, frame))
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(self._deliver, subscription, frame)
+            except RuntimeError:
+                # Event loop já fechado (servidor a terminar)
+                self.unsubscribe(subscription)
+        return event_id
+
+    def _deliver(self, subscription: Subscription, frame: bytes) -> None:
+        if subscription.closed:
+            return
+        try:
+            subscription.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self._drop(subscription)
+
+    def _drop(self, subscription: Subscription) -> None:
+        """Desliga um subscritor atrasado: esvazia a fila e deixa apenas o `resync`."""
+        self.unsubscribe(subscription)
+        with self._lock:
+            self.dropped_subscribers += 1
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(RESYNC_FRAME)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscription:
+        """
+        Regista um subscritor (tem de ser chamado no event loop que o vai consumir).
+        Com `last_event_id`, os eventos posteriores ainda no histórico são repostos.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), self.max_queue)
+        missed: List[bytes] = []
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers("Demasiados clientes ligados ao feed do marketplace")
+            if last_event_id is not None and last_event_id < self._sequence:
+                oldest = self._history[0][0] if self._history else self._sequence + 1
+                if oldest > last_event_id + 1 or self._sequence - last_event_id > self.max_queue:
+                    # Os eventos perdidos já saíram do histórico: o cliente tem de recarregar
+                    subscription.closed = True
+                    subscription.queue.put_nowait(RESYNC_FRAME)
+                    return subscription
+                missed = [frame for event_id, frame in self._history if event_id > last_event_id]
+            self._subscribers.add(subscription)
+        # Ainda no event loop: os eventos repostos ficam antes de qualquer entrega nova
+        for frame in missed:
+            subscription.queue.put_nowait(frame)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscription.closed = True
+            self._subscribers.discard(subscription)
+
+    async def stream(self, subscription: Subscription, keepalive: float) -> AsyncIterator[bytes]:
+        """
+        Mensagens SSE de um subscritor; envia um comentário a cada `keepalive`
+        segundos sem eventos e termina depois de um `resync`.
+        """
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE_FRAME
+                    continue
+                yield frame
+                if frame is RESYNC_FRAME:
+                    return
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "max_subscribers": self.max_subscribers,
+                "max_queue": self.max_queue,
+                "last_event_id": self._sequence,
+                "published": self.published,
+                "dropped_subscribers": self.dropped_subscribers,
+                "queued": sum(subscription.queue.qsize() for subscription in self._subscribers),
+            }
+
+
+# Broadcaster partilhado por todas as instâncias do DatabaseService (síncrono e assíncrono)
+marketplace_events = MarketplaceEvents(
+    max_queue=settings.marketplace_events_queue_size,
+    history=settings.marketplace_events_history,
+    max_subscribers=settings.marketplace_events_max_subscribers,
+)
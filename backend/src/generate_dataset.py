@@ -0,0 +1,361 @@
+"""
+Gerador de datasets sintéticos em massa para benchmarks.
+
+Ao contrário do `seed.py` (2 utilizadores, commit e refresh por linha), este
+gerador cria milhões de utilizadores, skins, listagens e transações de forma
+determinística (mesma seed e mesma data de referência => mesmo dataset, à
+exceção do salt do hash da password) e com
+distribuições enviesadas próximas das de produção:
+
+- poucos utilizadores concentram a maior parte das skins e das transações (Zipf);
+- alguns tipos de skin são muito mais comuns do que outros (Zipf);
+- preços com distribuição log-normal, dependentes do tipo e do float;
+- listagens mais recentes mais frequentes do que as antigas.
+
+Os ids são atribuídos pelo gerador (a partir do maior id existente), pelo que as
+chaves estrangeiras são resolvidas sem ida à base de dados. No Postgres (psycopg2)
+as linhas são carregadas com COPY; nos restantes dialetos com INSERTs em lote.
+No fim as sequências do Postgres são acertadas para o maior id e as estatísticas
+de mercado (market_stats) são calculadas a partir das listagens carregadas, que
+não passam pela manutenção incremental do DatabaseService.
+
+Uso:
+    python -m backend.src.generate_dataset --users 1000000 --skins 5000000 \\
+        --listings 500000 --transactions 10000000
+    python -m backend.src.generate_dataset --database-url sqlite:///bench.db --users 10000 --json stats.json
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from backend.src import market_stats
+from backend.src.db_models import Base, Marketplace, SkinTable, Transaction, UserTable
+from backend.src.seed import FLOATS, SKIN_TYPES
+from backend.src.utils.validation_utils import hash_password
+
+# Frequência relativa de cada float (Field-Tested é o mais comum)
+FLOAT_WEIGHTS = [0.08, 0.22, 0.40, 0.17, 0.13]
+# Multiplicador de preço por float
+FLOAT_PRICE_FACTOR = {
+    "Factory New": 2.2,
+    "Minimal Wear": 1.5,
+    "Field-Tested": 1.0,
+    "Well Worn": 0.8,
+    "Battle-Scarred": 0.65,
+}
+TRANSACTION_TYPES = ["deposit", "purchase", "sale"]
+TRANSACTION_WEIGHTS = [0.4, 0.3, 0.3]
+
+USER_COLUMNS = ("id", "name", "email", "password", "role", "funds", "date_created")
+SKIN_COLUMNS = ("id", "name", "type", "float_value", "owner_id", "date_created", "link")
+MARKETPLACE_COLUMNS = ("id", "skin_id", "value", "listed_at")
+TRANSACTION_COLUMNS = ("id", "user_id", "amount", "type", "date")
+
+
+def zipf_cum_weights(n: int, exponent: float) -> List[float]:
+    """Pesos cumulativos de uma distribuição de Zipf sobre `n` elementos (rank 0 é o mais frequente)."""
+    return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(n)))
+
+
+def skewed_choices(rng: random.Random, population: Sequence, cum_weights: List[float], k: int) -> List:
+    """Escolhe `k` elementos com reposição segundo os pesos cumulativos."""
+    return rng.choices(population, cum_weights=cum_weights, k=k)
+
+
+def chunked(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _table_rng(seed: int, table: str) -> random.Random:
+    # Um gerador por tabela: alterar o número de linhas de uma tabela não muda as outras
+    return random.Random(f"{seed}:{table}")
+
+
+def _naive(moment: datetime) -> datetime:
+    # As colunas DateTime do modelo não guardam fuso horário (valores em UTC)
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def generate_users(count: int, first_id: int, seed: int, anchor: datetime, password_hash: str) -> Iterator[Tuple]:
+    rng = _table_rng(seed, "users")
+    for user_id in range(first_id, first_id + count):
+        yield (
+            user_id,
+            f"user{user_id}",
+            f"user{user_id}@synthetic.cstrader",
+            password_hash,
+            "player",
+            round(rng.lognormvariate(5.5, 1.2), 2),
+            anchor - timedelta(seconds=rng.randrange(3 * 365 * 86400)),
+        )
+
+
+def generate_skins(count: int, first_id: int, user_ids: range, seed: int, anchor: datetime,
+                   exponent: float, batch_size: int) -> Iterator[Tuple]:
+    rng = _table_rng(seed, "skins")
+    owner_weights = zipf_cum_weights(len(user_ids), exponent)
+    catalogue = list(SKIN_TYPES.items())
+    catalogue_weights = zipf_cum_weights(len(catalogue), exponent)
+    float_cum_weights = list(itertools.accumulate(FLOAT_WEIGHTS))
+
+    skin_id = first_id
+    remaining = count
+    while remaining:
+        k = min(batch_size, remaining)
+        owners = skewed_choices(rng, user_ids, owner_weights, k)
+        kinds = skewed_choices(rng, catalogue, catalogue_weights, k)
+        floats = skewed_choices(rng, FLOATS, float_cum_weights, k)
+        for owner_id, (skin_type, link), float_value in zip(owners, kinds, floats):
+            kind, name = skin_type.split()
+            yield (
+                skin_id, name, kind, float_value, owner_id,
+                anchor - timedelta(seconds=rng.randrange(2 * 365 * 86400)), link,
+            )
+            skin_id += 1
+        remaining -= k
+
+
+def choose_listed_skins(count: int, skin_ids: range, seed: int) -> Tuple[random.Random, List[int]]:
+    """
+    Escolhe `count` skins distintas a listar (uma skin só pode estar listada uma
+    vez), por ordem de id. Devolve também o gerador das listagens, já avançado
+    pela amostragem, para os preços e datas de `generate_listings`.
+    """
+    rng = _table_rng(seed, "marketplace")
+    return rng, sorted(rng.sample(skin_ids, count))
+
+
+def generate_listings(first_id: int, chosen: Sequence[int], rng: random.Random, anchor: datetime,
+                      skin_rows: Callable[[int], Tuple[str, str]]) -> Iterator[Tuple]:
+    """
+    Lista as skins `chosen` (ver `choose_listed_skins`).
+
+    `skin_rows(skin_id)` devolve o (tipo, float) da skin, usado para o preço.
+    """
+    base_prices = {skin_type.split()[0]: 40 + 60 * rank for rank, skin_type in enumerate(SKIN_TYPES)}
+    for listing_id, skin_id in enumerate(chosen, start=first_id):
+        kind, float_value = skin_rows(skin_id)
+        price = base_prices.get(kind, 100) * FLOAT_PRICE_FACTOR[float_value] * rng.lognormvariate(0, 0.35)
+        # Listagens recentes são mais frequentes (idade exponencial, média de 7 dias)
+        age = min(rng.expovariate(1 / (7 * 86400)), 180 * 86400)
+        yield (listing_id, skin_id, round(price, 2), anchor - timedelta(seconds=age))
+
+
+def generate_transactions(count: int, first_id: int, user_ids: range, seed: int, anchor: datetime,
+                          exponent: float, batch_size: int) -> Iterator[Tuple]:
+    rng = _table_rng(seed, "transactions")
+    user_weights = zipf_cum_weights(len(user_ids), exponent)
+    type_cum_weights = list(itertools.accumulate(TRANSACTION_WEIGHTS))
+
+    transaction_id = first_id
+    remaining = count
+    while remaining:
+        k = min(batch_size, remaining)
+        users = skewed_choices(rng, user_ids, user_weights, k)
+        kinds = skewed_choices(rng, TRANSACTION_TYPES, type_cum_weights, k)
+        for user_id, kind in zip(users, kinds):
+            amount = round(rng.lognormvariate(4.5, 1.0), 2)
+            if kind == "purchase":
+                amount = -amount
+            yield (
+                transaction_id, user_id, amount, kind,
+                anchor - timedelta(seconds=rng.randrange(365 * 86400)),
+            )
+            transaction_id += 1
+        remaining -= k
+
+
+# --- CARREGAMENTO ---
+
+def _copy_batches(engine: Engine, table: str, columns: Sequence[str], batches: Iterable[List[Tuple]]) -> int:
+    """Carrega as linhas com COPY ... FROM STDIN (psycopg2), um buffer CSV por lote."""
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    total = 0
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for batch in batches:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows(
+                tuple(value.isoformat() if isinstance(value, datetime) else value for value in row)
+                for row in batch
+            )
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            total += len(batch)
+        raw.commit()
+    finally:
+        raw.close()
+    return total
+
+
+def _insert_batches(engine: Engine, table: str, columns: Sequence[str], batches: Iterable[List[Tuple]]) -> int:
+    """Carrega as linhas com INSERTs em lote (executemany), num único commit."""
+    sql_table = Base.metadata.tables[table]
+    total = 0
+    with engine.begin() as conn:
+        for batch in batches:
+            conn.execute(sql_table.insert(), [dict(zip(columns, row)) for row in batch])
+            total += len(batch)
+    return total
+
+
+def resolve_method(engine: Engine, method: str) -> str:
+    if method != "auto":
+        return method
+    return "copy" if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2" else "insert"
+
+
+def _next_id(engine: Engine, model) -> int:
+    with engine.connect() as conn:
+        return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _reset_sequences(engine: Engine) -> None:
+    """Acerta as sequências SERIAL do Postgres para o maior id carregado."""
+    with engine.begin() as conn:
+        for table in ("users", "skins", "marketplace", "transactions"):
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table}), 1))"
+            ))
+
+
+def generate(engine: Engine, users: int, skins: int, listings: int, transactions: int,
+             seed: int = 42, anchor: Optional[datetime] = None, exponent: float = 1.1,
+             batch_size: int = 10_000, method: str = "auto", password: str = "password",
+             analyze: bool = True, log: Callable[[str], None] = lambda message: None) -> Dict:
+    """
+    Gera e carrega o dataset, devolvendo o número de linhas e o débito por tabela.
+    """
+    if listings > skins:
+        raise ValueError("O número de listagens não pode exceder o número de skins")
+    if (skins or transactions) and not users:
+        raise ValueError("São necessários utilizadores para atribuir skins e transações")
+
+    anchor = _naive(anchor or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0))
+    method = resolve_method(engine, method)
+    load = _copy_batches if method == "copy" else _insert_batches
+    # Um único hash para todos os utilizadores: o bcrypt por linha dominaria o tempo de carga
+    password_hash = hash_password(password)
+
+    first_user = _next_id(engine, UserTable)
+    first_skin = _next_id(engine, SkinTable)
+    first_listing = _next_id(engine, Marketplace)
+    first_transaction = _next_id(engine, Transaction)
+    user_ids = range(first_user, first_user + users)
+    skin_ids = range(first_skin, first_skin + skins)
+
+    # As skins a listar são escolhidas antes de gerar as skins, para guardar o
+    # (tipo, float) usado no preço só dessas: memória proporcional às listagens
+    listing_rng, listed_ids = choose_listed_skins(listings, skin_ids, seed)
+    listed = set(listed_ids)
+    skin_kinds: Dict[int, Tuple[str, str]] = {}
+
+    def skins_with_kinds():
+        for row in generate_skins(skins, first_skin, user_ids, seed, anchor, exponent, batch_size):
+            if row[0] in listed:
+                skin_kinds[row[0]] = (row[2], row[3])
+            yield row
+
+    plan = [
+        ("users", USER_COLUMNS, lambda: generate_users(users, first_user, seed, anchor, password_hash)),
+        ("skins", SKIN_COLUMNS, skins_with_kinds),
+        ("marketplace", MARKETPLACE_COLUMNS,
+         lambda: generate_listings(first_listing, listed_ids, listing_rng, anchor, skin_kinds.__getitem__)),
+        ("transactions", TRANSACTION_COLUMNS,
+         lambda: generate_transactions(transactions, first_transaction, user_ids, seed, anchor, exponent, batch_size)),
+    ]
+
+    stats: Dict = {"method": method, "seed": seed, "anchor": anchor.isoformat(), "tables": {}}
+    started_all = time.perf_counter()
+    for table, columns, rows in plan:
+        started = time.perf_counter()
+        loaded = load(engine, table, columns, chunked(rows(), batch_size))
+        elapsed = time.perf_counter() - started
+        stats["tables"][table] = {
+            "rows": loaded,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(loaded / elapsed, 1) if elapsed else 0.0,
+        }
+        log(f">> {table}: {loaded} linhas em {elapsed:.2f}s")
+    skin_kinds.clear()
+    listed.clear()
+
+    if engine.dialect.name == "postgresql":
+        _reset_sequences(engine)
+    if listings:
+        started = time.perf_counter()
+        with Session(engine) as db:
+            stats["market_stats"] = market_stats.reconcile(db)
+        log(f">> market_stats: {stats['market_stats']['corrected']} chaves em {time.perf_counter() - started:.2f}s")
+    if analyze:
+        # Estatísticas atualizadas para o planeador antes de qualquer benchmark
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE" if engine.dialect.name == "sqlite" else "ANALYZE users, skins, marketplace, transactions, market_stats"))
+
+    elapsed_all = time.perf_counter() - started_all
+    total_rows = sum(table["rows"] for table in stats["tables"].values())
+    stats["elapsed_s"] = round(elapsed_all, 3)
+    stats["rows_per_s"] = round(total_rows / elapsed_all, 1) if elapsed_all else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um dataset sintético em massa para benchmarks")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="URL da base de dados (por omissão DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--skins", type=int, default=500_000)
+    parser.add_argument("--listings", type=int, default=50_000)
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--anchor", type=datetime.fromisoformat,
+                        help="Data de referência (ISO 8601) para as datas geradas; por omissão hoje às 00:00 UTC")
+    parser.add_argument("--skew", type=float, default=1.1, help="Expoente de Zipf (0 = uniforme)")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--method", choices=["auto", "copy", "insert"], default="auto")
+    parser.add_argument("--password", default="password", help="Password comum a todos os utilizadores gerados")
+    parser.add_argument("--create-tables", action="store_true", help="Cria as tabelas (sem Alembic) antes de carregar")
+    parser.add_argument("--json", help="Escreve as estatísticas em JSON neste ficheiro")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("Indique --database-url ou defina DATABASE_URL")
+
+    engine = create_engine(args.database_url)
+    if args.create_tables:
+        Base.metadata.create_all(engine)
+    try:
+        stats = generate(
+            engine, args.users, args.skins, args.listings, args.transactions,
+            seed=args.seed, anchor=args.anchor, exponent=args.skew, batch_size=args.batch_size,
+            method=args.method, password=args.password, log=print,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        engine.dispose()
+    print(json.dumps(stats, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(stats, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Serviço de hashing de passwords com capacidade limitada.
+
+O bcrypt é deliberadamente lento (centenas de ms por hash com o custo por
+omissão). Correndo diretamente na thread do pedido, um pico de logins ocupa
+todas as threads do servidor e atrasa endpoints baratos. Aqui o trabalho corre
+num executor dedicado com `settings.password_hash_workers` threads (o bcrypt
+liberta o GIL durante o cálculo) e o número de pedidos em espera é limitado a
+`settings.password_hash_max_queue`; acima disso o pedido falha de imediato com
+`HashingOverloaded`, que os endpoints traduzem para 503.
+
+Os métodos são assíncronos: o endpoint aguarda o resultado sem ocupar nenhuma
+thread do threadpool.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from backend.src.settings import settings
+from backend.src.utils.validation_utils import hash_password, verify_and_update_password
+
+
+class HashingOverloaded(Exception):
+    """O executor de hashing e a sua fila estão cheios."""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        # Vagas = threads a trabalhar + pedidos em espera
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    async def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingOverloaded("Serviço de autenticação sobrecarregado, tente novamente")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        # A vaga só é libertada quando o hash termina, mesmo que o pedido seja cancelado
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future) -> None:
+        self._slots.release()
+        with self._lock:
+            self.in_flight -= 1
+            if future is not None:
+                self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        """Hash de uma password nova (registo)."""
+        return await self._run(hash_password, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verifica a password. Se o hash guardado usar um custo diferente do atual,
+        devolve também o novo hash para ser gravado.
+        """
+        valid, new_hash = await self._run(verify_and_update_password, password, hashed)
+        if new_hash is not None:
+            with self._lock:
+                self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "bcrypt_rounds": settings.password_bcrypt_rounds,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_queue)
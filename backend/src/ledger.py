@@ -0,0 +1,292 @@
+"""
+Razão (ledger) de saldos em cêntimos inteiros, só de inserções.
+
+Ativo com LEDGER_MODE=ledger. Cada movimento (depósito, compra, venda) é uma
+linha nova em `ledger_entries`; nada é alterado nem apagado. O saldo de um
+utilizador é o seu `balance_snapshots.balance_cents` mais a soma das entradas
+posteriores a `last_entry_id` (a cauda), pelo que ler ou reconstruir um saldo
+nunca percorre o histórico inteiro.
+
+Concorrência (Postgres):
+
+- um depósito insere apenas a sua entrada, com um lock partilhado (FOR SHARE)
+  no snapshot do utilizador: depósitos simultâneos não se bloqueiam entre si;
+- uma compra bloqueia o snapshot do comprador em exclusivo (FOR UPDATE), verifica
+  o saldo, insere as entradas de todos os intervenientes num só INSERT e incorpora
+  a cauda do comprador no snapshot. Os vendedores só recebem entradas novas (lock
+  partilhado), em vez de UPDATEs na linha `users`;
+- o lock exclusivo espera pelos depósitos em curso, pelo que nenhuma entrada com
+  id inferior a `last_entry_id` pode ser confirmada depois de o snapshot avançar.
+
+A cauda dos utilizadores que só recebem (depósitos, vendas) é incorporada por
+`compact_balances`:
+
+    python -m backend.src.ledger compact --min-tail 100
+
+O snapshot de um utilizador é criado na primeira utilização em modo ledger, com
+o saldo de `users.funds` nesse momento (saldo de abertura); a partir daí
+`users.funds` deixa de ser atualizado. Antes disso, as linhas de `transactions`
+do utilizador ainda não copiadas (movimentos feitos em modo legacy depois da
+migração) passam para o ledger, para o histórico ficar completo. Todas essas
+entradas já estão incluídas no saldo de abertura, pelo que `last_entry_id`
+começa na última delas e não contam na cauda.
+
+Voltar a LEDGER_MODE=legacy depois disso deixaria `users.funds` desatualizado:
+`check_mode` recusa o arranque nesse caso.
+"""
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import BigInteger, DateTime, and_, cast, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.src.db_models import BalanceSnapshot, LedgerEntry, Transaction, UserTable
+
+
+def to_cents(amount: float) -> int:
+    return int(round(amount * 100))
+
+
+def from_cents(cents: int) -> float:
+    return cents / 100
+
+
+def _ensure_snapshots(db: Session, user_ids: Iterable[int]) -> None:
+    """
+    Cria os snapshots em falta, com o saldo de abertura de `users.funds`. Para os
+    utilizadores sem snapshot, copia primeiro as suas `transactions` em falta para
+    o ledger; a cauda começa depois de todas as entradas já existentes.
+    """
+    now = datetime.now(timezone.utc)
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    # Um snapshot concorrente do mesmo utilizador espera pelo commit deste (conflito
+    # na chave primária), pelo que só quem o cria copia o histórico
+    created = db.execute(
+        dialect.insert(BalanceSnapshot)
+        .from_select(
+            ["user_id", "balance_cents", "last_entry_id", "updated_at"],
+            select(
+                UserTable.id,
+                cast(func.round(func.coalesce(UserTable.funds, 0) * 100), BigInteger),
+                literal(0, BigInteger),
+                literal(now, DateTime),
+            ).where(UserTable.id.in_(list(user_ids)))
+        )
+        .on_conflict_do_nothing(index_elements=[BalanceSnapshot.user_id])
+        .returning(BalanceSnapshot.user_id)
+    ).scalars().all()
+    if not created:
+        return
+    _import_transactions(db, created)
+    db.execute(
+        update(BalanceSnapshot)
+        .where(BalanceSnapshot.user_id.in_(created))
+        .values(last_entry_id=select(func.coalesce(func.max(LedgerEntry.id), 0))
+                .where(LedgerEntry.user_id == BalanceSnapshot.user_id).scalar_subquery())
+    )
+
+
+def _import_transactions(db: Session, user_ids: List[int]) -> None:
+    """Copia para o ledger as `transactions` dos utilizadores posteriores à última já copiada."""
+    copied = (
+        select(func.coalesce(func.max(LedgerEntry.transaction_id), 0))
+        .where(LedgerEntry.user_id == Transaction.user_id)
+        .scalar_subquery()
+    )
+    db.execute(
+        insert(LedgerEntry).from_select(
+            ["user_id", "amount_cents", "type", "created_at", "transaction_id"],
+            select(Transaction.user_id, cast(func.round(Transaction.amount * 100), BigInteger),
+                   Transaction.type, Transaction.date, Transaction.id)
+            .where(Transaction.user_id.in_(user_ids), Transaction.id > copied)
+            .order_by(Transaction.date, Transaction.id)
+        )
+    )
+
+
+def check_mode(db: Session, mode: str) -> None:
+    """
+    Recusa LEDGER_MODE=legacy quando já há snapshots: o modo ledger não atualiza
+    `users.funds`, pelo que os saldos em modo legacy estariam errados.
+    """
+    if mode == "legacy" and db.execute(select(BalanceSnapshot.user_id).limit(1)).first() is not None:
+        raise RuntimeError(
+            "LEDGER_MODE=legacy, mas os saldos já estão no ledger (balance_snapshots) "
+            "e users.funds está desatualizado: use LEDGER_MODE=ledger"
+        )
+
+
+def _tail():
+    """Entradas do ledger posteriores ao snapshot (condição de junção)."""
+    return and_(LedgerEntry.user_id == BalanceSnapshot.user_id, LedgerEntry.id > BalanceSnapshot.last_entry_id)
+
+
+def balance_cents(db: Session, user_id: int) -> Optional[int]:
+    """Saldo atual: snapshot + cauda. None se o utilizador ainda não tiver snapshot."""
+    return db.execute(
+        select(BalanceSnapshot.balance_cents + func.coalesce(func.sum(LedgerEntry.amount_cents), 0))
+        .select_from(BalanceSnapshot)
+        .outerjoin(LedgerEntry, _tail())
+        .where(BalanceSnapshot.user_id == user_id)
+        .group_by(BalanceSnapshot.user_id, BalanceSnapshot.balance_cents)
+    ).scalar_one_or_none()
+
+
+def get_balance(db: Session, user_id: int) -> Optional[float]:
+    """Saldo de um utilizador (sem escrever nada). None se o utilizador não existir."""
+    cents = balance_cents(db, user_id)
+    if cents is None:
+        funds = db.execute(select(UserTable.funds).where(UserTable.id == user_id)).one_or_none()
+        return None if funds is None else from_cents(to_cents(funds[0] or 0.0))
+    return from_cents(cents)
+
+
+def balance_column():
+    """
+    Saldo (em unidades) do utilizador da linha de `users` (expressão correlacionada,
+    para listagens sem uma query por utilizador): o mesmo que `get_balance`.
+    """
+    snapshot = (
+        select(BalanceSnapshot.balance_cents
+               + select(func.coalesce(func.sum(LedgerEntry.amount_cents), 0)).where(_tail()).scalar_subquery())
+        .where(BalanceSnapshot.user_id == UserTable.id)
+        .scalar_subquery()
+    )
+    return func.coalesce(snapshot / 100.0, func.round(func.coalesce(UserTable.funds, 0.0), 2))
+
+
+def _fold(db: Session, user_id: int) -> None:
+    """Incorpora a cauda no snapshot (o snapshot tem de estar bloqueado em exclusivo)."""
+    db.execute(
+        update(BalanceSnapshot)
+        .where(BalanceSnapshot.user_id == user_id)
+        .values(
+            balance_cents=BalanceSnapshot.balance_cents
+            + select(func.coalesce(func.sum(LedgerEntry.amount_cents), 0)).where(_tail()).scalar_subquery(),
+            last_entry_id=select(func.coalesce(func.max(LedgerEntry.id), BalanceSnapshot.last_entry_id))
+            .where(_tail()).scalar_subquery(),
+            updated_at=datetime.now(timezone.utc),
+        )
+    )
+
+
+def deposit(db: Session, user_id: int, amount: float) -> Optional[float]:
+    """
+    Regista um depósito (uma inserção, sem UPDATE do saldo) e devolve o novo
+    saldo, ou None se o utilizador não existir. Não faz commit.
+    """
+    _ensure_snapshots(db, [user_id])
+    locked = db.execute(
+        select(BalanceSnapshot.user_id).where(BalanceSnapshot.user_id == user_id).with_for_update(read=True)
+    ).one_or_none()
+    if locked is None:
+        return None
+    db.execute(insert(LedgerEntry).values(user_id=user_id, amount_cents=to_cents(amount), type="deposit",
+                                          created_at=datetime.now(timezone.utc)))
+    return from_cents(balance_cents(db, user_id))
+
+
+def lock_for_transfer(db: Session, buyer_id: int, seller_ids: Iterable[int]) -> Optional[int]:
+    """
+    Bloqueia, por ordem de user_id, o snapshot do comprador (exclusivo) e os dos
+    vendedores (partilhado), e devolve o saldo do comprador em cêntimos (None se
+    não existir). No máximo três statements de lock, seja qual for o número de vendedores.
+    """
+    sellers = set(seller_ids) - {buyer_id}
+    _ensure_snapshots(db, sellers | {buyer_id})
+    below = sorted(user_id for user_id in sellers if user_id < buyer_id)
+    above = sorted(user_id for user_id in sellers if user_id > buyer_id)
+
+    def lock_shared(user_ids: List[int]) -> None:
+        if user_ids:
+            db.execute(
+                select(BalanceSnapshot.user_id).where(BalanceSnapshot.user_id.in_(user_ids))
+                .order_by(BalanceSnapshot.user_id).with_for_update(read=True)
+            ).all()
+
+    lock_shared(below)
+    buyer = db.execute(
+        select(BalanceSnapshot.user_id).where(BalanceSnapshot.user_id == buyer_id).with_for_update()
+    ).one_or_none()
+    lock_shared(above)
+    return None if buyer is None else balance_cents(db, buyer_id)
+
+
+def record_transfer(db: Session, buyer_id: int, sales: List[Tuple[int, int]], now: datetime) -> None:
+    """
+    Regista compras já verificadas: `sales` são pares (vendedor, cêntimos). Insere
+    todas as entradas (débito do comprador, crédito de cada vendedor) num só
+    INSERT e incorpora a cauda do comprador no seu snapshot. Não faz commit.
+    """
+    rows = []
+    for seller_id, cents in sales:
+        rows.append({"user_id": buyer_id, "amount_cents": -cents, "type": "purchase", "created_at": now})
+        rows.append({"user_id": seller_id, "amount_cents": cents, "type": "sale", "created_at": now})
+    db.execute(insert(LedgerEntry).values(rows))
+    _fold(db, buyer_id)
+
+
+def history_query(user_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Entradas de um utilizador (opcionalmente em [since, until)), das mais recentes para as mais antigas."""
+    query = (
+        select(LedgerEntry.id, LedgerEntry.user_id, LedgerEntry.amount_cents, LedgerEntry.type, LedgerEntry.created_at)
+        .where(LedgerEntry.user_id == user_id)
+        .order_by(LedgerEntry.id.desc())
+    )
+    if since is not None:
+        query = query.where(LedgerEntry.created_at >= since)
+    if until is not None:
+        query = query.where(LedgerEntry.created_at < until)
+    return query
+
+
+def history_row(row) -> Dict[str, str]:
+    """Entrada no formato de get_transactions_by_user (campos como texto, valor em unidades)."""
+    return {
+        "id": str(row.id),
+        "user_id": str(row.user_id),
+        "amount": str(from_cents(row.amount_cents)),
+        "type": str(row.type),
+        "date": str(row.created_at),
+    }
+
+
+def compact_balances(db: Session, min_tail: int = 1) -> int:
+    """
+    Incorpora nos snapshots as caudas com pelo menos `min_tail` entradas, um
+    utilizador de cada vez (lock exclusivo curto, commit por utilizador).
+    Devolve o número de snapshots atualizados.
+    """
+    user_ids = db.execute(
+        select(BalanceSnapshot.user_id)
+        .join(LedgerEntry, _tail())
+        .group_by(BalanceSnapshot.user_id)
+        .having(func.count(LedgerEntry.id) >= min_tail)
+        .order_by(BalanceSnapshot.user_id)
+    ).scalars().all()
+    db.commit()
+    for user_id in user_ids:
+        db.execute(select(BalanceSnapshot.user_id).where(BalanceSnapshot.user_id == user_id).with_for_update()).one()
+        _fold(db, user_id)
+        db.commit()
+    return len(user_ids)
+
+
+def main():
+    from backend.src.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Manutenção do ledger de saldos")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    compact = subcommands.add_parser("compact", help="Incorpora as caudas do ledger nos snapshots de saldo")
+    compact.add_argument("--min-tail", type=int, default=1, help="Só utilizadores com pelo menos N entradas por incorporar")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        if args.command == "compact":
+            print(f"{compact_balances(db, args.min_tail)} snapshots atualizados")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,45 @@
-from typing import Union,Dict,List
-from fastapi import FastAPI,Body, Request, status, HTTPException
+from typing import Union,Dict,List,Optional
+from datetime import datetime
+from fastapi import FastAPI,Body, Header, Query, Request, Response, status, HTTPException
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
 from fastapi.params import Depends
-from backend.src.models import User, RegisterRequest, CreateSkinRequest,EditSkinRequest,SkinDisplay, DepositRequest,MarketplaceSkinDisplay,AddMarketplaceSkinRequest
-from backend.src.utils.validation_utils import hash_password,verify_password
-from backend.src.utils.security import get_current_user, get_current_admin_user
-from backend.src.utils.auth_utils import create_access_token
-from backend.src.database import DatabaseService, get_db
+from backend.src.models import User, RegisterRequest, CreateSkinRequest,EditSkinRequest,SkinDisplay, DepositRequest,MarketplaceSkinDisplay,AddMarketplaceSkinRequest,MarketplacePage,Identity,BatchPurchaseRequest,BatchPurchaseResult,BulkListRequest,BulkDelistRequest,BulkListingResponse,SkinSearchPage,MarketStatsDisplay
+from backend.src.hashing import password_hasher, HashingOverloaded
+from backend.src.utils.security import get_current_user, get_current_identity, get_current_admin_user, get_read_db
+from backend.src.utils.auth_utils import create_access_token, token_cache
+from backend.src.database import DatabaseService, BatchPurchaseError, get_db, engine, read_router, SessionLocal
+from backend.src import ledger
+from backend.src.pool import pool_status
+from backend.src.cache import response_cache
+from backend.src.events import marketplace_events, TooManySubscribers
+from backend.src.metrics import MetricsMiddleware, registry, collect_threadpool, instrument_threadpool, CONTENT_TYPE
+from backend.src.query_stats import QueryStatsMiddleware
+from backend.src.settings import settings
+from backend.src.utils.fast_json import dumps_envelope
+from backend.src.utils.bulk_import import import_skins
+from backend.src.async_api import router as async_router
+from backend.src.stream_api import router as stream_router
+from backend.src.async_database import created_async_engine
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Com saldos já no ledger, arrancar em modo legacy leria um users.funds desatualizado
+    with SessionLocal() as db:
+        ledger.check_mode(db, settings.ledger_mode)
+    yield
+
 
 # Inicialização da Aplicação
 app = FastAPI(
     title="CSTrader API MVP",
     description="API para Marketplace de Skins, com gestão de utilizadores, inventário e transações financeiras.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 db_service = DatabaseService()
 
@@ -32,24 +57,40 @@ app.add_middleware(
     allow_headers=["*"],              
 )
 
+# Statements SQL e tempo de base de dados por pedido (cabeçalhos X-DB-* em modo debug)
+app.add_middleware(QueryStatsMiddleware)
+
+# Métricas por rota (latência, tamanho das respostas, pedidos em curso) para o /metrics
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    instrument_threadpool()
+
+# Endpoints assíncronos (AsyncEngine) sob /async, lado a lado com os síncronos
+app.include_router(async_router)
+# Listagens grandes em streaming (cursor do lado do servidor) sob /stream
+app.include_router(stream_router)
+
 # ----------------------------------------------------
 # 1. ENDPOINTS DE AUTENTICAÇÃO E UTILIZADORES
 # ----------------------------------------------------
 
 @app.post("/register_user", status_code=status.HTTP_201_CREATED, response_model=Dict[str, str])
-def register_user(
+async def register_user(
     user_data: RegisterRequest = Body(...,description="Dados de registo do utilizador (nome, email, password)"),
     db: Session = Depends(get_db) 
     ) -> Dict[str, str]:
     """
     Regista um novo utilizador na base de dados.
 
-    - Faz o hash da password fornecida.
+    - Faz o hash da password fornecida (executor de hashing dedicado; 503 se estiver cheio).
     - Cria um novo objeto User com role 'user' e fundos iniciais de 0.0.
     - Guarda o utilizador usando o DatabaseService.
     """
     # hash da password antes de guardar
-    password_hashed = hash_password(user_data.password)
+    try:
+        password_hashed = await password_hasher.hash(user_data.password)
+    except HashingOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     new_user = User(
         id=0,
         name=user_data.name,
@@ -60,7 +101,7 @@ def register_user(
     )
     #Save user to database
     try:
-        user_id = db_service.create_user(new_user,db)
+        user_id = await run_in_threadpool(db_service.create_user, new_user, db)
         return {"message": "User registered successfully", "user_id": user_id}   
     except HTTPException:
         raise
@@ -81,7 +122,7 @@ def get_user_by_email(email: str,current_user: dict = Depends(get_current_user)
                 "name": user.name,
                 "email": user.email,
                 "role": user.role,
-                "funds": user.funds
+                "funds": db_service.get_balance(user.id, db) if settings.ledger_mode == "ledger" else user.funds
             }
             return {"message": "Utilizador recuperado com sucesso", "user": user_data}
         else:
@@ -91,19 +132,29 @@ def get_user_by_email(email: str,current_user: dict = Depends(get_current_user)
 
 
 @app.post("/login",status_code=status.HTTP_200_OK)
-def login_user(email: str = Body(..., embed=True), password: str = Body(..., embed=True), db: Session = Depends(get_db) ) -> Dict[str, str]:
+async def login_user(email: str = Body(..., embed=True), password: str = Body(..., embed=True), db: Session = Depends(get_db) ) -> Dict[str, str]:
     """
     Autentica um utilizador e emite um JWT (JSON Web Token).
+
+    - A verificação bcrypt corre no executor de hashing (503 se estiver cheio).
+    - Se o custo do bcrypt tiver mudado, o hash guardado é refeito de forma transparente.
     """
     try:
-        user = db_service.get_user_by_email(email,db)
+        user = await run_in_threadpool(db_service.get_user_by_email, email, db)
+        valid = False
+        if user:
+            valid, new_hash = await password_hasher.verify_and_update(password, user.password)
+            if valid and new_hash:
+                await run_in_threadpool(db_service.update_password_hash, user.id, new_hash, db)
         # Verifica se o utilizador existe e se a password está correta
-        if  user and verify_password(password,user.password):
+        if valid:
             # Cria o token de acesso com o email e role no payload
-            token = create_access_token({"sub": user.email, "role": user.role})
+            token = create_access_token({"sub": user.email, "role": user.role, "uid": user.id})
             return {"message": "Login bem-sucedido", "user_id": str(user.id), "access_token":token, "token_type":"bearer", "role": user.role}
         else:
             raise HTTPException(status_code=401, detail="Email ou password inválidos")
+    except HashingOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except HTTPException:
         raise
     except Exception as e:
@@ -135,19 +186,17 @@ def logout_user(current_user: dict = Depends(get_current_user)) -> Dict[str, str
 # ----------------------------------------------------
 
 @app.get("/inventory", status_code=status.HTTP_200_OK, response_model=Dict[str, Union[str, List]])
-def get_my_skins(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)) -> Dict[str, Union[str, List]]:
+def get_my_skins(identity: Identity = Depends(get_current_identity), db: Session = Depends(get_read_db)) -> Dict[str, Union[str, List]]:
     """
     Recupera todas as skins que pertencem ao utilizador autenticado (o seu inventário).
     """
     try:
-        user_email = current_user['sub']
-        user = db_service.get_user_by_email(user_email, db)
-        if not user:
-            raise HTTPException(status_code=404, detail="Utilizador não encontrado")
-        
-        # Recupera as skins do inventário
-        skins = db_service.get_user_skins(user.id, db)
-        return {"message": "Skins do utilizador recuperadas com sucesso", "skins": skins}
+        # Recupera as skins do inventário (já serializadas, sem revalidação pelo response_model)
+        skins = db_service.get_user_skins_json(identity.user_id, db)
+        return Response(
+            content=dumps_envelope({"message": "Skins do utilizador recuperadas com sucesso"}, "skins", skins),
+            media_type="application/json"
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -155,13 +204,16 @@ def get_my_skins(current_user: dict = Depends(get_current_user), db: Session = D
     
     
 @app.get("/user/skins/{user_id}", status_code=status.HTTP_200_OK, response_model=Dict[str, Union[str, List]])
-def get_user_skins_by_id(user_id: int, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)) -> Dict[str, Union[str, List]]:
+def get_user_skins_by_id(user_id: int, current_user: dict = Depends(get_current_user), db: Session = Depends(get_read_db)) -> Dict[str, Union[str, List]]:
     """
     Recupera as skins de qualquer utilizador pelo seu ID.
     """
     try:
-        skins = db_service.get_user_skins(user_id, db)
-        return {"message": "Skins do utilizador recuperadas com sucesso", "skins": skins}
+        skins = db_service.get_user_skins_json(user_id, db)
+        return Response(
+            content=dumps_envelope({"message": "Skins do utilizador recuperadas com sucesso"}, "skins", skins),
+            media_type="application/json"
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -170,62 +222,59 @@ def get_user_skins_by_id(user_id: int, current_user: dict = Depends(get_current_
 @app.post("/wallet/deposit", status_code=status.HTTP_200_OK)
 def deposit_funds(
     deposit: DepositRequest = Body(..., description="Montante a depositar"),
-    current_user: dict = Depends(get_current_user),
+    identity: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
     Permite ao utilizador autenticado depositar fundos na sua carteira.
 
-    - Atualiza o campo 'funds' do utilizador.
-    - Regista a transação na tabela 'Transaction'.
+    - Atualiza o campo 'funds' do utilizador (UPDATE atómico na base de dados).
+    - Regista a transação na tabela 'Transaction', no mesmo commit.
     """
     try:
-        user_email = current_user["sub"]
-        user = db_service.get_user_by_email(user_email, db)
-
-        if not user:
-            raise HTTPException(status_code=404, detail="Utilizador não encontrado")
-
-        # Atualizar saldo
-        user.funds += deposit.amount
-        db.commit()
-        db.refresh(user)
-
-        # Registrar transação na tabela Transaction
-        db_service.create_transaction(
-            user_id=user.id,
-            amount=deposit.amount,
-            transaction_type="deposit",
-            db=db
-        )
-
+        new_balance = db_service.deposit_funds(identity, deposit.amount, db)
         return {
             "message": "Depósito realizado com sucesso.",
-            "new_balance": user.funds
+            "new_balance": new_balance
         }
+    except ValueError as e:
+        if "não encontrado" in str(e):
+            raise HTTPException(status_code=404, detail="Utilizador não encontrado")
+        raise HTTPException(status_code=500, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar depósito: {str(e)}")
    
+@app.get("/wallet/balance", status_code=status.HTTP_200_OK)
+def get_wallet_balance(
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_read_db)
+) -> Dict[str, float]:
+    """
+    Saldo atual do utilizador autenticado (no modo ledger: snapshot + entradas posteriores).
+    """
+    balance = db_service.get_balance(identity.user_id, db)
+    if balance is None:
+        raise HTTPException(status_code=404, detail="Utilizador não encontrado")
+    return {"balance": balance}
+
+
 @app.get("/transactions/history", status_code=status.HTTP_200_OK, response_model=List[Dict[str, str]])
 def get_transaction_history(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    since: Optional[datetime] = Query(None, description="Só transações a partir desta data (inclusive)"),
+    until: Optional[datetime] = Query(None, description="Só transações anteriores a esta data"),
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_read_db)
     ) -> List[Dict[str, str]]:
     """
-    Obtém o histórico de transações financeiras do utilizador autenticado.
+    Obtém o histórico de transações financeiras do utilizador autenticado,
+    opcionalmente limitado ao intervalo [since, until).
     """
     try:
-        user_email = current_user["sub"]
-        user = db_service.get_user_by_email(user_email, db)
-
-        if not user:
-            raise HTTPException(status_code=404, detail="Utilizador não encontrado")
+        transactions = db_service.get_transactions_by_user_json(identity.user_id, db, since, until)
 
-        transactions = db_service.get_transactions_by_user(user.id, db)
-
-        return transactions
+        return Response(content=transactions, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -280,18 +329,59 @@ def edit_skin_admin(
     
 @app.get("/skins/all", status_code=status.HTTP_200_OK, response_model=List[SkinDisplay])
 def get_all_skins(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_admin: dict = Depends(get_current_admin_user)
     ) -> Dict[str, List[str]]:
     """
     [ADMIN ONLY] Lista todas as skins base disponíveis no sistema.
+
+    - A resposta serializada vem da cache de respostas (invalidada pelas escritas).
     """
     try:
-        skins = db_service.get_all_skins(db)
-        return skins
+        return Response(content=db_service.get_all_skins_json(db), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins base: {str(e)}") from e
     
+@app.get("/skins/search", status_code=status.HTTP_200_OK, response_model=SkinSearchPage)
+def search_skins(
+    q: str = Query(..., min_length=2, max_length=100, description="Texto a pesquisar no nome ou tipo da skin"),
+    scope: str = Query("catalog", pattern="^(catalog|marketplace)$", description="catalog (todas as skins) ou marketplace (listagens ativas)"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+    ) -> SkinSearchPage:
+    """
+    Pesquisa skins por nome ou tipo, tolerante a erros de escrita.
+
+    - Resultados ordenados por relevância (prefixos primeiro) e paginados por offset.
+    - Com scope=marketplace só devolve skins listadas, com o preço e o id da listagem.
+    """
+    try:
+        return db_service.search_skins(q, db, scope=scope, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na pesquisa de skins: {str(e)}") from e
+
+
+@app.get("/skins/autocomplete", status_code=status.HTTP_200_OK)
+def autocomplete_skins(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+    ) -> Dict[str, List[str]]:
+    """
+    Sugestões de nomes e tipos de skins para o texto escrito até agora.
+    """
+    try:
+        return {"suggestions": db_service.autocomplete_skins(prefix, db, limit)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro no autocomplete de skins: {str(e)}") from e
+
 @app.delete("/admin/skin/delete/{skin_id}", status_code=status.HTTP_200_OK, response_model=str)
 def delete_skin_admin(
     skin_id: int,
@@ -314,30 +404,196 @@ def delete_skin_admin(
         raise HTTPException(status_code=500, detail=f"Erro ao eliminar skin: {str(e)}") from e
     
 
+@app.post("/admin/skins/import", status_code=status.HTTP_200_OK)
+async def import_skins_admin(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="csv (com cabeçalho) ou ndjson (um objeto por linha)"),
+    current_admin: dict = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+    ) -> Dict:
+    """
+    [ADMIN ONLY] Importação em massa do catálogo a partir do corpo do pedido (CSV ou NDJSON).
+
+    - Cada linha cria (`op=create`, sem id), atualiza (`op=update`, com id) ou elimina (`op=delete`) uma skin.
+    - O ficheiro é lido em streaming e aplicado em lotes, cada um com o seu commit.
+    - Devolve contadores, erros por linha e o débito em linhas por segundo.
+    """
+    async def apply_batch(rows):
+        return await run_in_threadpool(db_service.apply_skin_import, rows, db)
+
+    return await import_skins(
+        request.stream(), format, apply_batch,
+        batch_size=settings.skin_import_batch_size,
+        max_line_bytes=settings.skin_import_max_line_bytes,
+        max_errors=settings.skin_import_max_errors,
+    )
+
+
+@app.get("/admin/db/pool", status_code=status.HTTP_200_OK)
+def get_db_pool_status(current_admin: dict = Depends(get_current_admin_user)) -> Dict[str, Dict]:
+    """
+    [ADMIN ONLY] Estado do pool de ligações à base de dados.
+
+    - Ligações em uso (checked_out), livres (idle) e em overflow.
+    - Contadores acumulados de checkouts, ligações novas, timeouts e tempo de espera.
+    - Uma entrada por réplica de leitura, com o seu estado (up, retry_in_s).
+    """
+    pools = {"primary": pool_status(engine, "primary")}
+    async_engine = created_async_engine()
+    if async_engine is not None:
+        pools["async"] = pool_status(async_engine.sync_engine, "async")
+    for replica, health in zip(read_router.replicas, read_router.status()):
+        pools[replica.name] = {**pool_status(replica.engine, replica.name), **health}
+    return pools
+
+
+@app.get("/admin/cache", status_code=status.HTTP_200_OK)
+def get_response_cache_stats(current_admin: dict = Depends(get_current_admin_user)) -> Dict:
+    """
+    [ADMIN ONLY] Estatísticas da cache de respostas (hits, misses, expirações, invalidações).
+    """
+    return response_cache.stats()
+
+
+@app.get("/admin/events", status_code=status.HTTP_200_OK)
+def get_marketplace_events_stats(current_admin: dict = Depends(get_current_admin_user)) -> Dict:
+    """
+    [ADMIN ONLY] Estado do feed do marketplace (clientes ligados, eventos publicados, desligados por atraso).
+    """
+    return marketplace_events.stats()
+
+
+@app.get("/admin/auth/tokens", status_code=status.HTTP_200_OK)
+def get_token_cache_stats(current_admin: dict = Depends(get_current_admin_user)) -> Dict:
+    """
+    [ADMIN ONLY] Estatísticas da cache de tokens verificados (hits, misses, entradas).
+    """
+    return token_cache.stats()
+
+
+@app.get("/admin/auth/hashing", status_code=status.HTTP_200_OK)
+def get_password_hashing_stats(current_admin: dict = Depends(get_current_admin_user)) -> Dict:
+    """
+    [ADMIN ONLY] Estado do executor de hashing de passwords (em curso, rejeitados, rehashes).
+    """
+    return password_hasher.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """
+    Métricas no formato de texto do Prometheus. Sem autenticação, para o
+    scraper; em produção deve ficar acessível apenas pela rede interna.
+    """
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    collect_threadpool()
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
 # ----------------------------------------------------
 # 4. ENDPOINTS DO MARKETPLACE
 # ----------------------------------------------------
 
 @app.get("/marketplace/skins", status_code=status.HTTP_200_OK, response_model=List[MarketplaceSkinDisplay])
 def get_marketplace_skins(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_read_db)
     ) -> Dict[str, List[str]]:
     """
     Lista todas as skins que estão ativamente disponíveis para compra no marketplace.
     """
-    user_email = current_user['sub']
     try:
-        skins = db_service.get_marketplace_skins(user_email,db)
-        return skins
+        # Snapshot partilhado em cache, filtrado para excluir as skins do próprio utilizador
+        return Response(content=db_service.get_marketplace_skins_json(identity, db), media_type="application/json")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins do marketplace: {str(e)}") from e
+
+
+@app.get("/marketplace/events", status_code=status.HTTP_200_OK)
+async def marketplace_events_feed(
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+    current_user: dict = Depends(get_current_user)
+    ) -> StreamingResponse:
+    """
+    Feed em tempo real do marketplace (Server-Sent Events).
+
+    - Eventos `listing-added`, `listing-removed` e `listing-sold`, depois do commit.
+    - O cliente carrega /marketplace/skins uma vez e aplica os eventos seguintes.
+    - `resync`: o cliente atrasou-se (ou perdeu eventos) e deve recarregar o marketplace.
+    - Com `Last-Event-ID` são repostos os eventos perdidos desde esse id.
+    """
+    try:
+        subscription = marketplace_events.subscribe(last_event_id)
+    except TooManySubscribers as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return StreamingResponse(
+        marketplace_events.stream(subscription, settings.marketplace_events_keepalive),
+        media_type="text/event-stream",
+        # Sem buffering no proxy (nginx), para os eventos chegarem de imediato
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/marketplace/skins/page", status_code=status.HTTP_200_OK, response_model=MarketplacePage)
+def get_marketplace_skins_page(
+    limit: int = Query(50, ge=1, le=200, description="Número máximo de listagens por página"),
+    cursor: Optional[str] = Query(None, description="Cursor devolvido pela página anterior"),
+    sort: str = Query("listed_at", pattern="^(price|listed_at)$", description="Ordenar por preço ou data de listagem"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    skin_type: Optional[str] = Query(None, alias="type"),
+    name: Optional[str] = Query(None),
+    float_value: Optional[str] = Query(None, alias="float"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_read_db)
+    ) -> MarketplacePage:
+    """
+    Lista as skins do marketplace por páginas (paginação por cursor).
+
+    - Filtros opcionais: type, name, float e intervalo de preço.
+    - Ordenação por preço ou data de listagem; usar `next_cursor` para pedir a página seguinte.
+    """
+    try:
+        return db_service.get_marketplace_skins_page(
+            identity, db,
+            limit=limit, cursor=cursor, sort=sort, order=order,
+            skin_type=skin_type, name=name, float_value=float_value,
+            min_price=min_price, max_price=max_price
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins do marketplace: {str(e)}") from e
 
 
+@app.get("/marketplace/stats", status_code=status.HTTP_200_OK, response_model=List[MarketStatsDisplay])
+def get_market_stats(
+    skin_type: str = Query(..., alias="type"),
+    name: str = Query(...),
+    float_value: Optional[str] = Query(None, alias="float"),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+    ) -> List[MarketStatsDisplay]:
+    """
+    Estatísticas de mercado de uma skin (uma entrada por float, ou só a de `float`).
+
+    - Floor price e número de listagens ativas, última venda, vendas e volume das últimas 24 horas.
+    - Agregados mantidos a cada listagem e compra: a leitura não percorre o marketplace nem as transações.
+    """
+    try:
+        return db_service.get_market_stats(skin_type, name, float_value, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao obter estatísticas de mercado: {str(e)}") from e
+
+
 @app.post("/marketplace/add/skin", status_code=status.HTTP_201_CREATED, response_model=Dict[str, Union[str, int]])
 def marketplace_add_skin(
     skin_data: AddMarketplaceSkinRequest = Body(..., description="ID da UserSkin e valor de venda"),
-    current_user: dict = Depends(get_current_user),
+    identity: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
     ) -> List[SkinDisplay]:
     """
@@ -360,7 +616,7 @@ def marketplace_add_skin(
 @app.delete("/marketplace/remove/skin/{marketplace_skin_id}", status_code=status.HTTP_200_OK, response_model=Dict[str, str])
 def marketplace_remove_skin(
     marketplace_skin_id: int,
-    current_user: dict = Depends(get_current_user),
+    identity: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
     ) -> Dict[str, str]:
     """
@@ -385,10 +641,52 @@ def marketplace_remove_skin(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao remover skin: {str(e)}") from e
 
+@app.post("/marketplace/add/skins", status_code=status.HTTP_200_OK, response_model=BulkListingResponse)
+def marketplace_add_skins(
+    request: BulkListRequest = Body(..., description="Skins a listar e respetivos preços"),
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+    ) -> Dict:
+    """
+    Lista várias skins do inventário do utilizador autenticado de uma vez.
+
+    - Cada skin tem o seu resultado (listed, not_found, not_owner, already_listed, duplicate).
+    """
+    if len(request.items) > settings.marketplace_bulk_max_items:
+        raise HTTPException(status_code=422, detail=f"Máximo de {settings.marketplace_bulk_max_items} skins por pedido")
+    try:
+        items = [(item.skin_id, item.value) for item in request.items]
+        return db_service.add_marketplace_skins(identity.user_id, items, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao adicionar skins ao mercado: {str(e)}") from e
+
+
+@app.post("/marketplace/remove/skins", status_code=status.HTTP_200_OK, response_model=BulkListingResponse)
+def marketplace_remove_skins(
+    request: BulkDelistRequest = Body(..., description="IDs das listagens a remover"),
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+    ) -> Dict:
+    """
+    Remove várias listagens do utilizador autenticado de uma vez.
+
+    - Cada listagem tem o seu resultado (removed, not_found, not_owner, duplicate).
+    """
+    if len(request.marketplace_skin_ids) > settings.marketplace_bulk_max_items:
+        raise HTTPException(status_code=422, detail=f"Máximo de {settings.marketplace_bulk_max_items} listagens por pedido")
+    try:
+        return db_service.remove_marketplace_skins(identity.user_id, request.marketplace_skin_ids, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao remover skins do mercado: {str(e)}") from e
+
 @app.post("/marketplace/buy/skin/{marketplace_skin_id}", status_code=status.HTTP_200_OK, response_model=Dict[str, str])
 def marketplace_buy_skin(
     marketplace_skin_id: int,
-    current_user: dict = Depends(get_current_user),
+    identity: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
     ) -> Dict[str, str]:
     """
@@ -398,14 +696,8 @@ def marketplace_buy_skin(
       e registra as transações de débito/crédito.
     """
     try:
-        user_email = current_user["sub"]
-        user = db_service.get_user_by_email(user_email, db)
-
-        if not user:
-            raise HTTPException(status_code=404, detail="Utilizador não encontrado")
-
         # Lógica de compra, transferência e transação
-        db_service.buy_marketplace_skin(marketplace_skin_id, user.id, db)
+        db_service.buy_marketplace_skin(marketplace_skin_id, identity.user_id, db)
 
         return {"message": "Skin comprada com sucesso"}
     except HTTPException:
@@ -420,17 +712,40 @@ def marketplace_buy_skin(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao comprar skin: {str(e)}") from e
     
+@app.post("/marketplace/buy/batch", status_code=status.HTTP_200_OK, response_model=BatchPurchaseResult)
+def marketplace_buy_skins(
+    request: BatchPurchaseRequest = Body(..., description="IDs das skins a comprar e modo do lote"),
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+    ) -> Dict:
+    """
+    Compra várias skins listadas numa só transação.
+
+    - **all_or_nothing=true:** compra todas ou nenhuma; em caso de falha devolve 400
+      com o resultado de cada skin.
+    - **all_or_nothing=false:** compra as que estiverem disponíveis e couberem no saldo.
+    """
+    if len(request.skin_ids) > settings.purchase_batch_max_items:
+        raise HTTPException(status_code=422, detail=f"Máximo de {settings.purchase_batch_max_items} skins por lote")
+    try:
+        return db_service.buy_marketplace_skins(request.skin_ids, identity.user_id, request.all_or_nothing, db)
+    except BatchPurchaseError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e), "items": e.items})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao comprar skins: {str(e)}") from e
+
 @app.get("/marketplace/user/skins", status_code=status.HTTP_200_OK, response_model=List[MarketplaceSkinDisplay])
 def get_my_marketplace_skins(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_read_db)
     ) -> Dict[str, List[str]]:
     """
     Lista todas as skins que o utilizador autenticado colocou à venda.
     """
-    user_email = current_user['sub']
     try:
-        skins = db_service.get_user_marketplace_skins(user_email,db)
-        return skins
+        skins = db_service.get_user_marketplace_skins_json(identity,db)
+        return Response(content=skins, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins listadas: {str(e)}") from e
@@ -0,0 +1,363 @@
+"""
+Estatísticas do marketplace por skin (type, name, float_value), mantidas de forma
+incremental.
+
+Para cada chave, `market_stats` guarda o número de listagens ativas, o preço
+mínimo (floor), o preço e a data da última venda. As vendas também ficam em
+`market_stats_hourly`, uma linha por chave e hora (UTC). O volume das últimas
+24 horas é a soma das últimas 24 linhas dessa chave. Ler as estatísticas de
+uma chave custa, portanto, uma linha e no máximo 24 buckets, seja qual for o
+tamanho de `marketplace` e `transactions`.
+
+As escritas do marketplace (database.py) atualizam os agregados antes do seu
+próprio commit, sempre com um número fixo de statements:
+
+- listagem nova: listing_count + n, floor = min(floor, preço). É um
+  INSERT ... ON CONFLICT DO UPDATE;
+- listagem removida: listing_count - n. O floor só é recalculado a partir do
+  marketplace quando a listagem removida era a mais barata. Também é um
+  INSERT ... ON CONFLICT DO UPDATE: uma chave sem linha é criada a partir das
+  listagens que restam;
+- venda: como uma remoção, mais a última venda e o bucket da hora.
+
+As linhas de `market_stats` são bloqueadas por ordem de chave, pelo que lotes
+com chaves em comum não entram em deadlock entre si. Edições e eliminações de
+skins no catálogo recalculam as chaves afetadas (`refresh`).
+
+Alterações feitas fora destes caminhos (SQL manual, seed, bugs) são corrigidas
+pela reconciliação periódica. Esta compara os agregados com o marketplace e
+recalcula, sob o lock da linha, só as chaves divergentes. Também apaga os
+buckets antigos e as chaves sem listagens nem vendas:
+
+    python -m backend.src.market_stats reconcile
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, bindparam, case, delete, func, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.src.db_models import Marketplace, MarketStats, MarketStatsHourly, SkinTable
+from backend.src.metrics import MARKET_STATS_CORRECTIONS
+from backend.src.settings import settings
+
+# (type, name, float_value)
+Key = Tuple[str, str, str]
+
+VOLUME_WINDOW_HOURS = 24
+
+# UPDATEs executemany (um conjunto de parâmetros por chave) usam a tabela Core
+_STATS = MarketStats.__table__
+_KEY_COLUMNS = (MarketStats.type, MarketStats.name, MarketStats.float_value)
+_SKIN_KEY_COLUMNS = (SkinTable.type, SkinTable.name, SkinTable.float_value)
+
+
+def skin_key(row) -> Key:
+    """Chave de uma linha com as colunas type, name e float_value."""
+    return (row.type, row.name, row.float_value)
+
+
+def hour_start(moment: datetime) -> datetime:
+    """Início da hora UTC de `moment`, sem fuso (como as colunas DateTime)."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def volume_window_start(now: datetime) -> datetime:
+    """Primeiro bucket do volume de 24 horas (a hora atual e as 23 anteriores)."""
+    return hour_start(now) - timedelta(hours=VOLUME_WINDOW_HOURS - 1)
+
+
+def _insert(db: Session):
+    return (postgresql if db.get_bind().dialect.name == "postgresql" else sqlite).insert
+
+
+def _group(items: Iterable[Tuple[Key, float]]) -> Dict[Key, Dict]:
+    """Contagem, preço mínimo, soma e último preço por chave, com as chaves ordenadas."""
+    grouped: Dict[Key, Dict] = {}
+    for key, value in items:
+        entry = grouped.setdefault(key, {"count": 0, "min": value, "sum": 0.0, "last": value})
+        entry["count"] += 1
+        entry["min"] = min(entry["min"], value)
+        entry["sum"] += value
+        entry["last"] = value
+    return dict(sorted(grouped.items()))
+
+
+def _key_params(key: Key) -> Dict[str, str]:
+    return {"k_type": key[0], "k_name": key[1], "k_float": key[2]}
+
+
+def record_listings(db: Session, listings: Iterable[Tuple[Key, float]], now: datetime) -> None:
+    """
+    Regista listagens novas (`listings`: pares chave, preço) num só
+    INSERT ... ON CONFLICT DO UPDATE. Não faz commit.
+    """
+    grouped = _group(listings)
+    if not grouped:
+        return
+    statement = _insert(db)(MarketStats).values([
+        {"type": key[0], "name": key[1], "float_value": key[2], "listing_count": entry["count"],
+         "floor_price": entry["min"], "updated_at": now}
+        for key, entry in grouped.items()
+    ])
+    excluded = statement.excluded
+    db.execute(statement.on_conflict_do_update(
+        index_elements=list(_KEY_COLUMNS),
+        set_={
+            "listing_count": MarketStats.listing_count + excluded.listing_count,
+            "floor_price": case(
+                (or_(MarketStats.floor_price.is_(None), excluded.floor_price < MarketStats.floor_price),
+                 excluded.floor_price),
+                else_=MarketStats.floor_price,
+            ),
+            "updated_at": excluded.updated_at,
+        },
+    ))
+
+
+def _match_key():
+    return and_(MarketStats.type == bindparam("k_type"), MarketStats.name == bindparam("k_name"),
+                MarketStats.float_value == bindparam("k_float"))
+
+
+def _per_key(grouped: Dict[Key, Dict], field: str):
+    """`field` de `grouped` para a chave da linha em conflito (CASE sobre as chaves)."""
+    return case(*[
+        (and_(MarketStats.type == key[0], MarketStats.name == key[1], MarketStats.float_value == key[2]), entry[field])
+        for key, entry in grouped.items()
+    ])
+
+
+def _listed(key: Key, aggregate):
+    """Agregado das listagens ativas de `key`, para criar a linha que falte."""
+    return (
+        select(aggregate)
+        .select_from(Marketplace)
+        .join(SkinTable, SkinTable.id == Marketplace.skin_id)
+        .where(SkinTable.type == key[0], SkinTable.name == key[1], SkinTable.float_value == key[2])
+        .scalar_subquery()
+    )
+
+
+def _record_removed(db: Session, grouped: Dict[Key, Dict], now: datetime, sold: bool) -> None:
+    """
+    Remoções (e, com `sold`, a última venda) num só INSERT ... ON CONFLICT DO
+    UPDATE. Uma chave ainda sem linha (listagens criadas fora do DatabaseService)
+    é criada a partir das listagens que restam no marketplace, em vez de a
+    remoção e a venda se perderem.
+    """
+    rows = []
+    for key, entry in grouped.items():
+        row = {"type": key[0], "name": key[1], "float_value": key[2],
+               "listing_count": _listed(key, func.count(Marketplace.id)),
+               "floor_price": _listed(key, func.min(Marketplace.value)), "updated_at": now}
+        if sold:
+            row.update(last_sale_price=entry["last"], last_sale_at=now)
+        rows.append(row)
+    statement = _insert(db)(MarketStats).values(rows)
+    excluded = statement.excluded
+    set_ = {
+        "listing_count": MarketStats.listing_count - _per_key(grouped, "count"),
+        # excluded.floor_price é o floor das listagens que restam na chave
+        "floor_price": case((MarketStats.floor_price >= _per_key(grouped, "min"), excluded.floor_price),
+                            else_=MarketStats.floor_price),
+        "updated_at": excluded.updated_at,
+    }
+    if sold:
+        set_.update(last_sale_price=excluded.last_sale_price, last_sale_at=excluded.last_sale_at)
+    db.execute(statement.on_conflict_do_update(index_elements=list(_KEY_COLUMNS), set_=set_))
+
+
+def record_removals(db: Session, listings: Iterable[Tuple[Key, float]], now: datetime) -> None:
+    """
+    Regista listagens removidas (já apagadas do marketplace nesta transação).
+    O floor só é recalculado nas chaves em que a listagem mais barata saiu.
+    Um statement, com as chaves por ordem. Não faz commit.
+    """
+    grouped = _group(listings)
+    if not grouped:
+        return
+    _record_removed(db, grouped, now, sold=False)
+
+
+def record_sales(db: Session, sales: Sequence[Tuple[Key, float]], now: datetime) -> None:
+    """
+    Regista vendas (listagens já apagadas do marketplace nesta transação), pela
+    ordem de `sales`: remoção das listagens, última venda e bucket da hora.
+    Dois statements, seja qual for o número de vendas. Não faz commit.
+    """
+    grouped = _group(sales)
+    if not grouped:
+        return
+    _record_removed(db, grouped, now, sold=True)
+    hour = hour_start(now)
+    statement = _insert(db)(MarketStatsHourly).values([
+        {"type": key[0], "name": key[1], "float_value": key[2], "hour": hour,
+         "sales": entry["count"], "volume": entry["sum"]}
+        for key, entry in grouped.items()
+    ])
+    excluded = statement.excluded
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[MarketStatsHourly.type, MarketStatsHourly.name, MarketStatsHourly.float_value,
+                        MarketStatsHourly.hour],
+        set_={"sales": MarketStatsHourly.sales + excluded.sales,
+              "volume": MarketStatsHourly.volume + excluded.volume},
+    ))
+
+
+def listed_keys(db: Session, skin_ids: Iterable[int]) -> List[Key]:
+    """Chaves atuais das skins de `skin_ids` que estão listadas no marketplace."""
+    skin_ids = list(skin_ids)
+    if not skin_ids:
+        return []
+    return [skin_key(row) for row in db.execute(
+        select(*_SKIN_KEY_COLUMNS).distinct()
+        .join(Marketplace, Marketplace.skin_id == SkinTable.id)
+        .where(SkinTable.id.in_(skin_ids))
+    )]
+
+
+def _actual(db: Session, keys: Optional[List[Key]] = None) -> Dict[Key, Tuple[int, Optional[float]]]:
+    """Número de listagens e floor calculados a partir do marketplace (todas as chaves ou só `keys`)."""
+    query = (
+        select(*_SKIN_KEY_COLUMNS, func.count(Marketplace.id), func.min(Marketplace.value))
+        .join(Marketplace, Marketplace.skin_id == SkinTable.id)
+        .group_by(*_SKIN_KEY_COLUMNS)
+    )
+    if keys is not None:
+        query = query.where(tuple_(*_SKIN_KEY_COLUMNS).in_(keys))
+    return {(row[0], row[1], row[2]): (row[3], row[4]) for row in db.execute(query)}
+
+
+def refresh(db: Session, keys: Iterable[Key]) -> int:
+    """
+    Recalcula listing_count e floor_price de `keys` a partir do marketplace.
+
+    As linhas são criadas se faltarem e bloqueadas por ordem de chave antes da
+    contagem. Uma escrita concorrente que ainda não chegou à linha conta depois
+    do recálculo e não é perdida. Devolve o número de chaves corrigidas. Não faz
+    commit.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return 0
+    now = datetime.now(timezone.utc)
+    db.execute(
+        _insert(db)(MarketStats)
+        .values([{"type": key[0], "name": key[1], "float_value": key[2], "listing_count": 0, "updated_at": now}
+                 for key in keys])
+        .on_conflict_do_nothing(index_elements=list(_KEY_COLUMNS))
+    )
+    stored = {
+        skin_key(row): (row.listing_count, row.floor_price)
+        for row in db.execute(
+            select(*_KEY_COLUMNS, MarketStats.listing_count, MarketStats.floor_price)
+            .where(tuple_(*_KEY_COLUMNS).in_(keys))
+            .order_by(*_KEY_COLUMNS)
+            .with_for_update()
+        )
+    }
+    actual = _actual(db, keys)
+    corrections = []
+    for key in keys:
+        count, floor = actual.get(key, (0, None))
+        if stored.get(key) != (count, floor):
+            corrections.append({**_key_params(key), "k_count": count, "k_floor": floor})
+    if corrections:
+        db.execute(
+            update(_STATS)
+            .where(_match_key())
+            .values(listing_count=bindparam("k_count"), floor_price=bindparam("k_floor"), updated_at=now),
+            corrections,
+        )
+    return len(corrections)
+
+
+def get_stats(db: Session, skin_type: str, name: str, float_value: Optional[str] = None,
+              now: Optional[datetime] = None) -> List[Dict]:
+    """
+    Estatísticas de uma skin (todas as floats, ou só `float_value`), lidas pela
+    chave primária. O volume soma no máximo 24 buckets por chave.
+    """
+    now = now or datetime.now(timezone.utc)
+    bucket_filter = [MarketStatsHourly.type == skin_type, MarketStatsHourly.name == name,
+                     MarketStatsHourly.hour >= volume_window_start(now)]
+    stats_filter = [MarketStats.type == skin_type, MarketStats.name == name]
+    if float_value is not None:
+        bucket_filter.append(MarketStatsHourly.float_value == float_value)
+        stats_filter.append(MarketStats.float_value == float_value)
+    volume = (
+        select(MarketStatsHourly.float_value, func.sum(MarketStatsHourly.sales).label("sales"),
+               func.sum(MarketStatsHourly.volume).label("volume"))
+        .where(*bucket_filter)
+        .group_by(MarketStatsHourly.float_value)
+        .subquery()
+    )
+    rows = db.execute(
+        select(*_KEY_COLUMNS, MarketStats.listing_count, MarketStats.floor_price, MarketStats.last_sale_price,
+               MarketStats.last_sale_at, func.coalesce(volume.c.sales, 0).label("sales_24h"),
+               func.coalesce(volume.c.volume, 0.0).label("volume_24h"))
+        .outerjoin(volume, volume.c.float_value == MarketStats.float_value)
+        .where(*stats_filter)
+        .order_by(MarketStats.float_value)
+    ).all()
+    return [row._asdict() for row in rows]
+
+
+def reconcile(db: Session, batch_size: int = 500, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Corrige a deriva dos agregados:
+
+    1. compara, sem locks, listing_count e floor de todas as chaves com o marketplace;
+    2. recalcula as chaves divergentes com `refresh`, em lotes de `batch_size`
+       (um commit por lote). Só conta como correção o que ainda diverge sob lock;
+    3. apaga os buckets mais antigos do que a retenção e as chaves sem listagens
+       nem vendas.
+
+    Devolve as chaves verificadas, as corrigidas e os buckets apagados.
+    """
+    now = now or datetime.now(timezone.utc)
+    stored = {
+        skin_key(row): (row.listing_count, row.floor_price)
+        for row in db.execute(select(*_KEY_COLUMNS, MarketStats.listing_count, MarketStats.floor_price))
+    }
+    actual = _actual(db)
+    keys = stored.keys() | actual.keys()
+    suspects = sorted(key for key in keys if stored.get(key, (0, None)) != actual.get(key, (0, None)))
+    db.commit()
+
+    corrected = 0
+    for start in range(0, len(suspects), batch_size):
+        corrected += refresh(db, suspects[start:start + batch_size])
+        db.commit()
+
+    cutoff = hour_start(now) - timedelta(hours=max(settings.market_stats_hourly_retention_hours, VOLUME_WINDOW_HOURS))
+    pruned = db.execute(delete(MarketStatsHourly).where(MarketStatsHourly.hour < cutoff)).rowcount
+    db.execute(delete(MarketStats).where(MarketStats.listing_count == 0, MarketStats.last_sale_at.is_(None)))
+    db.commit()
+    MARKET_STATS_CORRECTIONS.inc(amount=corrected)
+    return {"checked": len(keys), "corrected": corrected, "pruned_buckets": pruned}
+
+
+def main():
+    from backend.src.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Manutenção das estatísticas do marketplace")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    reconcile_parser = subcommands.add_parser("reconcile", help="Corrige a deriva dos agregados e apaga buckets antigos")
+    reconcile_parser.add_argument("--batch-size", type=int, default=settings.market_stats_reconcile_batch_size)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        if args.command == "reconcile":
+            result = reconcile(db, args.batch_size)
+            print(f"{result['checked']} chaves verificadas, {result['corrected']} corrigidas, "
+                  f"{result['pruned_buckets']} buckets apagados")
+
+
+if __name__ == "__main__":
+    main()
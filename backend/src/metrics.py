@@ -0,0 +1,261 @@
+"""
+Métricas da API no formato de texto do Prometheus (exposto em /metrics).
+
+Implementação mínima, sem dependências: contadores, gauges e histogramas com
+labels, seguros para várias threads (os endpoints síncronos correm no
+threadpool). Cada observação custa um lock e, nos histogramas, uma pesquisa
+binária pelo bucket, pelo que as métricas podem ficar ligadas em produção.
+
+- `MetricsMiddleware` (ASGI puro, não interfere com respostas em streaming)
+  regista por rota (o template, ex. /marketplace/buy/skin/{marketplace_skin_id})
+  o número de pedidos por código, a latência e o tamanho das respostas, e o
+  número de pedidos em curso.
+- A ocupação do threadpool (capacidade, threads em uso, tarefas à espera de
+  thread) é lida no momento da recolha; o tempo que cada endpoint ou dependência
+  síncrono esperou por uma thread é medido por `instrument_threadpool`.
+- Os contadores de negócio (compras, depósitos, listagens) são incrementados
+  pelos métodos de escrita do DatabaseService, logo após o commit.
+
+As métricas são por processo: com vários workers ou réplicas, o Prometheus
+recolhe cada um e agrega.
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+import anyio.to_thread
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _labels(self, labels: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(labels)} {_format_value(value)}" for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [contagem por bucket (não cumulativa, + o bucket +Inf), soma]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(labels)
+            return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for labels, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = 'le="%s"' % _format_value(bound)
+                    lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{self._labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- HTTP ---
+HTTP_REQUESTS = registry.counter("http_requests_total", "Pedidos HTTP por rota e código", ("method", "route", "status"))
+HTTP_LATENCY = registry.histogram("http_request_duration_seconds", "Duração dos pedidos HTTP", ("method", "route"))
+HTTP_RESPONSE_SIZE = registry.histogram("http_response_size_bytes", "Tamanho do corpo das respostas HTTP",
+                                        ("method", "route"), buckets=SIZE_BUCKETS)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "Pedidos HTTP em curso", ("method",))
+
+# --- THREADPOOL (lido no momento da recolha) ---
+THREADPOOL_CAPACITY = registry.gauge("threadpool_capacity", "Threads disponíveis para endpoints e dependências síncronos")
+THREADPOOL_IN_USE = registry.gauge("threadpool_in_use", "Threads do threadpool ocupadas")
+THREADPOOL_WAITING = registry.gauge("threadpool_waiting_tasks", "Tarefas à espera de uma thread livre")
+THREADPOOL_WAIT = registry.histogram("threadpool_wait_seconds",
+                                     "Espera até o código síncrono começar a correr numa thread do threadpool")
+
+# --- NEGÓCIO ---
+PURCHASES = registry.counter("marketplace_purchases_total", "Compras concluídas no marketplace")
+PURCHASE_VALUE = registry.counter("marketplace_purchase_value_total", "Valor total das compras concluídas")
+DEPOSITS = registry.counter("wallet_deposits_total", "Depósitos concluídos")
+DEPOSIT_AMOUNT = registry.counter("wallet_deposit_amount_total", "Montante total depositado")
+LISTINGS = registry.counter("marketplace_listings_total", "Listagens criadas ou removidas pelo vendedor", ("action",))
+MARKET_STATS_CORRECTIONS = registry.counter("market_stats_corrections_total",
+                                            "Agregados de market_stats corrigidos pela reconciliação")
+
+# --- RÉPLICAS DE LEITURA ---
+DB_READ_ROUTING = registry.counter("db_read_routing_total", "Sessões de leitura por destino e motivo da escolha",
+                                   ("target", "reason"))
+DB_REPLICA_UP = registry.gauge("db_replica_up", "Réplica de leitura disponível (1) ou afastada após uma falha (0)",
+                               ("replica",))
+
+
+def collect_threadpool() -> None:
+    """Atualiza os gauges do threadpool (chamar no event loop, ex. no endpoint /metrics)."""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    THREADPOOL_CAPACITY.set(limiter.total_tokens)
+    THREADPOOL_IN_USE.set(limiter.borrowed_tokens)
+    THREADPOOL_WAITING.set(limiter.statistics().tasks_waiting)
+
+
+def instrument_threadpool() -> None:
+    """
+    Passa a medir em THREADPOOL_WAIT a espera de cada `anyio.to_thread.run_sync`
+    no limitador por omissão, do pedido de uma thread até a função começar a
+    correr nela. É por aí que passam os endpoints e dependências síncronos do
+    FastAPI e o run_in_threadpool. Chamar uma vez no arranque (idempotente).
+    """
+    run_sync = anyio.to_thread.run_sync
+    if getattr(run_sync, "measures_wait", False):
+        return
+
+    @functools.wraps(run_sync)
+    async def run_sync_measured(func, *args, limiter=None, **kwargs):
+        if limiter is not None:
+            return await run_sync(func, *args, limiter=limiter, **kwargs)
+        queued = time.perf_counter()
+
+        def started(*call_args):
+            THREADPOOL_WAIT.observe(time.perf_counter() - queued)
+            return func(*call_args)
+
+        return await run_sync(started, *args, **kwargs)
+
+    run_sync_measured.measures_wait = True
+    anyio.to_thread.run_sync = run_sync_measured
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que regista as métricas HTTP de cada pedido."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec(method)
+            # O router guarda a rota encontrada no scope; o template evita uma série por id
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(method, route_label, str(status_code))
+            HTTP_LATENCY.observe(elapsed, method, route_label)
+            HTTP_RESPONSE_SIZE.observe(size, method, route_label)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel,Field,EmailStr,field_validator,ConfigDict
-from typing import Optional,Dict
+from typing import Optional,Dict,List,Literal
+from datetime import datetime
 
 class User(BaseModel):
     id: int 
@@ -162,6 +163,36 @@ class MarketplaceSkinDisplay(BaseModel):
         from_attributes = True
     )
 
+class MarketplaceListingDisplay(MarketplaceSkinDisplay):
+    marketplace_skin_id: int
+    listed_at: Optional[datetime] = None
+
+
+class MarketplacePage(BaseModel):
+    items: List[MarketplaceListingDisplay]
+    next_cursor: Optional[str] = Field(None, description="Cursor para a página seguinte (None se for a última)")
+
+
+class SkinSearchResult(SkinDisplay):
+    value: Optional[float] = Field(None, description="Preço da listagem (só na pesquisa do marketplace)")
+    marketplace_skin_id: Optional[int] = None
+    score: float = Field(..., description="Relevância: similaridade de trigramas, +1 se uma palavra começa pela pesquisa")
+
+class SkinSearchPage(BaseModel):
+    items: List[SkinSearchResult]
+    next_offset: Optional[int] = Field(None, description="Offset da página seguinte (None se for a última)")
+
+class MarketStatsDisplay(BaseModel):
+    type: str
+    name: str
+    float_value: str
+    listing_count: int
+    floor_price: Optional[float] = Field(None, description="Preço mais baixo entre as listagens ativas")
+    last_sale_price: Optional[float] = None
+    last_sale_at: Optional[datetime] = None
+    sales_24h: int = Field(..., description="Vendas nas últimas 24 horas (buckets horários)")
+    volume_24h: float = Field(..., description="Valor total vendido nas últimas 24 horas (buckets horários)")
+
 class AddMarketplaceSkinRequest(BaseModel):
     skin_id: int = Field(..., description="ID of the skin to be listed")
     value: float = Field(..., description="Listing price for the skin")
@@ -178,4 +209,60 @@ class AddMarketplaceSkinRequest(BaseModel):
                 "value": 150.0
             }
         }
-    )
\ No newline at end of file
+    )
+
+class BulkListingItem(BaseModel):
+    skin_id: int = Field(..., description="ID of the skin to be listed")
+    value: float = Field(..., description="Listing price for the skin")
+
+    @field_validator("value")
+    def validate_value(cls, v):
+        if v <= 0:
+            raise ValueError("O valor deve ser maior que zero.")
+        return v
+
+class BulkListRequest(BaseModel):
+    items: List[BulkListingItem] = Field(..., min_length=1, description="Skins do inventário a listar e respetivos preços")
+
+class BulkDelistRequest(BaseModel):
+    marketplace_skin_ids: List[int] = Field(..., min_length=1, description="IDs das listagens a remover")
+
+class BulkListingResult(BaseModel):
+    skin_id: Optional[int] = None
+    marketplace_skin_id: Optional[int] = None
+    status: Literal["listed", "removed", "not_found", "not_owner", "already_listed", "duplicate"]
+
+class BulkListingResponse(BaseModel):
+    succeeded: int
+    items: List[BulkListingResult]
+
+class BatchPurchaseRequest(BaseModel):
+    skin_ids: List[int] = Field(..., min_length=1, description="IDs das skins listadas a comprar")
+    all_or_nothing: bool = Field(True, description="True: compra tudo ou nada; False: compra o que estiver disponível e couber no saldo")
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "skin_ids": [1, 2, 3],
+                "all_or_nothing": True
+            }
+        }
+    )
+
+class BatchPurchaseItem(BaseModel):
+    skin_id: int
+    status: Literal["purchased", "not_listed", "insufficient_funds"]
+    value: Optional[float] = None
+
+class BatchPurchaseResult(BaseModel):
+    purchased: int
+    total: float
+    items: List[BatchPurchaseItem]
+
+class Identity(BaseModel):
+    """
+    Identidade do utilizador autenticado, construída a partir das claims do token
+    (sub, uid, role), sem consulta à base de dados.
+    """
+    user_id: int
+    email: str
+    role: str = "player"
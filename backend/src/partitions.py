@@ -0,0 +1,217 @@
+"""
+Partições mensais da tabela `transactions` (Postgres) e arquivo das antigas.
+
+Depois da migração b7d39e1f4a68 a tabela `transactions` é particionada por
+intervalo (RANGE) em `date`, com uma partição por mês (`transactions_pAAAA_MM`)
+e uma partição DEFAULT que só recebe linhas fora dos meses criados. Assim:
+
+- o histórico com janela de datas (`since`/`until`) só lê as partições desses
+  meses (partition pruning);
+- VACUUM, ANALYZE e manutenção de índices trabalham partição a partição, e as
+  partições antigas deixam de ser escritas, pelo que o custo não cresce com o
+  volume total;
+- retirar um mês antigo é uma operação de metadados (DETACH), não um DELETE.
+
+Manutenção (correr periodicamente, ex. diariamente por cron):
+
+    python -m backend.src.partitions ensure --months-ahead 3
+    python -m backend.src.partitions archive --retention-months 24 --to table
+    python -m backend.src.partitions archive --retention-months 24 --to file --dir /backups/transactions
+    python -m backend.src.partitions list
+
+`archive --to table` move a partição para `transactions_archive` (também
+particionada, sem cópia de dados); `--to file` exporta-a para CSV comprimido
+(gzip) e só depois a remove. Em ambos os casos as transações arquivadas deixam
+de aparecer no histórico.
+"""
+import argparse
+import gzip
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.src.settings import settings
+
+PARENT = "transactions"
+ARCHIVE = "transactions_archive"
+DEFAULT_PARTITION = "transactions_default"
+
+# DETACH/CREATE ... PARTITION OF bloqueiam a tabela mãe: se houver queries longas
+# em curso, desiste em vez de bloquear todos os pedidos que ficariam atrás do lock
+LOCK_TIMEOUT = "5s"
+
+_PARTITION_NAME = re.compile(rf"^{PARENT}_p(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Mês de uma partição pelo nome (None para a DEFAULT ou outros nomes)."""
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def partition_bounds(month: date) -> str:
+    return f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+
+
+def missing_partitions(existing: Iterable[str], today: date, months_ahead: int) -> List[date]:
+    """Meses, do atual até `months_ahead` meses à frente, que ainda não têm partição."""
+    existing = set(existing)
+    current = month_start(today)
+    upcoming = (add_months(current, offset) for offset in range(months_ahead + 1))
+    return [month for month in upcoming if partition_name(month) not in existing]
+
+
+def expired_partitions(existing: Iterable[str], today: date, retention_months: int) -> List[str]:
+    """Partições inteiramente anteriores aos últimos `retention_months` meses, da mais antiga para a mais recente."""
+    cutoff = add_months(month_start(today), -retention_months)
+    months = sorted(month for month in map(partition_month, existing) if month is not None and month < cutoff)
+    return [partition_name(month) for month in months]
+
+
+def list_partitions(db: Session, parent: str = PARENT) -> List[str]:
+    return list(db.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :parent ORDER BY child.relname"
+        ),
+        {"parent": parent},
+    ).scalars())
+
+
+def _set_lock_timeout(db: Session) -> None:
+    db.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+
+
+def create_partition(db: Session, month: date) -> None:
+    """
+    Cria a partição de um mês. Se a manutenção se atrasou e já há linhas desse mês
+    na partição DEFAULT, o Postgres recusaria a criação: a DEFAULT é desanexada,
+    as linhas movidas para a nova partição e a DEFAULT volta a ser anexada, tudo
+    na mesma transação. Não faz commit.
+    """
+    name = partition_name(month)
+    window = {"start": month, "end": add_months(month, 1)}
+    _set_lock_timeout(db)
+    stranded = db.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end)"), window
+    ).scalar()
+    if not stranded:
+        db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} FOR VALUES {partition_bounds(month)}"))
+        return
+    db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT_PARTITION}"))
+    db.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES {partition_bounds(month)}"))
+    db.execute(text(f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end"), window)
+    db.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end"), window)
+    db.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+
+def ensure_partitions(db: Session, months_ahead: int, today: Optional[date] = None) -> List[str]:
+    """Cria as partições em falta do mês atual até `months_ahead` meses à frente (um commit por partição)."""
+    today = today or datetime.now(timezone.utc).date()
+    created = []
+    for month in missing_partitions(list_partitions(db), today, months_ahead):
+        create_partition(db, month)
+        db.commit()
+        created.append(partition_name(month))
+    return created
+
+
+def export_partition(db: Session, name: str, directory: str) -> str:
+    """Exporta uma partição para `<directory>/<name>.csv.gz` (só leitura). Devolve o caminho."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.csv.gz")
+    partial = f"{path}.partial"
+    cursor = db.connection().connection.cursor()
+    try:
+        with gzip.open(partial, "wt", encoding="utf-8") as out:
+            cursor.copy_expert(
+                f"COPY (SELECT id, user_id, amount, type, date FROM {name} ORDER BY date, id) "
+                "TO STDOUT WITH (FORMAT csv, HEADER)",
+                out,
+            )
+    finally:
+        cursor.close()
+    # O ficheiro só aparece com o nome final depois de completo
+    os.replace(partial, path)
+    return path
+
+
+def archive_partitions(
+    db: Session, retention_months: int, to: str = "table", directory: Optional[str] = None,
+    today: Optional[date] = None,
+) -> List[str]:
+    """
+    Retira de `transactions` as partições mais antigas do que a retenção, uma de
+    cada vez (um commit por partição):
+
+    - `to="table"`: DETACH e ATTACH a `transactions_archive` (só metadados);
+    - `to="file"`: exporta para `directory` e só depois faz DETACH e DROP. Se a
+      exportação falhar a partição fica intacta.
+
+    Devolve os nomes das partições arquivadas.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    archived = []
+    for name in expired_partitions(list_partitions(db), today, retention_months):
+        if to == "file":
+            export_partition(db, name, directory or settings.transactions_archive_dir)
+        _set_lock_timeout(db)
+        db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        if to == "file":
+            db.execute(text(f"DROP TABLE {name}"))
+        else:
+            db.execute(text(f"ALTER TABLE {ARCHIVE} ATTACH PARTITION {name} FOR VALUES {partition_bounds(partition_month(name))}"))
+        db.commit()
+        archived.append(name)
+    return archived
+
+
+def main():
+    from backend.src.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Manutenção das partições mensais de transactions")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    ensure = subcommands.add_parser("ensure", help="Cria as partições dos próximos meses")
+    ensure.add_argument("--months-ahead", type=int, default=settings.transactions_partition_months_ahead)
+    archive = subcommands.add_parser("archive", help="Arquiva as partições fora da janela de retenção")
+    archive.add_argument("--retention-months", type=int, default=settings.transactions_retention_months)
+    archive.add_argument("--to", choices=("table", "file"), default="table")
+    archive.add_argument("--dir", default=settings.transactions_archive_dir, help="Destino dos ficheiros (--to file)")
+    subcommands.add_parser("list", help="Lista as partições ativas e arquivadas")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        if db.get_bind().dialect.name != "postgresql":
+            raise SystemExit("O particionamento de transactions só existe em Postgres")
+        if args.command == "ensure":
+            created = ensure_partitions(db, args.months_ahead)
+            print(f"{len(created)} partições criadas: {', '.join(created) or '-'}")
+        elif args.command == "archive":
+            archived = archive_partitions(db, args.retention_months, args.to, args.dir)
+            print(f"{len(archived)} partições arquivadas ({args.to}): {', '.join(archived) or '-'}")
+        else:
+            for parent in (PARENT, ARCHIVE):
+                print(f"{parent}: {', '.join(list_partitions(db, parent)) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Configuração e instrumentação do pool de ligações à base de dados.
+
+- `engine_options` traduz os campos de pool do `Settings` em argumentos para
+  `create_engine`/`create_async_engine` (incluindo o modo PgBouncer).
+- `instrument_engine` regista contadores de checkout/checkin, ligações novas,
+  timeouts e tempo de espera por uma ligação livre.
+- `pool_status` devolve o estado atual do pool e os contadores acumulados.
+"""
+import threading
+import time
+from typing import Dict, Optional, Type
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool
+
+from backend.src.settings import Settings
+
+
+class PoolStatistics:
+    """Contadores acumulados de um pool de ligações (seguros para várias threads)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        """Regista o tempo que um pedido esperou por uma ligação do pool."""
+        with self._lock:
+            self.wait_count += 1
+            self.wait_time_total += seconds
+            if seconds > self.wait_time_max:
+                self.wait_time_max = seconds
+            if timed_out:
+                self.timeouts += 1
+
+    def increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_count": self.wait_count,
+                "wait_time_total_ms": round(self.wait_time_total * 1000, 3),
+                "wait_time_avg_ms": round(self.wait_time_total * 1000 / self.wait_count, 3) if self.wait_count else 0.0,
+                "wait_time_max_ms": round(self.wait_time_max * 1000, 3),
+            }
+
+
+# Estatísticas por engine ("primary", "async", ...)
+pool_statistics: Dict[str, PoolStatistics] = {}
+
+
+def _timed_pool_class(base: Type[QueuePool], stats: PoolStatistics) -> Type[QueuePool]:
+    """
+    Cria uma subclasse do pool que mede o tempo gasto à espera de uma ligação livre.
+
+    O `_do_get` do QueuePool bloqueia quando todas as ligações (incluindo overflow)
+    estão em uso; é esse o tempo que queremos medir.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = base._do_get(self)
+        except PoolTimeoutError:
+            stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        stats.record_wait(time.perf_counter() - start)
+        return connection
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+
+
+def engine_options(url: str, settings: Settings, name: str = "primary", is_async: bool = False) -> Dict:
+    """
+    Constrói os argumentos de pool para o engine a partir do `Settings`.
+
+    - Modo PgBouncer (transaction pooling): usa NullPool, deixando o pooling ao
+      PgBouncer, e desativa os prepared statements do lado do servidor.
+    - SQLite: mantém o pool por omissão do dialeto (não aceita pool_size/max_overflow).
+    """
+    stats = pool_statistics.setdefault(name, PoolStatistics(name))
+    backend = make_url(url).get_backend_name()
+
+    if backend == "sqlite":
+        return {}
+
+    if settings.database_pgbouncer_mode:
+        options = {"poolclass": NullPool, "pool_pre_ping": settings.database_pool_pre_ping}
+        if is_async:
+            # asyncpg prepara statements por omissão; o PgBouncer em transaction
+            # pooling não garante que o statement exista na próxima ligação.
+            # A cache do dialeto é desativada no URL (ver `pgbouncer_url`).
+            options["connect_args"] = {"statement_cache_size": 0}
+        return options
+
+    base = AsyncAdaptedQueuePool if is_async else QueuePool
+    return {
+        "poolclass": _timed_pool_class(base, stats),
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout,
+        "pool_recycle": settings.database_pool_recycle,
+        "pool_pre_ping": settings.database_pool_pre_ping,
+    }
+
+
+def pgbouncer_url(url: str) -> str:
+    """Desativa a cache de prepared statements do dialeto asyncpg no URL (modo PgBouncer)."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "postgresql":
+        return url
+    return parsed.update_query_dict({"prepared_statement_cache_size": "0"}).render_as_string(hide_password=False)
+
+
+def instrument_engine(engine: Engine, name: str = "primary") -> PoolStatistics:
+    """Regista os listeners de eventos do pool que alimentam as estatísticas."""
+    stats = pool_statistics.setdefault(name, PoolStatistics(name))
+    event.listen(engine, "checkout", lambda *args: stats.increment("checkouts"))
+    event.listen(engine, "checkin", lambda *args: stats.increment("checkins"))
+    event.listen(engine, "connect", lambda *args: stats.increment("connects"))
+    event.listen(engine, "invalidate", lambda *args: stats.increment("invalidations"))
+    return stats
+
+
+def pool_status(engine: Engine, name: str = "primary") -> Dict:
+    """Estado atual do pool (ligações em uso, livres, overflow) e contadores acumulados."""
+    pool: Pool = engine.pool
+    status: Dict[str, Optional[float]] = {"name": name, "pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout_s": pool.timeout(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            # overflow() é negativo enquanto o pool base não está cheio
+            "overflow": max(pool.overflow(), 0),
+        })
+    stats = pool_statistics.get(name)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
@@ -0,0 +1,137 @@
+"""
+Instrumentação das queries SQL por pedido HTTP.
+
+- `instrument_queries` regista no engine os eventos `before_cursor_execute` e
+  `after_cursor_execute`, que somam ao pedido em curso o número de statements,
+  o tempo total na base de dados e o statement mais lento.
+- `QueryStatsMiddleware` cria as estatísticas de cada pedido numa ContextVar
+  (copiada para o threadpool e para os greenlets do AsyncEngine, pelo que os
+  endpoints síncronos e assíncronos são ambos contabilizados). Com `DEBUG`
+  ativo, acrescenta os cabeçalhos `X-DB-Statements`, `X-DB-Time-Ms` e
+  `X-DB-Slowest-Ms` à resposta; acima dos limites configurados, regista um
+  aviso com o statement mais lento e o mais repetido (sinal típico de N+1).
+
+Nas respostas em streaming os cabeçalhos são enviados antes do corpo e contam
+apenas as queries feitas até aí; o aviso no fim do pedido conta todas.
+"""
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from backend.src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo do SQL incluído nos avisos
+_SQL_PREVIEW = 300
+
+
+class RequestQueryStats:
+    """Queries executadas durante um pedido."""
+
+    __slots__ = ("statements", "total_time", "slowest_time", "slowest_statement", "repeats")
+
+    def __init__(self):
+        self.statements = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+        # Execuções por texto de SQL: o mesmo statement repetido muitas vezes indica N+1
+        self.repeats: Dict[str, int] = {}
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.statements += 1
+        self.total_time += elapsed
+        self.repeats[statement] = self.repeats.get(statement, 0) + 1
+        if elapsed >= self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+    def most_repeated(self) -> tuple:
+        """(statement, execuções) do statement mais repetido, ou (None, 0)."""
+        if not self.repeats:
+            return None, 0
+        statement = max(self.repeats, key=self.repeats.get)
+        return statement, self.repeats[statement]
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "X-DB-Statements": str(self.statements),
+            "X-DB-Time-Ms": f"{self.total_time * 1000:.3f}",
+            "X-DB-Slowest-Ms": f"{self.slowest_time * 1000:.3f}",
+        }
+
+
+current_query_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_query_stats.get() is not None:
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_query_stats.get()
+    if stats is None:
+        return
+    started = conn.info.get("query_started_at")
+    if started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+
+def instrument_queries(engine: Engine) -> None:
+    """Regista os listeners de execução que alimentam as estatísticas por pedido."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _preview(statement: Optional[str]) -> str:
+    return " ".join((statement or "").split())[:_SQL_PREVIEW]
+
+
+def report(method: str, path: str, stats: RequestQueryStats) -> None:
+    """Regista um aviso se o pedido ultrapassou os limites de statements ou de tempo na base de dados."""
+    too_many = stats.statements > settings.slow_request_max_statements
+    too_slow = stats.total_time * 1000 > settings.slow_request_db_time_ms
+    if not (too_many or too_slow):
+        return
+    repeated, repeats = stats.most_repeated()
+    logger.warning(
+        "%s %s: %d statements, %.1f ms na base de dados; mais lento (%.1f ms): %s; mais repetido (%dx): %s",
+        method, path, stats.statements, stats.total_time * 1000, stats.slowest_time * 1000,
+        _preview(stats.slowest_statement), repeats, _preview(repeated),
+    )
+
+
+class QueryStatsMiddleware:
+    """Middleware ASGI que contabiliza as queries de cada pedido."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = current_query_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and settings.debug:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in stats.headers().items()
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            current_query_stats.reset(token)
+            report(scope["method"], scope["path"], stats)
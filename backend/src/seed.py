@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from backend.src.database import SessionLocal
+from backend.src import market_stats
 from backend.src.db_models import UserTable, SkinTable, Marketplace
 from backend.src.utils.validation_utils import hash_password
 import random
@@ -80,6 +81,10 @@ def seed():
         db.add(m)
         db.commit()
 
+    # As listagens acima não passam pelo DatabaseService: estatísticas de mercado a partir delas
+    print(">> Updating market stats...")
+    market_stats.reconcile(db)
+
     print(">> DONE SEEDING!")
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ Defines Settings for Database
 
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from typing import Literal
 
 
 class Settings(BaseSettings):
@@ -18,5 +19,100 @@ class Settings(BaseSettings):
     database_port: str | None = Field(alias="DATABASE_PORT", default=None)
     database_name: str | None = Field(alias="DATABASE_NAME", default=None)
 
+    # Connection pool
+    database_pool_size: int = Field(alias="DATABASE_POOL_SIZE", default=5)
+    database_max_overflow: int = Field(alias="DATABASE_MAX_OVERFLOW", default=10)
+    database_pool_timeout: float = Field(alias="DATABASE_POOL_TIMEOUT", default=30.0)
+    database_pool_recycle: int = Field(alias="DATABASE_POOL_RECYCLE", default=-1)
+    database_pool_pre_ping: bool = Field(alias="DATABASE_POOL_PRE_PING", default=False)
+    # Transaction-pooling PgBouncer in front of Postgres: NullPool, no server-side prepared statements
+    database_pgbouncer_mode: bool = Field(alias="DATABASE_PGBOUNCER_MODE", default=False)
+
+    # Read replicas (comma-separated URLs, empty = reads stay on the primary; see replicas.py)
+    database_replica_urls: str = Field(alias="DATABASE_REPLICA_URLS", default="")
+    # Reads of a user stay on the primary this long after their last write (replication lag budget)
+    replica_read_your_writes_seconds: float = Field(alias="REPLICA_READ_YOUR_WRITES_SECONDS", default=2.0)
+    # A replica that failed to connect is skipped for this long before being tried again
+    replica_retry_after: float = Field(alias="REPLICA_RETRY_AFTER", default=5.0)
+
+    # Marketplace purchases
+    # "nowait": a listing locked by another buyer fails fast and is retried
+    # "skip_locked": a listing locked by another buyer is treated as not listed
+    purchase_lock_mode: Literal["nowait", "skip_locked"] = Field(alias="PURCHASE_LOCK_MODE", default="nowait")
+    purchase_max_retries: int = Field(alias="PURCHASE_MAX_RETRIES", default=3)
+    purchase_retry_base_delay: float = Field(alias="PURCHASE_RETRY_BASE_DELAY", default=0.02)
+    purchase_retry_max_delay: float = Field(alias="PURCHASE_RETRY_MAX_DELAY", default=0.5)
+    # Where balances and money movements live:
+    # "legacy": users.funds (Float, updated in place) and the transactions table
+    # "ledger": append-only integer-cent ledger_entries + balance_snapshots (see ledger.py)
+    ledger_mode: Literal["legacy", "ledger"] = Field(alias="LEDGER_MODE", default="legacy")
+    # Maximum listings bought in one /marketplace/buy/batch request
+    purchase_batch_max_items: int = Field(alias="PURCHASE_BATCH_MAX_ITEMS", default=100)
+    # Maximum skins listed or delisted in one bulk request
+    marketplace_bulk_max_items: int = Field(alias="MARKETPLACE_BULK_MAX_ITEMS", default=500)
+
+    # In-process cache of serialized catalogue/marketplace responses
+    # (invalidated on writes in this process; the TTL bounds staleness across replicas)
+    response_cache_enabled: bool = Field(alias="RESPONSE_CACHE_ENABLED", default=True)
+    response_cache_ttl: float = Field(alias="RESPONSE_CACHE_TTL", default=10.0)
+    response_cache_max_entries: int = Field(alias="RESPONSE_CACHE_MAX_ENTRIES", default=256)
+
+    # Password hashing: bcrypt cost factor (changing it rehashes passwords on the next login)
+    password_bcrypt_rounds: int = Field(alias="PASSWORD_BCRYPT_ROUNDS", default=12)
+    # Dedicated hashing threads (keep at or below the CPUs available to the pod) and how many
+    # requests may wait for one before answering 503
+    password_hash_workers: int = Field(alias="PASSWORD_HASH_WORKERS", default=1)
+    password_hash_max_queue: int = Field(alias="PASSWORD_HASH_MAX_QUEUE", default=8)
+
+    # Cache of already-verified JWTs (entries never outlive the token's exp)
+    token_cache_enabled: bool = Field(alias="TOKEN_CACHE_ENABLED", default=True)
+    token_cache_ttl: float = Field(alias="TOKEN_CACHE_TTL", default=300.0)
+    token_cache_max_entries: int = Field(alias="TOKEN_CACHE_MAX_ENTRIES", default=10000)
+
+    # Skin search (/skins/search, /skins/autocomplete)
+    # Minimum trigram similarity for typo-tolerant matches (pg_trgm's default is 0.3)
+    search_min_similarity: float = Field(alias="SEARCH_MIN_SIMILARITY", default=0.3)
+    # How long the in-memory vocabulary (distinct names and types) is cached;
+    # catalogue writes in this process invalidate it immediately
+    search_terms_ttl: float = Field(alias="SEARCH_TERMS_TTL", default=300.0)
+
+    # Rows fetched per round trip by the server-side cursor of streaming endpoints
+    stream_batch_size: int = Field(alias="STREAM_BATCH_SIZE", default=1000)
+
+    # Streaming catalogue import (/admin/skins/import): rows per batch/commit,
+    # longest accepted line and row errors kept in the report
+    skin_import_batch_size: int = Field(alias="SKIN_IMPORT_BATCH_SIZE", default=1000)
+    skin_import_max_line_bytes: int = Field(alias="SKIN_IMPORT_MAX_LINE_BYTES", default=65536)
+    skin_import_max_errors: int = Field(alias="SKIN_IMPORT_MAX_ERRORS", default=1000)
+
+    # Monthly partitions of the transactions table (Postgres, see partitions.py):
+    # months created ahead of the current one and months kept before archiving
+    transactions_partition_months_ahead: int = Field(alias="TRANSACTIONS_PARTITION_MONTHS_AHEAD", default=3)
+    transactions_retention_months: int = Field(alias="TRANSACTIONS_RETENTION_MONTHS", default=24)
+    # Directory for gzip CSV exports of archived partitions (archive --to file)
+    transactions_archive_dir: str = Field(alias="TRANSACTIONS_ARCHIVE_DIR", default="archive")
+
+    # Per-skin market statistics (see market_stats.py): keys re-checked per commit by the
+    # reconciliation job and hours of sale buckets kept (at least the 24h volume window)
+    market_stats_reconcile_batch_size: int = Field(alias="MARKET_STATS_RECONCILE_BATCH_SIZE", default=500)
+    market_stats_hourly_retention_hours: int = Field(alias="MARKET_STATS_HOURLY_RETENTION_HOURS", default=48)
+
+    # Real-time marketplace feed (Server-Sent Events)
+    # A subscriber whose queue fills up is disconnected with a "resync" event
+    marketplace_events_queue_size: int = Field(alias="MARKETPLACE_EVENTS_QUEUE_SIZE", default=256)
+    # Recent events kept for clients reconnecting with Last-Event-ID
+    marketplace_events_history: int = Field(alias="MARKETPLACE_EVENTS_HISTORY", default=1024)
+    marketplace_events_max_subscribers: int = Field(alias="MARKETPLACE_EVENTS_MAX_SUBSCRIBERS", default=1000)
+    marketplace_events_keepalive: float = Field(alias="MARKETPLACE_EVENTS_KEEPALIVE", default=15.0)
+
+    # Prometheus metrics middleware and /metrics endpoint
+    metrics_enabled: bool = Field(alias="METRICS_ENABLED", default=True)
+
+    # Debug mode: per-request SQL statistics as X-DB-* response headers
+    debug: bool = Field(alias="DEBUG", default=False)
+    # Requests above either limit are logged with their slowest and most repeated statement
+    slow_request_max_statements: int = Field(alias="SLOW_REQUEST_MAX_STATEMENTS", default=20)
+    slow_request_db_time_ms: float = Field(alias="SLOW_REQUEST_DB_TIME_MS", default=250.0)
+
 
 settings = Settings()
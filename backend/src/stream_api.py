@@ -0,0 +1,107 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Query, status, HTTPException
+from fastapi.params import Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from backend.src.database import DatabaseService
+from backend.src.models import Identity
+from backend.src.utils.security import get_current_user, get_current_identity, get_current_admin_user, get_read_db
+from backend.src.utils.streaming import MEDIA_TYPES, encode_stream
+
+# ----------------------------------------------------
+# ENDPOINTS EM STREAMING (coleções grandes)
+#
+# Versões dos endpoints de listagem que leem com um cursor do lado do servidor e
+# enviam a resposta em blocos (array JSON ou NDJSON, escolhido com ?format=).
+# A memória usada não depende do número de linhas e o primeiro byte chega ao
+# cliente assim que o primeiro lote é lido.
+# ----------------------------------------------------
+
+router = APIRouter(prefix="/stream", tags=["stream"])
+db_service = DatabaseService()
+
+FORMAT_QUERY = Query("json", pattern="^(json|ndjson)$", description="json (array) ou ndjson (um objeto por linha)")
+
+
+def _streaming_response(rows, stream_format: str) -> StreamingResponse:
+    return StreamingResponse(encode_stream(rows, stream_format), media_type=MEDIA_TYPES[stream_format])
+
+
+@router.get("/inventory", status_code=status.HTTP_200_OK)
+def stream_my_skins(
+    format: str = FORMAT_QUERY,
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_read_db)
+    ) -> StreamingResponse:
+    """
+    Inventário do utilizador autenticado (skins não listadas), em streaming.
+    """
+    try:
+        return _streaming_response(db_service.stream_user_skins(identity.user_id, db), format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins do utilizador: {str(e)}") from e
+
+
+@router.get("/user/skins/{user_id}", status_code=status.HTTP_200_OK)
+def stream_user_skins_by_id(
+    user_id: int,
+    format: str = FORMAT_QUERY,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+    ) -> StreamingResponse:
+    """
+    Skins de qualquer utilizador pelo seu ID, em streaming.
+    """
+    try:
+        return _streaming_response(db_service.stream_user_skins(user_id, db), format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins do utilizador: {str(e)}") from e
+
+
+@router.get("/transactions/history", status_code=status.HTTP_200_OK)
+def stream_transaction_history(
+    format: str = FORMAT_QUERY,
+    since: Optional[datetime] = Query(None, description="Só transações a partir desta data (inclusive)"),
+    until: Optional[datetime] = Query(None, description="Só transações anteriores a esta data"),
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_read_db)
+    ) -> StreamingResponse:
+    """
+    Histórico de transações do utilizador autenticado (opcionalmente em [since, until)), em streaming.
+    """
+    try:
+        rows = db_service.stream_transactions_by_user(identity.user_id, db, since, until)
+        return _streaming_response(rows, format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar histórico de transações: {str(e)}") from e
+
+
+@router.get("/skins/all", status_code=status.HTTP_200_OK)
+def stream_all_skins(
+    format: str = FORMAT_QUERY,
+    current_admin: dict = Depends(get_current_admin_user),
+    db: Session = Depends(get_read_db)
+    ) -> StreamingResponse:
+    """
+    [ADMIN ONLY] Todas as skins base, em streaming.
+    """
+    try:
+        return _streaming_response(db_service.stream_all_skins(db), format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar skins base: {str(e)}") from e
+
+
+@router.get("/users", status_code=status.HTTP_200_OK)
+def stream_all_users(
+    format: str = FORMAT_QUERY,
+    current_admin: dict = Depends(get_current_admin_user),
+    db: Session = Depends(get_read_db)
+    ) -> StreamingResponse:
+    """
+    [ADMIN ONLY] Todos os utilizadores (sem passwords), em streaming.
+    """
+    try:
+        return _streaming_response(db_service.stream_all_users(db), format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recuperar utilizadores: {str(e)}") from e
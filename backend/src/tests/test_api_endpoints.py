@@ -1,11 +1,12 @@
 # backend/src/tests/test_api_endpoints.py
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 from backend.src.main import app
 # Importar get_db para fazer o override da sessão de banco de dados
 from backend.src.database import get_db 
 from backend.src.utils.security import get_current_user, get_current_admin_user
+from backend.src.hashing import HashingOverloaded
 
 # =========================
 # Mock de Usuário
@@ -22,8 +23,15 @@ class MockUser:
     def __getitem__(self, item):
         if item == 'sub': return self.email
         if item == 'role': return self.role
+        if item == 'uid': return self.id
         return getattr(self, item)
 
+    def get(self, item, default=None):
+        try:
+            return self[item]
+        except AttributeError:
+            return default
+
 # =========================
 # Overrides de Dependências
 # =========================
@@ -52,7 +60,7 @@ client = TestClient(app)
 # =========================
 # Testes Registro
 # =========================
-@patch("backend.src.utils.validation_utils.hash_password", return_value="hashed_password")
+@patch("backend.src.hashing.hash_password", return_value="hashed_password")
 @patch("backend.src.database.DatabaseService.create_user", return_value="101")
 def test_register_user_success(mock_create_user, mock_hash_password):
     response = client.post("/register_user", json={
@@ -65,7 +73,7 @@ def test_register_user_success(mock_create_user, mock_hash_password):
     assert response.status_code == 201
     assert response.json()["user_id"] == "101"
 
-@patch("backend.src.utils.validation_utils.hash_password", return_value="hashed_password")
+@patch("backend.src.hashing.hash_password", return_value="hashed_password")
 @patch("backend.src.database.DatabaseService.create_user", side_effect=Exception("DB Error"))
 def test_register_user_fail(mock_create_user, mock_hash_password):
     response = client.post("/register_user", json={
@@ -80,7 +88,7 @@ def test_register_user_fail(mock_create_user, mock_hash_password):
 # =========================
 # Testes Login
 # =========================
-@patch("backend.src.main.verify_password", return_value=True)
+@patch("backend.src.main.password_hasher.verify_and_update", new_callable=AsyncMock, return_value=(True, None))
 @patch("backend.src.utils.auth_utils.create_access_token", return_value="mock_access_token")
 @patch("backend.src.database.DatabaseService.get_user_by_email", return_value=MockUser(5, "login@test.com"))
 def test_login_success(mock_get_user, mock_create_token, mock_verify_password):
@@ -88,6 +96,29 @@ def test_login_success(mock_get_user, mock_create_token, mock_verify_password):
     assert response.status_code == 200
     assert "access_token" in response.json()
 
+@patch("backend.src.database.DatabaseService.update_password_hash")
+@patch("backend.src.main.password_hasher.verify_and_update", new_callable=AsyncMock, return_value=(True, "new-hash"))
+@patch("backend.src.database.DatabaseService.get_user_by_email", return_value=MockUser(5, "login@test.com"))
+def test_login_rehashes_password_when_cost_changes(mock_get_user, mock_verify, mock_update_hash):
+    response = client.post("/login", json={"email": "login@test.com", "password": "correctpassword"})
+    assert response.status_code == 200
+    assert mock_update_hash.call_args.args[:2] == (5, "new-hash")
+
+@patch("backend.src.main.password_hasher.verify_and_update", new_callable=AsyncMock, side_effect=HashingOverloaded("cheio"))
+@patch("backend.src.database.DatabaseService.get_user_by_email", return_value=MockUser(5, "login@test.com"))
+def test_login_returns_503_when_hashing_is_saturated(mock_get_user, mock_verify):
+    response = client.post("/login", json={"email": "login@test.com", "password": "correctpassword"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+@patch("backend.src.main.password_hasher.verify_and_update", new_callable=AsyncMock, return_value=(True, None))
+@patch("backend.src.main.create_access_token", return_value="mock_access_token")
+@patch("backend.src.database.DatabaseService.get_user_by_email", return_value=MockUser(5, "login@test.com"))
+def test_login_token_carries_user_id(mock_get_user, mock_create_token, mock_verify_password):
+    response = client.post("/login", json={"email": "login@test.com", "password": "correctpassword"})
+    assert response.status_code == 200
+    assert mock_create_token.call_args.args[0] == {"sub": "login@test.com", "role": "user", "uid": 5}
+
 @patch("backend.src.database.DatabaseService.get_user_by_email", return_value=None)
 def test_login_invalid_credentials(mock_get_user):
     response = client.post("/login", json={"email": "nonexistent@test.com", "password": "anypassword"})
@@ -101,37 +132,54 @@ def test_get_my_data_success():
     assert response.status_code == 200
     assert "Olá user@example.com" in response.json()["message"]
 
-@patch("backend.src.database.DatabaseService.get_user_skins", return_value=[
-    {"id": 1, "name": "AK-47", "type": "Rifle", "float_value": "0.1", "owner_id": 5, "link": "img.png"},
-    {"id": 2, "name": "M4A4", "type": "Rifle", "float_value": "0.2", "owner_id": 5, "link": "img.png"}
-])
+@patch("backend.src.database.DatabaseService.get_user_skins_json", return_value=(
+    b'[{"id":1,"name":"AK-47","type":"Rifle","float_value":"0.1","owner_id":5,"link":"img.png"},'
+    b'{"id":2,"name":"M4A4","type":"Rifle","float_value":"0.2","owner_id":5,"link":"img.png"}]'
+))
 @patch("backend.src.database.DatabaseService.get_user_by_email", return_value=MockUser(5, "user@example.com"))
 def test_get_inventory_success(mock_get_user, mock_get_skins):
     response = client.get("/inventory")
     assert response.status_code == 200
+    assert response.json()["message"] == "Skins do utilizador recuperadas com sucesso"
     assert len(response.json()["skins"]) == 2
 
-@patch("backend.src.database.DatabaseService.get_marketplace_skins", return_value=[{
-    "id": 1, 
-    "value": 100.0, 
-    "name": "AWP",
-    "type": "Sniper",
-    "float_value": "Factory New",
-    "owner_id": 99,
-    "link": "http://image.com/awp.png"
-}])
+@patch("backend.src.database.DatabaseService.get_user_skins_json", return_value=b"[]")
+@patch("backend.src.database.DatabaseService.get_user_by_email")
+def test_inventory_uses_token_identity_without_lookup(mock_get_user, mock_get_skins):
+    response = client.get("/inventory")
+    assert response.status_code == 200
+    mock_get_user.assert_not_called()
+    assert mock_get_skins.call_args.args[0] == 5
+
+@patch("backend.src.utils.security.db_service.get_user_by_email", return_value=MockUser(7, "legacy@example.com"))
+def test_identity_falls_back_to_email_for_tokens_without_uid(mock_get_user):
+    from backend.src.utils.security import get_current_identity
+    identity = get_current_identity({"sub": "legacy@example.com", "role": "player"}, MagicMock())
+    assert (identity.user_id, identity.email, identity.role) == (7, "legacy@example.com", "player")
+    mock_get_user.assert_called_once()
+
+@patch("backend.src.database.DatabaseService.get_marketplace_skins_json", return_value=(
+    b'[{"id":1,"name":"AWP","type":"Sniper","float_value":"Factory New","owner_id":99,'
+    b'"link":"http://image.com/awp.png","value":100.0}]'
+))
 def test_get_marketplace_skins_success(mock_market):
     response = client.get("/marketplace/skins")
     assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
     assert response.json()[0]["name"] == "AWP"
+    mock_market.assert_called_once()
 
-@patch("backend.src.database.DatabaseService.create_transaction")
-@patch("backend.src.database.DatabaseService.get_user_by_email", return_value=MockUser(5, "user@example.com"))
-def test_deposit_funds_success(mock_get_user, mock_create_transaction):
-    # Agora com o override_get_db, o refresh(user) não vai crashar
+@patch("backend.src.database.DatabaseService.deposit_funds", return_value=125.0)
+def test_deposit_funds_success(mock_deposit):
     response = client.post("/wallet/deposit", json={"amount": 25.0})
     assert response.status_code == 200
     assert response.json()["new_balance"] == 125.0
+    mock_deposit.assert_called_once()
+
+@patch("backend.src.database.DatabaseService.deposit_funds", side_effect=ValueError("Utilizador não encontrado"))
+def test_deposit_funds_unknown_user(mock_deposit):
+    response = client.post("/wallet/deposit", json={"amount": 25.0})
+    assert response.status_code == 404
 
 # =========================
 # Testes Compra
@@ -173,4 +221,332 @@ def test_admin_edit_skin_success(mock_edit_skin):
 @patch("backend.src.database.DatabaseService.delete_skin", side_effect=ValueError("Skin not found"))
 def test_admin_delete_skin_not_found(mock_delete_skin):
     response = client.delete("/admin/skin/delete/999")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+
+@patch("backend.src.database.DatabaseService.get_marketplace_skins_page", return_value={
+    "items": [{
+        "id": 1, "value": 100.0, "name": "AWP", "type": "Sniper", "float_value": "Factory New",
+        "owner_id": 99, "link": "http://image.com/awp.png", "marketplace_skin_id": 7
+    }],
+    "next_cursor": "abc"
+})
+def test_get_marketplace_skins_page_success(mock_page):
+    response = client.get("/marketplace/skins/page?limit=1&sort=price&order=asc&type=Sniper")
+    assert response.status_code == 200
+    assert response.json()["next_cursor"] == "abc"
+    assert response.json()["items"][0]["marketplace_skin_id"] == 7
+    assert mock_page.call_args.kwargs["skin_type"] == "Sniper"
+
+def test_get_marketplace_skins_page_invalid_sort():
+    response = client.get("/marketplace/skins/page?sort=name")
+    assert response.status_code == 422
+
+# =========================
+# Testes Endpoints Assíncronos
+# =========================
+@patch("backend.src.async_database.AsyncDatabaseService.get_user_skins_json", return_value=(
+    b'[{"id":1,"name":"AK-47","type":"Rifle","float_value":"0.1","owner_id":5,"link":"img.png"}]'
+))
+@patch("backend.src.async_database.AsyncDatabaseService.get_user_by_email", return_value=MockUser(5, "user@example.com"))
+def test_async_inventory_success(mock_get_user, mock_get_skins):
+    from backend.src.async_database import get_async_db
+
+    async def override_get_async_db():
+        yield MagicMock()
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    try:
+        response = client.get("/async/inventory")
+    finally:
+        del app.dependency_overrides[get_async_db]
+    assert response.status_code == 200
+    assert len(response.json()["skins"]) == 1
+
+def test_admin_db_pool_status():
+    response = client.get("/admin/db/pool")
+    assert response.status_code == 200
+    assert "checkouts" in response.json()["primary"]
+
+
+def test_admin_cache_stats():
+    response = client.get("/admin/cache")
+    assert response.status_code == 200
+    assert {"hits", "misses", "hit_ratio", "entries"} <= set(response.json())
+
+
+# =========================
+# Testes Streaming
+# =========================
+@patch("backend.src.database.DatabaseService.stream_transactions_by_user", return_value=iter([
+    {"id": "1", "user_id": "5", "amount": "10.0", "type": "deposit", "date": "2026-01-01 00:00:00"},
+    {"id": "2", "user_id": "5", "amount": "-4.0", "type": "purchase", "date": "2026-01-02 00:00:00"},
+]))
+@patch("backend.src.database.DatabaseService.get_user_by_email", return_value=MockUser(5, "user@example.com"))
+def test_stream_transaction_history_json_array(mock_get_user, mock_stream):
+    response = client.get("/stream/transactions/history")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert [t["id"] for t in response.json()] == ["1", "2"]
+
+@patch("backend.src.database.DatabaseService.stream_all_users", return_value=iter([
+    {"id": 1, "name": "a", "email": "a@example.com", "role": "player", "funds": 1.0},
+    {"id": 2, "name": "b", "email": "b@example.com", "role": "admin", "funds": 0.0},
+]))
+def test_stream_all_users_ndjson(mock_stream):
+    import json
+    response = client.get("/stream/users", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.text.strip().split("\n")
+    assert [json.loads(line)["email"] for line in lines] == ["a@example.com", "b@example.com"]
+
+def test_stream_rejects_unknown_format():
+    response = client.get("/stream/users", params={"format": "csv"})
+    assert response.status_code == 422
+
+
+# =========================
+# Testes Cache de Tokens
+# =========================
+@pytest.fixture
+def token_cache_env(monkeypatch):
+    """Chave/algoritmo de teste e uma cache de tokens nova com relógio controlado."""
+    from backend.src.cache import ResponseCache
+    from backend.src.utils import auth_utils
+
+    now = [1000.0]
+    cache = ResponseCache(max_entries=2, ttl=300.0, clock=lambda: now[0])
+    monkeypatch.setattr(auth_utils, "SECRET_KEY", "test-secret-key-with-at-least-32-bytes")
+    monkeypatch.setattr(auth_utils, "ALGORITHM", "HS256")
+    monkeypatch.setattr(auth_utils, "token_cache", cache)
+    return auth_utils, cache, now
+
+def test_decode_access_token_verifies_signature_once(token_cache_env):
+    auth_utils, cache, _ = token_cache_env
+    token = auth_utils.create_access_token({"sub": "user@example.com", "role": "player"})
+
+    with patch("backend.src.utils.auth_utils.jwt.decode", wraps=auth_utils.jwt.decode) as mock_decode:
+        first = auth_utils.decode_access_token(token)
+        first["sub"] = "mutated"
+        second = auth_utils.decode_access_token(token)
+
+    assert mock_decode.call_count == 1
+    assert second["sub"] == "user@example.com"
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+def test_cached_token_expires_with_its_exp(token_cache_env):
+    import time
+    import jwt
+    from fastapi import HTTPException
+    auth_utils, cache, now = token_cache_env
+    token = jwt.encode({"sub": "user@example.com", "exp": int(time.time()) + 5}, "test-secret-key-with-at-least-32-bytes", algorithm="HS256")
+
+    auth_utils.decode_access_token(token)
+    now[0] += 6     # a entrada em cache expira com o token, não com o TTL da cache
+    assert cache.get(token) is None
+
+    # Depois do exp, o pedido volta ao jwt.decode, que rejeita o token
+    with patch("backend.src.utils.auth_utils.jwt.decode", side_effect=jwt.ExpiredSignatureError):
+        with pytest.raises(HTTPException) as exc_info:
+            auth_utils.decode_access_token(token)
+    assert exc_info.value.status_code == 401
+
+def test_invalid_tokens_are_not_cached(token_cache_env):
+    from fastapi import HTTPException
+    auth_utils, cache, _ = token_cache_env
+
+    with pytest.raises(HTTPException):
+        auth_utils.decode_access_token("not-a-jwt")
+    assert cache.stats()["entries"] == 0
+
+def test_marketplace_events_feed_sends_resync_for_lost_events(monkeypatch):
+    from backend.src.events import MarketplaceEvents
+    events = MarketplaceEvents(max_queue=8, history=1)
+    for skin_id in (1, 2, 3):
+        events.publish("listing-sold", {"id": skin_id})
+    monkeypatch.setattr("backend.src.main.marketplace_events", events)
+
+    response = client.get("/marketplace/events", headers={"Last-Event-ID": "1"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == "event: resync\ndata: {}\n\n"
+
+def test_marketplace_events_feed_rejects_when_full(monkeypatch):
+    from backend.src.events import MarketplaceEvents
+    monkeypatch.setattr("backend.src.main.marketplace_events", MarketplaceEvents(max_subscribers=0))
+    response = client.get("/marketplace/events")
+    assert response.status_code == 503
+
+def test_admin_marketplace_events_stats():
+    response = client.get("/admin/events")
+    assert response.status_code == 200
+    assert {"subscribers", "published", "dropped_subscribers"} <= set(response.json())
+
+def test_admin_token_cache_stats():
+    response = client.get("/admin/auth/tokens")
+    assert response.status_code == 200
+    assert {"hits", "misses", "entries", "max_entries"} <= set(response.json())
+
+# =========================
+# Testes Métricas
+# =========================
+@patch("backend.src.database.DatabaseService.deposit_funds", return_value=125.0)
+def test_metrics_exposes_route_templates_and_threadpool(mock_deposit):
+    client.post("/wallet/deposit", json={"amount": 25.0})
+    client.post("/marketplace/buy/skin/123")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="POST",route="/wallet/deposit",status="200"}' in body
+    # O id da rota não gera uma série por pedido
+    assert 'route="/marketplace/buy/skin/{marketplace_skin_id}"' in body
+    assert "/marketplace/buy/skin/123" not in body
+    assert 'http_request_duration_seconds_bucket{method="POST",route="/wallet/deposit",le="+Inf"}' in body
+    assert "threadpool_capacity" in body and "threadpool_waiting_tasks" in body
+    # Os endpoints síncronos passaram pelo threadpool: a espera por uma thread foi medida
+    assert 'threadpool_wait_seconds_bucket{le="+Inf"}' in body
+
+# =========================
+# Orçamento de statements SQL por endpoint (N+1)
+# =========================
+@pytest.fixture
+def sqlite_client(monkeypatch):
+    """
+    Cliente sobre uma base de dados SQLite em memória, com o utilizador dos
+    overrides (id 5) como comprador e um vendedor com 3 skins listadas.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from backend.src.db_models import Base, UserTable, SkinTable, Marketplace
+    from backend.src.query_stats import instrument_queries
+    from backend.src.settings import settings
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    instrument_queries(engine)
+    Base.metadata.create_all(engine)
+    Session_ = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session_() as session:
+        session.add_all([
+            UserTable(id=1, name="seller", email="seller@example.com", password="x", funds=0.0),
+            UserTable(id=5, name="user", email="user@example.com", password="x", funds=100.0),
+        ])
+        for i in range(1, 4):
+            session.add(SkinTable(id=i, name=f"Skin{i}", type="Karambit", float_value="Factory New", owner_id=1))
+            session.add(Marketplace(id=i, skin_id=i, value=10.0 * i))
+        session.commit()
+
+    def override_sqlite_db():
+        db = Session_()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(settings, "debug", True)
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_sqlite_db)
+    yield client
+    engine.dispose()
+
+@pytest.fixture
+def max_statements():
+    """Falha o teste se a resposta executou mais statements SQL do que o limite."""
+    def check(response, limit: int):
+        count = int(response.headers["X-DB-Statements"])
+        request = response.request
+        assert count <= limit, f"{request.method} {request.url.path}: {count} statements (limite {limit})"
+        return count
+    return check
+
+@pytest.mark.parametrize("method, path, body, limit", [
+    ("GET", "/inventory", None, 1),
+    ("GET", "/marketplace/skins/page", None, 1),
+    ("GET", "/marketplace/user/skins", None, 1),
+    ("GET", "/transactions/history", None, 1),
+    ("POST", "/wallet/deposit", {"amount": 25.0}, 2),
+    ("POST", "/marketplace/buy/skin/2", None, 8),
+    # O lote usa o mesmo número de statements seja qual for o tamanho (incluindo as
+    # duas das estatísticas de mercado)
+    ("POST", "/marketplace/buy/batch", {"skin_ids": [1, 2, 3]}, 8),
+    ("POST", "/marketplace/remove/skins", {"marketplace_skin_ids": [1, 2, 3]}, 2),
+])
+def test_endpoint_statement_budget(sqlite_client, max_statements, method, path, body, limit):
+    response = sqlite_client.request(method, path, json=body)
+    assert response.status_code == 200, response.text
+    max_statements(response, limit)
+
+def test_db_headers_only_in_debug_mode():
+    response = client.get("/admin/cache")
+    assert "X-DB-Statements" not in response.headers
+
+def test_request_over_statement_limit_is_logged(sqlite_client, monkeypatch, caplog):
+    from backend.src.settings import settings
+
+    monkeypatch.setattr(settings, "slow_request_max_statements", 0)
+    with caplog.at_level("WARNING", logger="backend.src.query_stats"):
+        sqlite_client.get("/inventory")
+    assert any("GET /inventory: 1 statements" in record.getMessage() for record in caplog.records)
+
+def test_batch_purchase_rejection_returns_item_results(sqlite_client):
+    response = sqlite_client.post("/marketplace/buy/batch", json={"skin_ids": [1, 2, 3, 7]})
+    assert response.status_code == 400
+    assert [item["status"] for item in response.json()["detail"]["items"]] == ["purchased"] * 3 + ["not_listed"]
+
+def test_batch_purchase_rejects_oversized_batch(monkeypatch):
+    from backend.src.settings import settings
+
+    monkeypatch.setattr(settings, "purchase_batch_max_items", 2)
+    response = client.post("/marketplace/buy/batch", json={"skin_ids": [1, 2, 3]})
+    assert response.status_code == 422
+
+def test_bulk_list_statements_do_not_grow_with_batch(sqlite_client, max_statements):
+    from backend.src.db_models import SkinTable
+
+    db = next(app.dependency_overrides[get_db]())
+    db.add_all([SkinTable(id=i, name=f"Inv{i}", type="Bayonet", float_value="Field-Tested", owner_id=5)
+                for i in range(10, 40)])
+    db.commit()
+    small = sqlite_client.post("/marketplace/add/skins", json={"items": [{"skin_id": 10, "value": 1.0}]})
+    large = sqlite_client.post("/marketplace/add/skins",
+                               json={"items": [{"skin_id": i, "value": 1.0} for i in range(11, 40)]})
+    assert (small.json()["succeeded"], large.json()["succeeded"]) == (1, 29)
+    assert max_statements(large, 4) == max_statements(small, 4)
+
+def test_admin_skin_import_streams_csv_body(sqlite_client):
+    body = "name,type,float,link\n" + "".join(f"Skin {i},Bayonet,Factory New,https://example.com/{i}.png\n" for i in range(50))
+    response = sqlite_client.post("/admin/skins/import", params={"format": "csv"}, content=body.encode(),
+                                  headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["processed"], report["created"], report["failed"]) == (50, 50, 0)
+    assert sqlite_client.get("/skins/all").json()[-1]["name"].startswith("Skin")
+
+def test_skin_search_and_autocomplete_endpoints(sqlite_client):
+    from backend.src.cache import response_cache
+
+    response_cache.clear()
+    response = sqlite_client.get("/skins/search", params={"q": "skim", "scope": "marketplace", "limit": 2})
+    assert response.status_code == 200, response.text
+    page = response.json()
+    assert [(item["id"], item["value"]) for item in page["items"]] == [(1, 10.0), (2, 20.0)]
+    assert page["next_offset"] == 2
+    assert sqlite_client.get("/skins/autocomplete", params={"prefix": "Sk", "limit": 2}).json() == {
+        "suggestions": ["Skin1", "Skin2"]}
+    assert sqlite_client.get("/skins/search", params={"q": "x"}).status_code == 422
+    response_cache.clear()
+
+def test_market_stats_endpoint_reads_maintained_aggregates(sqlite_client, max_statements):
+    from backend.src import market_stats
+
+    db = next(app.dependency_overrides[get_db]())
+    market_stats.reconcile(db)
+    assert sqlite_client.post("/marketplace/buy/skin/2").status_code == 200
+    response = sqlite_client.get("/marketplace/stats", params={"type": "Karambit", "name": "Skin2"})
+    assert response.status_code == 200, response.text
+    [stats] = response.json()
+    assert (stats["float_value"], stats["listing_count"], stats["floor_price"]) == ("Factory New", 0, None)
+    assert (stats["last_sale_price"], stats["sales_24h"], stats["volume_24h"]) == (20.0, 1, 20.0)
+    max_statements(response, 1)
+    assert sqlite_client.get("/marketplace/stats", params={"type": "Karambit"}).status_code == 422
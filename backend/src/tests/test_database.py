@@ -56,20 +56,30 @@ def test_create_user_success(db_service: DatabaseService, mock_session: MagicMoc
     """
     Testa a criação bem-sucedida de um novo utilizador.
 
-    Simulamos o db.refresh() para injetar o ID no objeto ORM criado.
+    O id vem diretamente do INSERT ... RETURNING (sem refresh).
     """
     EXPECTED_ID = 101
-    
-    def mock_refresh_side_effect(obj_to_refresh):
-        obj_to_refresh.id = EXPECTED_ID
+    mock_session.execute.return_value.scalar_one_or_none.return_value = EXPECTED_ID
 
-    mock_session.refresh.side_effect = mock_refresh_side_effect
     user_id = db_service.create_user(mock_user_data, mock_session)
-    assert user_id == str(EXPECTED_ID) 
-    
-    mock_session.add.assert_called_once()
+    assert user_id == str(EXPECTED_ID)
+
+    mock_session.execute.assert_called_once()
     mock_session.commit.assert_called_once()
-    mock_session.refresh.assert_called_once()
+    mock_session.refresh.assert_not_called()
+
+
+def test_create_user_duplicate_email(db_service: DatabaseService, mock_session: MagicMock, mock_user_data: MockUser):
+    """
+    Testa o tratamento de um email duplicado: o ON CONFLICT DO NOTHING não devolve id.
+    """
+    mock_session.execute.return_value.scalar_one_or_none.return_value = None
+
+    with pytest.raises(ValueError, match="User with this email already exists"):
+        db_service.create_user(mock_user_data, mock_session)
+
+    mock_session.rollback.assert_called_once()
+    mock_session.commit.assert_not_called()
 
 
 def test_create_user_integrity_error(db_service: DatabaseService, mock_session: MagicMock, mock_user_data: MockUser):
@@ -109,3 +119,1309 @@ def test_get_user_by_email_not_found(db_service: DatabaseService, mock_session:
     result = db_service.get_user_by_email("not_found@example.com", mock_session)
     assert result is None
     mock_session.execute.assert_called_once()
+
+
+# --- PAGINAÇÃO DO MARKETPLACE (SQLite em memória) ---
+
+@pytest.fixture
+def sqlite_session():
+    """Fixture que fornece uma sessão real sobre uma base de dados SQLite em memória."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from backend.src.db_models import Base
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _seed_marketplace(session, listings: int):
+    """Cria um vendedor, um comprador e `listings` skins listadas com preços variados."""
+    from backend.src.db_models import UserTable, SkinTable, Marketplace
+
+    seller = UserTable(id=1, name="seller", email="seller@example.com", password="x", funds=0.0)
+    buyer = UserTable(id=2, name="buyer", email="buyer@example.com", password="x", funds=0.0)
+    session.add_all([seller, buyer])
+    for i in range(listings):
+        skin = SkinTable(id=i + 1, name=f"Skin{i % 3}", type="Karambit" if i % 2 else "Bayonet",
+                         float_value="Factory New", owner_id=1)
+        session.add(skin)
+        session.add(Marketplace(id=i + 1, skin_id=i + 1, value=float(i % 5) * 10 + 10))
+    session.commit()
+
+
+def test_marketplace_page_walks_every_listing_once(db_service: DatabaseService, sqlite_session):
+    """
+    Percorre o marketplace página a página e confirma que cada listagem aparece
+    exatamente uma vez, pela ordem pedida, mesmo com preços repetidos.
+    """
+    _seed_marketplace(sqlite_session, 23)
+
+    seen = []
+    cursor = None
+    while True:
+        page = db_service.get_marketplace_skins_page(
+            "buyer@example.com", sqlite_session, limit=5, cursor=cursor, sort="price", order="asc"
+        )
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 23
+    assert len({item["marketplace_skin_id"] for item in seen}) == 23
+    keys = [(item["value"], item["marketplace_skin_id"]) for item in seen]
+    assert keys == sorted(keys)
+
+
+def test_marketplace_page_filters(db_service: DatabaseService, sqlite_session):
+    """Testa os filtros por tipo e intervalo de preço e a exclusão das listagens do próprio utilizador."""
+    _seed_marketplace(sqlite_session, 20)
+
+    page = db_service.get_marketplace_skins_page(
+        "buyer@example.com", sqlite_session, limit=50, skin_type="Karambit", min_price=20, max_price=30
+    )
+    assert page["items"]
+    assert all(item["type"] == "Karambit" and 20 <= item["value"] <= 30 for item in page["items"])
+
+    own = db_service.get_marketplace_skins_page("seller@example.com", sqlite_session, limit=50)
+    assert own["items"] == []
+
+
+def test_marketplace_page_rejects_cursor_from_other_sort(db_service: DatabaseService, sqlite_session):
+    """Um cursor gerado para uma ordenação não pode ser usado noutra."""
+    _seed_marketplace(sqlite_session, 10)
+    page = db_service.get_marketplace_skins_page("buyer@example.com", sqlite_session, limit=3, sort="price")
+
+    with pytest.raises(ValueError, match="Cursor"):
+        db_service.get_marketplace_skins_page(
+            "buyer@example.com", sqlite_session, limit=3, cursor=page["next_cursor"], sort="listed_at"
+        )
+
+
+# --- SERVIÇO ASSÍNCRONO (aiosqlite em memória) ---
+
+def test_async_service_matches_sync_service(sqlite_session):
+    """
+    O AsyncDatabaseService deve devolver os mesmos resultados que o DatabaseService
+    para os mesmos dados, usando uma AsyncSession.
+    """
+    pytest.importorskip("aiosqlite")
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from backend.src.db_models import Base
+    from backend.src.async_database import AsyncDatabaseService
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+            await db.run_sync(lambda session: _seed_marketplace(session, 8))
+            service = AsyncDatabaseService()
+            page = await service.get_marketplace_skins_page("buyer@example.com", db, limit=50, sort="price")
+            buyer = await service.get_user_by_email("buyer@example.com", db)
+        await engine.dispose()
+        return page, buyer
+
+    page, buyer = asyncio.run(scenario())
+    _seed_marketplace(sqlite_session, 8)
+    expected = DatabaseService().get_marketplace_skins_page("buyer@example.com", sqlite_session, limit=50, sort="price")
+
+    assert buyer.id == 2
+    assert [i["marketplace_skin_id"] for i in page["items"]] == [i["marketplace_skin_id"] for i in expected["items"]]
+
+
+def test_to_async_url():
+    """Os URLs síncronos são convertidos para o driver assíncrono equivalente."""
+    from backend.src.async_database import to_async_url
+
+    assert to_async_url("postgresql://u:p@db:5432/app") == "postgresql+asyncpg://u:p@db:5432/app"
+    assert to_async_url("sqlite:///app.db") == "sqlite+aiosqlite:///app.db"
+
+
+# --- POOL DE LIGAÇÕES ---
+
+def test_engine_options_from_settings():
+    """Os campos de pool do Settings são passados ao engine; o modo PgBouncer usa NullPool."""
+    from sqlalchemy.pool import NullPool, QueuePool
+    from backend.src.settings import Settings
+    from backend.src.pool import engine_options
+
+    settings = Settings(DATABASE_POOL_SIZE=3, DATABASE_MAX_OVERFLOW=2, DATABASE_POOL_PRE_PING=True)
+    options = engine_options("postgresql://u:p@db/app", settings, name="test-options")
+    assert issubclass(options["poolclass"], QueuePool)
+    assert options["pool_size"] == 3 and options["max_overflow"] == 2 and options["pool_pre_ping"] is True
+
+    pgbouncer = Settings(DATABASE_PGBOUNCER_MODE=True)
+    assert engine_options("postgresql://u:p@db/app", pgbouncer, name="test-options")["poolclass"] is NullPool
+    assert engine_options("sqlite://", settings, name="test-options") == {}
+
+
+def test_pool_status_counts_checkouts_and_timeouts(tmp_path):
+    """Um pool esgotado regista o timeout e o tempo de espera nas estatísticas."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+    from sqlalchemy.pool import QueuePool
+    from backend.src.pool import PoolStatistics, _timed_pool_class, instrument_engine, pool_statistics, pool_status
+
+    stats = pool_statistics["test-pool"] = PoolStatistics("test-pool")
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=_timed_pool_class(QueuePool, stats), pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    instrument_engine(engine, name="test-pool")
+
+    held = engine.connect()
+    assert pool_status(engine, "test-pool")["checked_out"] == 1
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    held.close()
+
+    status = pool_status(engine, "test-pool")
+    assert status["checked_out"] == 0 and status["idle"] == 1
+    assert status["timeouts"] == 1
+    assert status["wait_time_max_ms"] >= 50
+    assert status["checkouts"] == 1
+    engine.dispose()
+
+
+# --- COMPRA NO MARKETPLACE ---
+
+class _PgError(Exception):
+    """Simulação de um erro do psycopg2 com SQLSTATE."""
+    def __init__(self, pgcode):
+        super().__init__(f"pgcode {pgcode}")
+        self.pgcode = pgcode
+
+
+def test_buy_retries_deadlock_then_succeeds(db_service: DatabaseService, mock_session: MagicMock, monkeypatch):
+    """Um deadlock (40P01) leva a repetir a transação; a segunda tentativa conclui a compra."""
+    from sqlalchemy.exc import OperationalError
+
+    monkeypatch.setattr("backend.src.database.time.sleep", lambda seconds: None)
+    attempt = MagicMock(side_effect=[OperationalError("SELECT", {}, _PgError("40P01")), None])
+    monkeypatch.setattr(db_service, "_purchase_attempt", attempt)
+
+    db_service.buy_marketplace_skin(1, 2, mock_session)
+
+    assert attempt.call_count == 2
+    mock_session.rollback.assert_called_once()
+
+
+def test_buy_gives_up_after_max_retries(db_service: DatabaseService, mock_session: MagicMock, monkeypatch):
+    """Conflitos persistentes esgotam as repetições e resultam num ValueError."""
+    from sqlalchemy.exc import OperationalError
+    from backend.src.settings import settings
+
+    monkeypatch.setattr("backend.src.database.time.sleep", lambda seconds: None)
+    attempt = MagicMock(side_effect=OperationalError("SELECT", {}, _PgError("55P03")))
+    monkeypatch.setattr(db_service, "_purchase_attempt", attempt)
+
+    with pytest.raises(ValueError, match="tente novamente"):
+        db_service.buy_marketplace_skin(1, 2, mock_session)
+    assert attempt.call_count == settings.purchase_max_retries + 1
+
+
+def test_buy_insufficient_funds_is_not_retried(db_service: DatabaseService, sqlite_session):
+    """Fundos insuficientes falham sem alterar a listagem, a skin ou os saldos."""
+    from backend.src.db_models import Marketplace, SkinTable
+
+    _seed_marketplace(sqlite_session, 1)
+    with pytest.raises(ValueError, match="fundos suficientes"):
+        db_service.buy_marketplace_skin(1, 2, sqlite_session)
+
+    assert sqlite_session.get(Marketplace, 1) is not None
+    assert sqlite_session.get(SkinTable, 1).owner_id == 1
+
+
+@pytest.mark.parametrize("mode", ["legacy", "ledger"])
+def test_concurrent_buyers_never_double_sell(tmp_path, monkeypatch, mode):
+    """Vários compradores em paralelo: cada listagem é vendida no máximo uma vez e os fundos conservam-se."""
+    from backend.src.benchmarks.purchase_stress import run
+    from backend.src.settings import settings
+
+    monkeypatch.setattr(settings, "ledger_mode", mode)
+    results = run(f"sqlite:///{tmp_path / 'stress.db'}", buyers=4, listings=12, funds=10_000.0, seed=1)
+
+    assert results["checks"]["ok"], results["checks"]
+    assert results["purchases"] == 12
+
+
+def test_batch_purchase_all_or_nothing(db_service: DatabaseService, sqlite_session):
+    """Uma skin não listada ou saldo insuficiente para o total: nada é comprado."""
+    from backend.src.database import BatchPurchaseError
+    from backend.src.db_models import Marketplace, SkinTable, Transaction, UserTable
+
+    _seed_marketplace(sqlite_session, 3)   # preços 10, 20, 30
+    sqlite_session.get(UserTable, 2).funds = 50.0
+    sqlite_session.commit()
+
+    with pytest.raises(BatchPurchaseError) as missing:
+        db_service.buy_marketplace_skins([1, 99], 2, True, sqlite_session)
+    assert [item["status"] for item in missing.value.items] == ["purchased", "not_listed"]
+    with pytest.raises(BatchPurchaseError, match="fundos suficientes"):
+        db_service.buy_marketplace_skins([1, 2, 3], 2, True, sqlite_session)
+    assert sqlite_session.query(Marketplace).count() == 3
+    assert sqlite_session.query(Transaction).count() == 0
+
+    result = db_service.buy_marketplace_skins([3, 1, 3], 2, True, sqlite_session)
+    assert (result["purchased"], result["total"]) == (2, 40.0)
+    assert [item["skin_id"] for item in result["items"]] == [3, 1]
+    sqlite_session.expire_all()
+    assert (sqlite_session.get(UserTable, 2).funds, sqlite_session.get(UserTable, 1).funds) == (10.0, 40.0)
+    assert sqlite_session.get(SkinTable, 3).owner_id == 2
+    assert sorted(t.amount for t in sqlite_session.query(Transaction)) == [-30.0, -10.0, 10.0, 30.0]
+
+
+def test_batch_purchase_best_effort_buys_what_fits(db_service: DatabaseService, sqlite_session):
+    """Sem all_or_nothing: compra pela ordem pedida enquanto o saldo chegar."""
+    from backend.src.db_models import Marketplace, UserTable
+
+    _seed_marketplace(sqlite_session, 3)   # preços 10, 20, 30
+    sqlite_session.get(UserTable, 2).funds = 35.0
+    sqlite_session.commit()
+
+    result = db_service.buy_marketplace_skins([2, 3, 42, 1], 2, False, sqlite_session)
+    assert [(item["skin_id"], item["status"]) for item in result["items"]] == [
+        (2, "purchased"), (3, "insufficient_funds"), (42, "not_listed"), (1, "purchased")]
+    assert (result["purchased"], result["total"]) == (2, 30.0)
+    sqlite_session.expire_all()
+    assert sqlite_session.get(UserTable, 2).funds == 5.0
+    assert [m.skin_id for m in sqlite_session.query(Marketplace)] == [3]
+
+
+
+def test_bulk_list_and_delist_report_each_item(db_service: DatabaseService, sqlite_session):
+    """Posse, listagens existentes e repetidos são verificados para o lote inteiro."""
+    from backend.src.db_models import Marketplace, SkinTable
+
+    _seed_marketplace(sqlite_session, 1)   # skin 1 do vendedor já listada
+    sqlite_session.add_all([
+        SkinTable(id=2, name="Fade", type="Talon", float_value="Factory New", owner_id=1),
+        SkinTable(id=3, name="Doppler", type="Bayonet", float_value="Factory New", owner_id=1),
+        SkinTable(id=4, name="Slaughter", type="Karambit", float_value="Factory New", owner_id=2),
+    ])
+    sqlite_session.commit()
+
+    listed = db_service.add_marketplace_skins(1, [(2, 15.0), (3, 25.0), (2, 99.0), (1, 5.0), (4, 5.0), (77, 5.0)],
+                                              sqlite_session)
+    assert [item["status"] for item in listed["items"]] == [
+        "listed", "listed", "duplicate", "already_listed", "not_owner", "not_found"]
+    assert listed["succeeded"] == 2
+    new_ids = [item["marketplace_skin_id"] for item in listed["items"][:2]]
+    assert {(m.id, m.skin_id, m.value) for m in sqlite_session.query(Marketplace)} == {
+        (1, 1, 10.0), (new_ids[0], 2, 15.0), (new_ids[1], 3, 25.0)}
+
+    removed = db_service.remove_marketplace_skins(2, [new_ids[0]], sqlite_session)
+    assert removed["items"][0]["status"] == "not_owner"
+    removed = db_service.remove_marketplace_skins(1, new_ids + [new_ids[0], 555], sqlite_session)
+    assert [item["status"] for item in removed["items"]] == ["removed", "removed", "duplicate", "not_found"]
+    assert [item["skin_id"] for item in removed["items"]] == [2, 3, 2, None]
+    assert [m.id for m in sqlite_session.query(Marketplace)] == [1]
+
+
+# --- ESCRITAS COM RETURNING (SQLite em memória) ---
+
+def test_create_user_and_duplicate_on_real_database(db_service: DatabaseService, sqlite_session, mock_user_data: MockUser):
+    """O email duplicado é detetado pelo ON CONFLICT, sem SELECT prévio."""
+    user_id = db_service.create_user(mock_user_data, sqlite_session)
+    assert int(user_id) > 0
+    with pytest.raises(ValueError, match="already exists"):
+        db_service.create_user(mock_user_data, sqlite_session)
+
+
+def test_deposit_funds_updates_balance_and_records_transaction(db_service: DatabaseService, sqlite_session):
+    """O depósito atualiza o saldo na base de dados e regista a transação no mesmo commit."""
+    from backend.src.db_models import Transaction
+
+    _seed_marketplace(sqlite_session, 0)
+    assert db_service.deposit_funds("buyer@example.com", 25.0, sqlite_session) == 25.0
+    assert db_service.deposit_funds("buyer@example.com", 10.0, sqlite_session) == 35.0
+
+    deposits = sqlite_session.query(Transaction).filter_by(user_id=2, type="deposit").order_by(Transaction.id).all()
+    assert [t.amount for t in deposits] == [25.0, 10.0]
+
+    with pytest.raises(ValueError, match="não encontrado"):
+        db_service.deposit_funds("nobody@example.com", 10.0, sqlite_session)
+
+
+def test_add_marketplace_skin_rejects_duplicate_listing(db_service: DatabaseService, sqlite_session):
+    """A mesma skin não pode ser listada duas vezes (índice único + ON CONFLICT)."""
+    from backend.src.db_models import SkinTable
+
+    _seed_marketplace(sqlite_session, 0)
+    sqlite_session.add(SkinTable(id=50, name="Fade", type="Talon", float_value="Factory New", owner_id=1))
+    sqlite_session.commit()
+
+    listing_id = db_service.add_marketplace_skin(50, 99.0, sqlite_session)
+    assert int(listing_id) > 0
+    with pytest.raises(ValueError, match="já está listada"):
+        db_service.add_marketplace_skin(50, 120.0, sqlite_session)
+
+
+
+def _run_import(db_service, session, body: bytes, import_format: str, chunk: int = 7, **limits):
+    """Corre uma importação com o corpo partido em blocos pequenos (linhas e UTF-8 cortados a meio)."""
+    import asyncio
+    from backend.src.utils.bulk_import import import_skins
+
+    async def chunks():
+        for start in range(0, len(body), chunk):
+            yield body[start:start + chunk]
+
+    async def apply_batch(rows):
+        return db_service.apply_skin_import(rows, session)
+
+    options = {"batch_size": 2, "max_line_bytes": 1024, "max_errors": 10, **limits}
+    return asyncio.run(import_skins(chunks(), import_format, apply_batch, **options))
+
+
+def test_skin_import_csv_applies_batches_and_reports_rows(db_service: DatabaseService, sqlite_session):
+    """Criações, atualizações parciais e eliminações em lotes; erros por linha."""
+    from backend.src.db_models import SkinTable
+
+    sqlite_session.add_all([SkinTable(id=1, name="Old", type="Bayonet", float_value="Field-Tested", owner_id=0),
+                            SkinTable(id=2, name="Gone", type="Bayonet", float_value="Field-Tested", owner_id=0)])
+    sqlite_session.commit()
+    body = (
+        "op,id,name,type,float,link\n"
+        "create,,Dragão,Karambit,Factory New,https://example.com/a.png\n"
+        ",1,Renamed,,,\n"
+        "delete,2,,,,\n"
+        "create,,\"Fade, \"\"Ruby\"\"\nedition\",Talon,Minimal Wear,https://example.com/b.png\n"
+        "create,,SemTipo,,Factory New,x\n"
+        "update,99,Nope,,,\n"
+        "bogus,1,,,,\n"
+        "delete,1,,,,\n"
+    ).encode()
+
+    report = _run_import(db_service, sqlite_session, body, "csv")
+
+    assert (report["processed"], report["created"], report["updated"], report["deleted"], report["failed"]) == (8, 2, 1, 2, 3)
+    errors = {error["line"]: error["error"] for error in report["errors"]}
+    assert sorted(errors) == [7, 8, 9]
+    assert "type" in errors[7] and "99" in errors[8] and "bogus" in errors[9]
+    assert report["rows_per_second"] > 0 and report["aborted"] is None
+    sqlite_session.expire_all()
+    names = sorted(skin.name for skin in sqlite_session.query(SkinTable))
+    assert names == ["Dragão", 'Fade, "Ruby"\nedition']
+
+
+def test_skin_import_ndjson_and_bounded_lines(db_service: DatabaseService, sqlite_session):
+    from backend.src.db_models import SkinTable
+
+    body = (b'{"name": "A", "type": "Bayonet", "float_value": "Factory New", "link": "x"}\n'
+            b'not json\n\n'
+            b'{"name": "B", "type": "Bayonet", "float_value": "Factory New", "link": "x"}\n')
+    report = _run_import(db_service, sqlite_session, body, "ndjson")
+    assert (report["created"], report["failed"], report["errors"][0]["line"]) == (2, 1, 2)
+
+    report = _run_import(db_service, sqlite_session, body + b"x" * 200, "ndjson", max_line_bytes=100)
+    assert "100 bytes" in report["aborted"]
+    assert sqlite_session.query(SkinTable).count() == 4
+
+
+# --- GERADOR DE DATASETS ---
+
+def test_generate_dataset_is_deterministic_and_consistent():
+    """A mesma seed produz o mesmo dataset; listagens únicas e chaves estrangeiras válidas."""
+    from datetime import datetime
+    from sqlalchemy import create_engine, select, func
+    from backend.src.db_models import Base, SkinTable, Marketplace, Transaction, UserTable
+    from backend.src.generate_dataset import generate
+
+    def build(seed):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        stats = generate(engine, users=50, skins=400, listings=60, transactions=300,
+                         seed=seed, anchor=datetime(2026, 1, 1), batch_size=64)
+        with engine.connect() as conn:
+            rows = {
+                model.__tablename__: conn.execute(select(model).order_by(model.id)).all()
+                for model in (UserTable, SkinTable, Marketplace, Transaction)
+            }
+            orphan_skins = conn.execute(
+                select(func.count()).select_from(SkinTable)
+                .where(SkinTable.owner_id.not_in(select(UserTable.id)))
+            ).scalar()
+        engine.dispose()
+        return stats, rows, orphan_skins
+
+    stats, rows, orphan_skins = build(7)
+    assert {table: s["rows"] for table, s in stats["tables"].items()} == {
+        "users": 50, "skins": 400, "marketplace": 60, "transactions": 300
+    }
+    assert orphan_skins == 0
+    assert len({listing.skin_id for listing in rows["marketplace"]}) == 60
+    # As estatísticas de mercado cobrem as listagens carregadas
+    assert stats["market_stats"]["corrected"] == stats["market_stats"]["checked"] > 0
+
+    _, same_rows, _ = build(7)
+    _, other_rows, _ = build(8)
+    # O hash da password tem um salt aleatório; tudo o resto tem de coincidir
+    assert [user[:3] + user[4:] for user in same_rows.pop("users")] == [user[:3] + user[4:] for user in rows.pop("users")]
+    assert same_rows == rows
+    assert other_rows["skins"] != rows["skins"]
+
+
+def test_generate_dataset_rejects_more_listings_than_skins():
+    from sqlalchemy import create_engine
+    from backend.src.generate_dataset import generate
+
+    with pytest.raises(ValueError, match="listagens"):
+        generate(create_engine("sqlite://"), users=1, skins=1, listings=2, transactions=0)
+
+
+# --- PLANOS DE EXECUÇÃO (regressão de índices) ---
+#
+# Cada consulta do DatabaseService corre sobre um dataset gerado e o plano de
+# cada statement emitido é obtido com EXPLAIN. O teste falha se alguma tabela
+# for lida com um scan sequencial, exceto as leituras que por definição devolvem
+# a tabela inteira (listadas em FULL_SCAN_ALLOWED).
+#
+# Por omissão usa SQLite em memória; com PLAN_TEST_DATABASE_URL apontado para um
+# Postgres migrado corre o mesmo teste com `enable_seqscan = off`.
+
+FULL_SCAN_ALLOWED = {
+    "get_all_users": {"users"},
+    "get_all_skins": {"skins"},
+    # Todo o marketplace (exceto as listagens do próprio utilizador)
+    "get_marketplace_skins": {"marketplace"},
+}
+
+
+def _sequential_scans(conn, statement, parameters):
+    """Tabelas lidas com scan sequencial no plano do statement."""
+    import re
+
+    if conn.dialect.name == "sqlite":
+        plan = [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+        # "SCAN skins" é um scan da tabela; "SCAN marketplace USING INDEX ..." percorre um índice
+        return {m.group(1) for line in plan if (m := re.match(r"SCAN (\w+)$", line))}
+    plan = [row[0] for row in conn.exec_driver_sql("EXPLAIN " + statement, parameters)]
+    return {m.group(1) for line in plan if (m := re.search(r"Seq Scan on (\w+)", line))}
+
+
+@pytest.fixture(scope="module")
+def seeded_plan_engine():
+    """Engine com um dataset gerado (sem skins nem transações órfãs) e estatísticas atualizadas."""
+    import os
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.pool import StaticPool
+    from backend.src.db_models import Base
+    from backend.src.generate_dataset import generate
+
+    url = os.getenv("PLAN_TEST_DATABASE_URL")
+    if not url:
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+    else:
+        engine = create_engine(url)
+
+        @event.listens_for(engine, "connect")
+        def disable_seqscan(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("SET enable_seqscan = off")
+            cursor.close()
+    stats = generate(engine, users=300, skins=3000, listings=400, transactions=5000, seed=3)
+    yield engine, stats
+    engine.dispose()
+
+
+def _plan_scenarios(user_id, email, listed_skin_id):
+    return {
+        "get_user_by_email": lambda s, db: s.get_user_by_email(email, db),
+        "get_all_users": lambda s, db: s.get_all_users(db),
+        "get_user_skins": lambda s, db: s.get_user_skins(user_id, db),
+        "get_all_skins": lambda s, db: s.get_all_skins(db),
+        "get_marketplace_skins": lambda s, db: s.get_marketplace_skins(email, db),
+        "get_marketplace_skins_page": lambda s, db: s.get_marketplace_skins_page(email, db, limit=20),
+        "get_marketplace_skins_page_by_price": lambda s, db: s.get_marketplace_skins_page(
+            email, db, limit=20, sort="price", order="asc", skin_type="Karambit"),
+        "get_user_marketplace_skins": lambda s, db: s.get_user_marketplace_skins(email, db),
+        "get_transactions_by_user": lambda s, db: s.get_transactions_by_user(user_id, db),
+        "get_user_skins_json": lambda s, db: s.get_user_skins_json(user_id, db),
+        "get_user_marketplace_skins_json": lambda s, db: s.get_user_marketplace_skins_json(email, db),
+        "get_transactions_by_user_json": lambda s, db: s.get_transactions_by_user_json(user_id, db),
+        "deposit_funds": lambda s, db: s.deposit_funds(email, 1_000_000.0, db),
+        "buy_marketplace_skin": lambda s, db: s.buy_marketplace_skin(listed_skin_id, user_id, db),
+    }
+
+
+PLAN_METHODS = list(_plan_scenarios(0, "", 0))
+
+
+@pytest.mark.parametrize("method", PLAN_METHODS)
+def test_service_queries_do_not_use_sequential_scans(seeded_plan_engine, method):
+    from sqlalchemy import event, select
+    from sqlalchemy.orm import sessionmaker
+    from backend.src.db_models import Marketplace, SkinTable, UserTable
+
+    engine, stats = seeded_plan_engine
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    user_id, email = session.execute(select(UserTable.id, UserTable.email).order_by(UserTable.id.desc())).first()
+    listed_skin_id = session.execute(
+        select(Marketplace.skin_id).join(SkinTable, SkinTable.id == Marketplace.skin_id)
+        .where(SkinTable.owner_id != user_id).order_by(Marketplace.id)
+    ).scalars().first()
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and not statement.lstrip().upper().startswith(("EXPLAIN", "INSERT")):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        _plan_scenarios(user_id, email, listed_skin_id)[method](DatabaseService(), session)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+        session.close()
+
+    assert captured, f"{method} não executou nenhuma consulta"
+    allowed = FULL_SCAN_ALLOWED.get(method, set())
+    with engine.connect() as conn:
+        for statement, parameters in captured:
+            scans = _sequential_scans(conn, statement, parameters) - allowed
+            assert not scans, f"{method}: scan sequencial em {sorted(scans)} para:\n{statement}"
+
+
+# --- CACHE DE RESPOSTAS ---
+
+@pytest.fixture
+def fresh_response_cache():
+    """Esvazia a cache partilhada antes e depois do teste (cada teste usa uma base de dados nova)."""
+    from backend.src.cache import response_cache
+    response_cache.clear()
+    yield response_cache
+    response_cache.clear()
+
+
+def test_response_cache_ttl_and_lru():
+    from backend.src.cache import ResponseCache
+
+    now = [0.0]
+    cache = ResponseCache(max_entries=2, ttl=5.0, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1          # "a" passa a ser o mais recente
+    cache.set("c", 3)                   # sai "b" (LRU)
+    assert cache.get("b") is None
+    now[0] = 6.0
+    assert cache.get("a") is None       # expirou
+    stats = cache.stats()
+    assert (stats["hits"], stats["evictions"], stats["expirations"]) == (1, 1, 1)
+
+
+def test_response_cache_discards_loads_invalidated_midway():
+    from backend.src.cache import ResponseCache
+
+    cache = ResponseCache()
+
+    def slow_loader():
+        # Uma escrita invalida a chave enquanto a leitura ainda está a decorrer
+        cache.invalidate("k")
+        return "stale"
+
+    assert cache.get_or_load("k", slow_loader) == "stale"
+    assert cache.get("k") is None
+    assert cache.stats()["stale_loads"] == 1
+
+
+def test_marketplace_json_shares_snapshot_and_is_invalidated_by_writes(db_service: DatabaseService, sqlite_session, fresh_response_cache):
+    """Um só snapshot serve todos os utilizadores; compras e novas listagens invalidam-no."""
+    import json
+    from backend.src.db_models import SkinTable, UserTable
+
+    _seed_marketplace(sqlite_session, 3)
+    sqlite_session.get(UserTable, 2).funds = 1000.0
+    sqlite_session.commit()
+    misses_before = fresh_response_cache.stats()["misses"]
+
+    as_buyer = json.loads(db_service.get_marketplace_skins_json("buyer@example.com", sqlite_session))
+    as_seller = json.loads(db_service.get_marketplace_skins_json("seller@example.com", sqlite_session))
+    assert len(as_buyer) == 3
+    assert as_seller == []              # as próprias listagens são filtradas
+    assert fresh_response_cache.stats()["misses"] - misses_before == 1
+
+    db_service.buy_marketplace_skin(as_buyer[0]["id"], 2, sqlite_session)
+    assert len(json.loads(db_service.get_marketplace_skins_json("buyer@example.com", sqlite_session))) == 2
+
+    sqlite_session.add(SkinTable(id=60, name="Fade", type="Talon", float_value="Factory New", owner_id=1))
+    sqlite_session.commit()
+    db_service.add_marketplace_skin(60, 10.0, sqlite_session)
+    assert len(json.loads(db_service.get_marketplace_skins_json("buyer@example.com", sqlite_session))) == 3
+
+
+def test_all_skins_json_is_invalidated_by_skin_writes(db_service: DatabaseService, sqlite_session, fresh_response_cache):
+    import json
+    from backend.src.models import CreateSkinRequest, EditSkinRequest
+
+    _seed_marketplace(sqlite_session, 2)
+    hits_before = fresh_response_cache.stats()["hits"]
+    assert len(json.loads(db_service.get_all_skins_json(sqlite_session))) == 2
+    json.loads(db_service.get_all_skins_json(sqlite_session))
+    assert fresh_response_cache.stats()["hits"] - hits_before == 1
+
+    skin_id = db_service.create_skin(
+        CreateSkinRequest(name="Lore", type="Bayonet", float="Field-Tested", link="img.png"), sqlite_session
+    )
+    skins = json.loads(db_service.get_all_skins_json(sqlite_session))
+    assert len(skins) == 3
+
+    db_service.edit_skin(int(skin_id), EditSkinRequest(name="Slaughter"), sqlite_session)
+    assert "Slaughter" in {skin["name"] for skin in json.loads(db_service.get_all_skins_json(sqlite_session))}
+
+    db_service.delete_skin(int(skin_id), sqlite_session)
+    assert len(json.loads(db_service.get_all_skins_json(sqlite_session))) == 2
+
+
+# --- LEITURAS EM STREAMING ---
+
+def test_stream_methods_match_list_methods(db_service: DatabaseService, sqlite_session):
+    """As variantes em streaming devolvem os mesmos dados que os métodos de listagem."""
+    _seed_marketplace(sqlite_session, 2)
+    db_service.deposit_funds("buyer@example.com", 5.0, sqlite_session)
+    db_service.deposit_funds("buyer@example.com", 7.0, sqlite_session)
+
+    assert list(db_service.stream_all_users(sqlite_session)) == db_service.get_all_users(sqlite_session)
+    assert list(db_service.stream_transactions_by_user(2, sqlite_session)) == db_service.get_transactions_by_user(2, sqlite_session)
+    assert [s["id"] for s in db_service.stream_all_skins(sqlite_session)] == [s.id for s in db_service.get_all_skins(sqlite_session)]
+    assert list(db_service.stream_user_skins(1, sqlite_session)) == []      # todas listadas
+
+
+def test_json_stream_encoders_chunk_output():
+    import json
+    from datetime import datetime
+    from backend.src.utils.streaming import json_array_stream, ndjson_stream
+
+    rows = [{"id": i, "date": datetime(2026, 1, 1)} for i in range(100)]
+    chunks = list(json_array_stream(iter(rows), chunk_bytes=256))
+    assert len(chunks) > 1
+    assert json.loads(b"".join(chunks))[0] == {"id": 0, "date": "2026-01-01T00:00:00"}
+    assert b"".join(json_array_stream(iter([]))) == b"[]"
+    assert len(b"".join(ndjson_stream(iter(rows))).splitlines()) == 100
+
+
+# --- SERIALIZAÇÃO RÁPIDA ---
+
+def test_json_read_paths_match_response_models(db_service: DatabaseService, sqlite_session):
+    """Os caminhos *_json devolvem o mesmo JSON que o método antigo validado pelo response_model."""
+    import json
+    from typing import List
+    from pydantic import TypeAdapter
+    from backend.src.db_models import SkinTable
+    from backend.src.models import MarketplaceSkinDisplay
+
+    _seed_marketplace(sqlite_session, 3)
+    sqlite_session.add(SkinTable(id=10, name="Inventário", type="Rifle", float_value="Field-Tested", owner_id=2))
+    sqlite_session.commit()
+    db_service.deposit_funds("buyer@example.com", 5.0, sqlite_session)
+    db_service.deposit_funds("buyer@example.com", 7.5, sqlite_session)
+
+    listed = TypeAdapter(List[MarketplaceSkinDisplay])
+    expected = listed.dump_python(listed.validate_python(
+        db_service.get_user_marketplace_skins("seller@example.com", sqlite_session)), mode="json")
+    assert json.loads(db_service.get_user_marketplace_skins_json("seller@example.com", sqlite_session)) == expected
+
+    inventory = TypeAdapter(list).dump_python(db_service.get_user_skins(2, sqlite_session), mode="json")
+    assert json.loads(db_service.get_user_skins_json(2, sqlite_session)) == inventory
+    assert json.loads(db_service.get_transactions_by_user_json(2, sqlite_session)) == \
+        db_service.get_transactions_by_user(2, sqlite_session)
+
+
+def test_fast_json_fallback_matches_orjson(monkeypatch):
+    """Sem o orjson, o encoder da biblioteca padrão produz os mesmos bytes."""
+    import importlib
+    import sys
+    from datetime import datetime
+    from backend.src.utils import fast_json
+
+    payload = [{"id": 1, "name": "Ação", "value": 10.5, "date": datetime(2026, 1, 1, 12, 30, 0, 15), "link": None}]
+    fast = fast_json.dumps(payload)
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    try:
+        fallback = importlib.reload(fast_json)
+        assert fallback.BACKEND == "json"
+        assert fallback.dumps(payload) == fast
+        assert fallback.dumps_envelope({"message": "ok"}, "skins", b"[]") == b'{"message":"ok","skins":[]}'
+    finally:
+        monkeypatch.undo()
+        importlib.reload(fast_json)
+
+
+# --- FEED DO MARKETPLACE ---
+
+def _next_frames(subscription, count):
+    """Os próximos `count` frames da fila de um subscritor (sem bloquear)."""
+    return [subscription.queue.get_nowait() for _ in range(count)]
+
+
+def test_marketplace_events_deliver_from_threads_and_drop_slow_consumers():
+    import asyncio
+    import threading
+    from backend.src.events import MarketplaceEvents, RESYNC_FRAME
+
+    async def scenario():
+        events = MarketplaceEvents(max_queue=2, history=16)
+        fast = events.subscribe()
+        slow = events.subscribe()
+
+        # Publicação a partir de outra thread, como nos endpoints síncronos
+        worker = threading.Thread(target=events.publish, args=("listing-added", {"id": 1}))
+        worker.start()
+        worker.join()
+        await asyncio.sleep(0)
+        assert _next_frames(fast, 1) == [b'id: 1\nevent: listing-added\ndata: {"id":1}\n\n']
+
+        # O subscritor lento nunca consome: ao encher a fila é desligado com um resync
+        for skin_id in (2, 3):
+            events.publish("listing-removed", {"id": skin_id})
+        await asyncio.sleep(0)
+        assert [frame async for frame in events.stream(slow, keepalive=1)] == [RESYNC_FRAME]
+        assert len(_next_frames(fast, 2)) == 2
+        assert (events.stats()["subscribers"], events.stats()["dropped_subscribers"]) == (1, 1)
+
+    asyncio.run(scenario())
+
+
+def test_marketplace_events_replay_after_last_event_id():
+    import asyncio
+    from backend.src.events import MarketplaceEvents, RESYNC_FRAME
+
+    async def scenario():
+        events = MarketplaceEvents(max_queue=8, history=2)
+        for skin_id in (1, 2, 3):
+            events.publish("listing-sold", {"id": skin_id})
+
+        replayed = events.subscribe(last_event_id=1)
+        assert [frame.split(b"\n")[0] for frame in _next_frames(replayed, 2)] == [b"id: 2", b"id: 3"]
+        # O evento 1 já saiu do histórico: quem o perdeu tem de recarregar
+        assert _next_frames(events.subscribe(last_event_id=0), 1) == [RESYNC_FRAME]
+        assert events.subscribe(last_event_id=3).queue.empty()
+
+    asyncio.run(scenario())
+
+
+def test_marketplace_writes_publish_events_after_commit(db_service: DatabaseService, sqlite_session, monkeypatch):
+    from backend.src.db_models import SkinTable, UserTable
+
+    published = []
+    monkeypatch.setattr("backend.src.database.marketplace_events.publish",
+                        lambda event_type, data: published.append((event_type, data)))
+    _seed_marketplace(sqlite_session, 1)
+    sqlite_session.add(SkinTable(id=2, name="Fade", type="Karambit", float_value="Factory New", owner_id=1, link="img.png"))
+    sqlite_session.get(UserTable, 2).funds = 100.0
+    sqlite_session.commit()
+
+    marketplace_skin_id = int(db_service.add_marketplace_skin(2, 25.0, sqlite_session))
+    with pytest.raises(ValueError):
+        db_service.add_marketplace_skin(2, 30.0, sqlite_session)   # duplicado: sem evento
+    db_service.remove_marketplace_skin(marketplace_skin_id, sqlite_session)
+    db_service.buy_marketplace_skin(1, 2, sqlite_session)
+
+    assert published == [
+        ("listing-added", {"id": 2, "name": "Fade", "type": "Karambit", "float_value": "Factory New",
+                           "owner_id": 1, "link": "img.png", "value": 25.0, "marketplace_skin_id": marketplace_skin_id}),
+        ("listing-removed", {"id": 2, "marketplace_skin_id": marketplace_skin_id}),
+        ("listing-sold", {"id": 1, "marketplace_skin_id": 1, "value": 10.0}),
+    ]
+
+
+def test_catalogue_deletes_publish_removed_listings(db_service: DatabaseService, sqlite_session, monkeypatch):
+    """Eliminar skins listadas (admin ou importação) remove as listagens e publica listing-removed."""
+    from backend.src.db_models import Marketplace
+
+    published = []
+    monkeypatch.setattr("backend.src.database.marketplace_events.publish",
+                        lambda event_type, data: published.append((event_type, data)))
+    _seed_marketplace(sqlite_session, 3)
+
+    db_service.delete_skin(1, sqlite_session)
+    report = _run_import(db_service, sqlite_session, b"op,id\ndelete,2\n", "csv")
+
+    assert report["deleted"] == 1
+    assert published == [("listing-removed", {"id": 1, "marketplace_skin_id": 1}),
+                         ("listing-removed", {"id": 2, "marketplace_skin_id": 2})]
+    assert [listing.skin_id for listing in sqlite_session.query(Marketplace)] == [3]
+
+
+def test_business_counters_follow_committed_writes(db_service: DatabaseService, sqlite_session):
+    """Compras, depósitos e listagens só contam depois do commit; falhas não contam."""
+    from backend.src.db_models import SkinTable
+    from backend.src.metrics import PURCHASES, PURCHASE_VALUE, DEPOSITS, DEPOSIT_AMOUNT, LISTINGS
+
+    counters = lambda: (PURCHASES.value(), PURCHASE_VALUE.value(), DEPOSITS.value(), DEPOSIT_AMOUNT.value(),
+                        LISTINGS.value("added"), LISTINGS.value("removed"))
+    before = counters()
+    _seed_marketplace(sqlite_session, 1)
+    sqlite_session.add(SkinTable(id=2, name="Fade", type="Karambit", float_value="Factory New", owner_id=1))
+    sqlite_session.commit()
+
+    with pytest.raises(ValueError):
+        db_service.buy_marketplace_skin(1, 2, sqlite_session)   # sem fundos
+    db_service.deposit_funds("buyer@example.com", 15.0, sqlite_session)
+    db_service.buy_marketplace_skin(1, 2, sqlite_session)
+    marketplace_skin_id = int(db_service.add_marketplace_skin(2, 25.0, sqlite_session))
+    db_service.remove_marketplace_skin(marketplace_skin_id, sqlite_session)
+
+    assert tuple(after - start for after, start in zip(counters(), before)) == (1, 10.0, 1, 15.0, 1, 1)
+
+
+def test_histogram_renders_cumulative_buckets():
+    from backend.src.metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latência", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, "/skins")
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{route="/skins",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/skins",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/skins",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/skins"} 4' in lines
+    assert 'latency_seconds_sum{route="/skins"} 4.05' in lines
+
+
+def test_threadpool_wait_is_measured_until_the_function_starts():
+    import threading
+    import anyio
+    import anyio.to_thread
+    from backend.src.metrics import THREADPOOL_WAIT, instrument_threadpool, registry
+
+    def wait_sum():
+        return float(next(line.split()[1] for line in registry.render().splitlines()
+                          if line.startswith("threadpool_wait_seconds_sum")))
+
+    instrument_threadpool()
+    instrument_threadpool()   # idempotente: a espera não é medida duas vezes
+    anyio.run(anyio.to_thread.run_sync, lambda: None)
+    count, total = THREADPOOL_WAIT.count(), wait_sum()
+    release = threading.Event()
+
+    async def scenario():
+        # Uma só thread: a segunda chamada espera que a primeira a liberte
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 1
+        async with anyio.create_task_group() as group:
+            group.start_soon(anyio.to_thread.run_sync, release.wait)
+            await anyio.sleep(0.01)
+            group.start_soon(anyio.to_thread.run_sync, lambda: None)
+            await anyio.sleep(0.1)
+            release.set()
+
+    anyio.run(scenario)
+    assert THREADPOOL_WAIT.count() == count + 2
+    assert wait_sum() - total >= 0.09
+
+
+# --- LEDGER ---
+
+@pytest.fixture
+def ledger_mode(monkeypatch):
+    from backend.src.settings import settings
+    monkeypatch.setattr(settings, "ledger_mode", "ledger")
+
+
+def test_ledger_deposits_and_purchases_only_append_entries(db_service: DatabaseService, sqlite_session, ledger_mode):
+    """Modo ledger: saldos em cêntimos a partir do snapshot + cauda; users.funds fica congelado."""
+    from backend.src.db_models import BalanceSnapshot, LedgerEntry, UserTable
+
+    _seed_marketplace(sqlite_session, 3)   # preços 10, 20, 30
+    sqlite_session.get(UserTable, 2).funds = 5.0   # saldo de abertura
+    sqlite_session.commit()
+
+    assert db_service.deposit_funds("buyer@example.com", 0.1, sqlite_session) == 5.1
+    assert db_service.deposit_funds("buyer@example.com", 0.2, sqlite_session) == 5.3
+    assert db_service.deposit_funds("buyer@example.com", 24.6, sqlite_session) == 29.9
+    with pytest.raises(ValueError, match="fundos suficientes"):
+        db_service.buy_marketplace_skin(3, 2, sqlite_session)
+
+    db_service.buy_marketplace_skin(2, 2, sqlite_session)
+    assert db_service.deposit_funds("buyer@example.com", 0.1, sqlite_session) == 10.0
+    result = db_service.buy_marketplace_skins([1, 3], 2, False, sqlite_session)
+    assert [item["status"] for item in result["items"]] == ["purchased", "insufficient_funds"]
+
+    sqlite_session.expire_all()
+    assert (db_service.get_balance(2, sqlite_session), db_service.get_balance(1, sqlite_session)) == (0.0, 30.0)
+    assert sqlite_session.get(UserTable, 2).funds == 5.0
+    # O snapshot do comprador já incorporou a cauda; o vendedor só tem entradas novas
+    assert sqlite_session.get(BalanceSnapshot, 2).balance_cents == 0
+    assert sqlite_session.get(BalanceSnapshot, 1).balance_cents == 0
+    assert sorted(e.amount_cents for e in sqlite_session.query(LedgerEntry).filter_by(user_id=1)) == [1000, 2000]
+
+    history = db_service.get_transactions_by_user(2, sqlite_session)
+    assert [(t["type"], t["amount"]) for t in history] == [
+        ("purchase", "-10.0"), ("deposit", "0.1"), ("purchase", "-20.0"), ("deposit", "24.6"), ("deposit", "0.2"),
+        ("deposit", "0.1")]
+    assert list(db_service.stream_transactions_by_user(2, sqlite_session)) == history
+
+
+def test_switching_to_ledger_mode_keeps_legacy_balances(db_service: DatabaseService, sqlite_session, monkeypatch):
+    """Saldo de abertura lido de users.funds na primeira utilização; o histórico legacy passa para o ledger uma só vez."""
+    from datetime import datetime
+    from backend.src import ledger
+    from backend.src.db_models import LedgerEntry, Transaction, UserTable
+    from backend.src.settings import settings
+
+    _seed_marketplace(sqlite_session, 0)
+    sqlite_session.get(UserTable, 2).funds = 10.0
+    # Histórico copiado de transactions pela migração (já incluído em users.funds)
+    sqlite_session.add(Transaction(id=1, user_id=2, amount=10.0, type="deposit", date=datetime(2026, 1, 1)))
+    sqlite_session.add(LedgerEntry(user_id=2, amount_cents=1000, type="deposit", created_at=datetime(2026, 1, 1),
+                                   transaction_id=1))
+    sqlite_session.commit()
+
+    # Depósito em modo legacy depois da migração: só users.funds e transactions
+    assert db_service.deposit_funds("buyer@example.com", 50.0, sqlite_session) == 60.0
+    ledger.check_mode(sqlite_session, "legacy")
+
+    monkeypatch.setattr(settings, "ledger_mode", "ledger")
+    assert db_service.get_balance(2, sqlite_session) == 60.0
+    assert db_service.deposit_funds("buyer@example.com", 5.0, sqlite_session) == 65.0
+    assert db_service.deposit_funds("buyer@example.com", 1.0, sqlite_session) == 66.0
+    assert db_service.get_balance(2, sqlite_session) == 66.0
+    history = db_service.get_transactions_by_user(2, sqlite_session)
+    assert [t["amount"] for t in history] == ["1.0", "5.0", "50.0", "10.0"]
+    funds = {user["id"]: user["funds"] for user in db_service.get_all_users(sqlite_session)}
+    assert funds == {1: 0.0, 2: 66.0}
+    assert list(db_service.stream_all_users(sqlite_session)) == db_service.get_all_users(sqlite_session)
+
+    # Com saldos no ledger, users.funds ficou para trás: o modo legacy é recusado
+    ledger.check_mode(sqlite_session, "ledger")
+    with pytest.raises(RuntimeError, match="LEDGER_MODE=legacy"):
+        ledger.check_mode(sqlite_session, "legacy")
+
+
+def test_ledger_compaction_folds_tails_without_changing_balances(db_service: DatabaseService, sqlite_session, ledger_mode):
+    from backend.src import ledger
+    from backend.src.db_models import BalanceSnapshot
+
+    _seed_marketplace(sqlite_session, 0)
+    for _ in range(3):
+        db_service.deposit_funds("seller@example.com", 1.5, sqlite_session)
+    db_service.deposit_funds("buyer@example.com", 2.0, sqlite_session)
+
+    assert ledger.compact_balances(sqlite_session, min_tail=2) == 1
+    sqlite_session.expire_all()
+    assert sqlite_session.get(BalanceSnapshot, 1).balance_cents == 450
+    assert sqlite_session.get(BalanceSnapshot, 2).balance_cents == 0
+    assert (db_service.get_balance(1, sqlite_session), db_service.get_balance(2, sqlite_session)) == (4.5, 2.0)
+    assert ledger.compact_balances(sqlite_session) == 1
+    assert ledger.compact_balances(sqlite_session) == 0
+
+
+# --- PARTIÇÕES DE TRANSACTIONS ---
+
+def test_partition_planning_creates_ahead_and_expires_whole_months():
+    from datetime import date
+    from backend.src import partitions
+
+    existing = ["transactions_default", "transactions_p2024_11", "transactions_p2024_12",
+                "transactions_p2025_01", "transactions_p2026_10"]
+    today = date(2026, 10, 17)
+
+    assert partitions.add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert partitions.missing_partitions(existing, today, 2) == [date(2026, 11, 1), date(2026, 12, 1)]
+    assert partitions.expired_partitions(existing, today, 21) == ["transactions_p2024_11", "transactions_p2024_12"]
+    assert partitions.partition_bounds(date(2026, 12, 1)) == "FROM ('2026-12-01') TO ('2027-01-01')"
+    assert partitions.partition_month("transactions_default") is None
+
+
+def test_transaction_history_date_window(db_service: DatabaseService, sqlite_session, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from backend.src.db_models import Transaction
+    from backend.src.settings import settings
+
+    _seed_marketplace(sqlite_session, 0)
+    base = datetime(2026, 1, 15)
+    sqlite_session.add_all([Transaction(user_id=2, amount=float(month), type="deposit", date=base.replace(month=month))
+                            for month in (1, 2, 3)])
+    sqlite_session.commit()
+
+    since, until = datetime(2026, 2, 1, tzinfo=timezone.utc), datetime(2026, 3, 15)
+    window = db_service.get_transactions_by_user(2, sqlite_session, since, until)
+    assert [t["amount"] for t in window] == ["2.0"]
+    assert list(db_service.stream_transactions_by_user(2, sqlite_session, since=since)) == \
+        db_service.get_transactions_by_user(2, sqlite_session, since=since)
+    # O mesmo fuso horário noutra representação dá a mesma janela
+    shifted = since.astimezone(timezone(timedelta(hours=2)))
+    assert db_service.get_transactions_by_user(2, sqlite_session, shifted, until) == window
+
+    monkeypatch.setattr(settings, "ledger_mode", "ledger")
+    db_service.deposit_funds("buyer@example.com", 5.0, sqlite_session)
+    assert db_service.get_transactions_by_user(2, sqlite_session, until=datetime(2000, 1, 1)) == []
+    # As transactions do modo legacy passam para o ledger com o primeiro snapshot
+    assert len(db_service.get_transactions_by_user(2, sqlite_session, since=datetime(2000, 1, 1))) == 4
+
+
+# --- PESQUISA DE SKINS ---
+
+def test_term_index_autocomplete_and_typo_tolerant_match():
+    from backend.src.utils.search import TermIndex
+
+    index = TermIndex(["Gamma Doppler", "Doppler", "Fade", "Marble Fade", "Karambit", "Bayonet", "M9 Bayonet", ""])
+
+    assert len(index) == 7
+    assert index.autocomplete("dop", 10) == ["Doppler", "Gamma Doppler"]
+    assert index.autocomplete("BAY", 1) == ["Bayonet"]
+    assert index.autocomplete("zz", 10) == []
+    # Prefixos à frente; erros de escrita apanhados pelos trigramas
+    assert [term for term, _ in index.match("fade", 0.3)][:2] == ["Fade", "Marble Fade"]
+    assert [term for term, _ in index.match("karambti", 0.3)] == ["Karambit"]
+    assert index.match("xyz", 0.3) == []
+
+
+def test_search_skins_ranks_paginates_and_filters_listings(db_service: DatabaseService, sqlite_session, fresh_response_cache):
+    from backend.src.db_models import Marketplace, SkinTable
+
+    _seed_marketplace(sqlite_session, 0)
+    catalogue = [("Gamma Doppler", "Karambit"), ("Doppler", "Bayonet"), ("Fade", "Karambit"),
+                 ("Marble Fade", "Bayonet"), ("Doppler", "Karambit"), ("Tiger Tooth", "M9 Bayonet")]
+    sqlite_session.add_all([SkinTable(id=i, name=name, type=skin_type, float_value="Factory New", owner_id=1)
+                            for i, (name, skin_type) in enumerate(catalogue, start=1)])
+    sqlite_session.add(Marketplace(id=1, skin_id=5, value=50.0))
+    sqlite_session.commit()
+
+    first = db_service.search_skins("dopler", sqlite_session, limit=2)
+    assert [item["id"] for item in first["items"]] == [2, 5]
+    assert first["next_offset"] == 2
+    second = db_service.search_skins("dopler", sqlite_session, limit=2, offset=2)
+    assert ([item["name"] for item in second["items"]], second["next_offset"]) == (["Gamma Doppler"], None)
+
+    listed = db_service.search_skins("doppler", sqlite_session, scope="marketplace")["items"]
+    assert [(item["id"], item["value"], item["marketplace_skin_id"]) for item in listed] == [(5, 50.0, 1)]
+    assert {item["id"] for item in db_service.search_skins("bayonet", sqlite_session)["items"]} == {2, 4, 6}
+
+    assert db_service.autocomplete_skins("f", sqlite_session) == ["Fade", "Marble Fade"]
+    # Uma skin nova entra no vocabulário assim que é criada (invalidação da cache)
+    from backend.src.models import CreateSkinRequest
+    db_service.create_skin(CreateSkinRequest(name="Fire Serpent", type="AK-47", float="Field-Tested",
+                                             link="https://example.com/x.png"), sqlite_session)
+    assert db_service.autocomplete_skins("f", sqlite_session) == ["Fade", "Fire Serpent", "Marble Fade"]
+    with pytest.raises(ValueError, match="pelo menos"):
+        db_service.search_skins("--", sqlite_session)
+
+
+# --- ESTATÍSTICAS DE MERCADO ---
+
+def test_market_stats_follow_listings_sales_and_catalogue_edits(db_service: DatabaseService, sqlite_session, fresh_response_cache):
+    from backend.src import market_stats
+    from backend.src.db_models import UserTable
+    from backend.src.models import EditSkinRequest
+
+    def stats(skin_type, name):
+        row = db_service.get_market_stats(skin_type, name, "Factory New", sqlite_session)[0]
+        return (row["listing_count"], row["floor_price"], row["last_sale_price"], row["sales_24h"], row["volume_24h"])
+
+    # As listagens do seed não passam pelo serviço: a reconciliação cria as 6 chaves
+    _seed_marketplace(sqlite_session, 12)
+    assert market_stats.reconcile(sqlite_session)["corrected"] == 6
+    assert stats("Bayonet", "Skin0") == (2, 10.0, None, 0, 0.0)
+    sqlite_session.get(UserTable, 2).funds = 100.0
+    sqlite_session.commit()
+
+    # Vender a listagem mais barata recalcula o floor; remover a última deixa a chave sem floor
+    db_service.buy_marketplace_skin(1, 2, sqlite_session)
+    assert stats("Bayonet", "Skin0") == (1, 20.0, 10.0, 1, 10.0)
+    db_service.remove_marketplace_skin(7, sqlite_session)
+    assert stats("Bayonet", "Skin0") == (0, None, 10.0, 1, 10.0)
+    db_service.add_marketplace_skin(1, 15.0, sqlite_session)
+    assert stats("Bayonet", "Skin0") == (1, 15.0, 10.0, 1, 10.0)
+
+    # Lote com duas vendas da mesma chave: última venda pela ordem do pedido, volume somado
+    db_service.buy_marketplace_skins([2, 8], 2, True, sqlite_session)
+    assert stats("Karambit", "Skin1") == (0, None, 30.0, 2, 50.0)
+
+    # Editar uma skin listada move a listagem para a nova chave
+    db_service.edit_skin(3, EditSkinRequest(name="Skin0"), sqlite_session)
+    assert stats("Bayonet", "Skin0")[:2] == (2, 15.0)
+    assert stats("Bayonet", "Skin2")[:2] == (1, 40.0)
+    assert market_stats.reconcile(sqlite_session)["corrected"] == 0
+
+    # Deriva e buckets fora da janela de 24 horas
+    from datetime import datetime, timedelta, timezone
+    from backend.src.db_models import MarketStats, MarketStatsHourly
+
+    sqlite_session.get(MarketStats, ("Bayonet", "Skin2", "Factory New")).listing_count = 99
+    sqlite_session.add(MarketStatsHourly(type="Bayonet", name="Skin2", float_value="Factory New", sales=1, volume=5.0,
+                                         hour=market_stats.hour_start(datetime.now(timezone.utc) - timedelta(days=3))))
+    sqlite_session.commit()
+    assert stats("Bayonet", "Skin2")[3:] == (0, 0.0)
+    assert market_stats.reconcile(sqlite_session) == {"checked": 6, "corrected": 1, "pruned_buckets": 1}
+    sqlite_session.expire_all()
+    assert stats("Bayonet", "Skin2")[:2] == (1, 40.0)
+
+
+def test_market_stats_sales_and_removals_create_missing_keys(db_service: DatabaseService, sqlite_session):
+    """Listagens criadas fora do serviço (sem linha em market_stats): vendas e remoções não se perdem."""
+    from backend.src import market_stats
+    from backend.src.db_models import UserTable
+
+    def stats(skin_type, name):
+        row = db_service.get_market_stats(skin_type, name, "Factory New", sqlite_session)[0]
+        return (row["listing_count"], row["floor_price"], row["last_sale_price"], row["sales_24h"], row["volume_24h"])
+
+    _seed_marketplace(sqlite_session, 12)
+    sqlite_session.get(UserTable, 2).funds = 100.0
+    sqlite_session.commit()
+
+    db_service.buy_marketplace_skin(1, 2, sqlite_session)
+    assert stats("Bayonet", "Skin0") == (1, 20.0, 10.0, 1, 10.0)
+    db_service.remove_marketplace_skin(7, sqlite_session)
+    assert stats("Bayonet", "Skin0") == (0, None, 10.0, 1, 10.0)
+    db_service.buy_marketplace_skins([2, 8], 2, True, sqlite_session)
+    assert stats("Karambit", "Skin1") == (0, None, 30.0, 2, 50.0)
+    # Só faltam as 4 chaves em que ninguém tocou
+    assert market_stats.reconcile(sqlite_session)["corrected"] == 4
+
+
+# --- RÉPLICAS DE LEITURA ---
+
+def test_replica_router_round_robin_failover_and_read_your_writes(tmp_path):
+    from sqlalchemy import create_engine, update
+    from sqlalchemy.orm import sessionmaker
+    from backend.src.db_models import Base, UserTable
+    from backend.src.metrics import DB_READ_ROUTING, DB_REPLICA_UP
+    from backend.src.replicas import ReplicaRouter
+
+    engines = {}
+    for name, funds in (("primary", 10.0), ("replica", 99.0)):
+        engines[name] = create_engine(f"sqlite:///{tmp_path / name}.db")
+        Base.metadata.create_all(engines[name])
+        with engines[name].begin() as conn:
+            conn.execute(UserTable.__table__.insert().values(id=5, name="u", email="u@example.com", password="x", funds=funds))
+    Primary = sessionmaker(bind=engines["primary"])
+    now = [0.0]
+    router = ReplicaRouter(Primary, [f"sqlite:///{tmp_path / 'replica'}.db", f"sqlite:///{tmp_path / 'missing' / 'x'}.db"],
+                           read_your_writes_seconds=2.0, retry_after=5.0, clock=lambda: now[0])
+
+    def funds_seen(user_id):
+        with Primary() as primary:
+            session = router.read_session(user_id, primary)
+            try:
+                return session.get(UserTable, 5).funds, session.info.get("replica")
+            finally:
+                if session is not primary:
+                    session.close()
+
+    before = DB_READ_ROUTING.value("replica1", "round_robin")
+    # A segunda réplica não abre: é afastada e a leitura vai para a primeira
+    assert funds_seen(5) == (99.0, "replica1")
+    assert funds_seen(5) == (99.0, "replica1")
+    assert DB_REPLICA_UP.value("replica2") == 0
+    assert DB_READ_ROUTING.value("replica1", "round_robin") - before == 2
+
+    # Uma escrita do utilizador 5 prende as suas leituras ao primário durante a janela
+    with Primary() as primary:
+        primary.info["user_id"] = 5
+        primary.execute(update(UserTable).where(UserTable.id == 5).values(funds=20.0))
+        primary.commit()
+    assert funds_seen(5) == (20.0, None)
+    assert funds_seen(6)[1] == "replica1"
+    with router.replicas[0].sessionmaker() as replica_session:
+        replica_session.info["replica"] = "replica1"
+        assert router.may_be_stale(replica_session)
+        now[0] = 2.5
+        assert not router.may_be_stale(replica_session)
+    assert funds_seen(5) == (99.0, "replica1")
+    assert [replica["up"] for replica in router.status()] == [True, False]
+
+    for engine in engines.values():
+        engine.dispose()
+    for replica in router.replicas:
+        replica.engine.dispose()
+
+
+def test_postgres_cte_deposit_keeps_reads_on_primary(db_service: DatabaseService, tmp_path, monkeypatch):
+    """O depósito em Postgres (UPDATE e INSERT em CTEs de um SELECT) conta como escrita do utilizador."""
+    from types import SimpleNamespace
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from backend.src.db_models import Base
+    from backend.src.replicas import ReplicaRouter
+
+    engines = [create_engine(f"sqlite:///{tmp_path / name}.db") for name in ("primary", "replica")]
+    for engine in engines:
+        Base.metadata.create_all(engine)
+    Primary = sessionmaker(bind=engines[0])
+    router = ReplicaRouter(Primary, [f"sqlite:///{tmp_path / 'replica'}.db"],
+                           read_your_writes_seconds=2.0, retry_after=5.0)
+
+    with Primary() as db:
+        db.info["user_id"] = 5
+        # Sem Postgres: o SELECT com as CTEs devolve a linha creditada sem executar
+        monkeypatch.setattr(db, "get_bind", lambda *args, **kwargs: SimpleNamespace(dialect=SimpleNamespace(name="postgresql")))
+        monkeypatch.setattr(db, "execute", lambda *args, **kwargs: SimpleNamespace(one_or_none=lambda: SimpleNamespace(id=5, funds=35.0)))
+        assert db_service.deposit_funds("user@example.com", 25.0, db) == 35.0
+
+    with Primary() as primary:
+        assert router.read_session(5, primary) is primary
+        other = router.read_session(6, primary)
+        assert other.info["replica"] == "replica1"
+        other.close()
+
+    for engine in engines + [replica.engine for replica in router.replicas]:
+        engine.dispose()
+
+
+# --- HASHING DE PASSWORDS ---
+
+def test_password_hasher_rejects_when_executor_and_queue_are_full():
+    import asyncio
+    import threading
+    from backend.src.hashing import PasswordHasher, HashingOverloaded
+
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        blocked = [asyncio.ensure_future(hasher._run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(HashingOverloaded):
+            await hasher._run(release.wait)
+        release.set()
+        await asyncio.gather(*blocked)
+        # Com vagas livres volta a aceitar trabalho
+        assert await hasher._run(lambda: "ok") == "ok"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["in_flight"] == 0
+
+
+def test_verify_and_update_rehashes_when_cost_changes():
+    import asyncio
+    from passlib.context import CryptContext
+    from backend.src.hashing import PasswordHasher
+    from backend.src.utils import validation_utils
+
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("Secret#123")
+    hasher = PasswordHasher(workers=1, max_queue=0)
+    try:
+        valid, new_hash = asyncio.run(hasher.verify_and_update("Secret#123", old_hash))
+        assert valid and new_hash is not None
+        assert validation_utils.verify_password("Secret#123", new_hash)
+        assert asyncio.run(hasher.verify_and_update("wrong", old_hash)) == (False, None)
+    finally:
+        hasher.shutdown()
+
+
+def test_update_password_hash(db_service: DatabaseService, sqlite_session):
+    from backend.src.db_models import UserTable
+
+    _seed_marketplace(sqlite_session, 0)
+    db_service.update_password_hash(2, "new-hash", sqlite_session)
+    sqlite_session.expire_all()
+    assert sqlite_session.get(UserTable, 2).password == "new-hash"
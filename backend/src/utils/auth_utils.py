@@ -1,12 +1,24 @@
 import jwt,os
 import datetime
+import time
 from fastapi import HTTPException, status
 from dotenv import load_dotenv
+from backend.src.cache import ResponseCache
+from backend.src.settings import settings
 load_dotenv()
 SECRET_KEY =  os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 120))  
 
+# Tokens já verificados -> payload. Evita repetir a verificação HMAC do jwt.decode
+# nos vários pedidos que o frontend faz com o mesmo token. Cada entrada expira no
+# `exp` do token (ou antes, pelo TTL da cache); tokens inválidos nunca são guardados.
+token_cache = ResponseCache(
+    max_entries=settings.token_cache_max_entries,
+    ttl=settings.token_cache_ttl,
+    enabled=settings.token_cache_enabled,
+)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -15,8 +27,19 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 def decode_access_token(token: str):
+    if token_cache.enabled:
+        cached = token_cache.get(token)
+        if cached is not None:
+            # Cópia, para que quem chama não altere o payload guardado
+            return dict(cached)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if token_cache.enabled:
+            ttl = token_cache.ttl
+            if "exp" in payload:
+                ttl = min(ttl, payload["exp"] - time.time())
+            if ttl > 0:
+                token_cache.set(token, dict(payload), ttl=ttl)
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
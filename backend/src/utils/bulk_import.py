@@ -0,0 +1,235 @@
+"""
+Importação em massa do catálogo de skins a partir de um upload em streaming.
+
+O corpo do pedido (CSV com cabeçalho ou NDJSON, um objeto por linha) é lido
+bloco a bloco e processado linha a linha; as linhas válidas acumulam-se em
+lotes de tamanho fixo que são aplicados (e confirmados) pelo DatabaseService.
+A memória usada depende apenas do tamanho do lote, do tamanho máximo de uma
+linha e do número máximo de erros guardados no relatório, não do tamanho do
+ficheiro.
+
+Cada linha tem uma operação (coluna/campo `op`):
+
+- `create` (por omissão sem `id`): validada com CreateSkinRequest;
+- `update` (por omissão com `id`): validada com EditSkinRequest, altera apenas
+  os campos presentes;
+- `delete`: apenas `id`.
+"""
+import codecs
+import csv
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from pydantic import ValidationError
+
+from backend.src.models import CreateSkinRequest, EditSkinRequest
+
+FORMATS = ("csv", "ndjson")
+OPERATIONS = ("create", "update", "delete")
+
+
+class ImportRow(NamedTuple):
+    """Linha validada: número da linha no ficheiro, operação, id (update/delete) e campos."""
+    line: int
+    op: str
+    skin_id: Optional[int]
+    fields: Dict[str, Any]
+
+
+class ImportFormatError(ValueError):
+    """O ficheiro não pode continuar a ser lido (cabeçalho em falta, linha demasiado longa...)."""
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[str]:
+    """Divide um stream de bytes UTF-8 em linhas, sem juntar o corpo inteiro em memória."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+        if len(pending) > max_line_bytes:
+            raise ImportFormatError(f"Linha com mais de {max_line_bytes} bytes")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_csv_records(lines: AsyncIterator[str], max_line_bytes: int) -> AsyncIterator[Tuple[int, Dict]]:
+    """
+    Registos CSV (dicts pelo cabeçalho). Um campo entre aspas pode conter quebras
+    de linha: as linhas são juntadas enquanto o número de aspas for ímpar.
+    """
+    header: Optional[List[str]] = None
+    record, start, line_number = "", 0, 0
+    async for line in lines:
+        line_number += 1
+        if not record:
+            start = line_number
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            if len(record) > max_line_bytes:
+                raise ImportFormatError(f"Linha {start}: campo entre aspas sem fim")
+            continue
+        if not record:
+            continue
+        values, record = next(csv.reader([record])), ""
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield start, {"__error__": f"Esperadas {len(header)} colunas, encontradas {len(values)}"}
+            continue
+        # Campos vazios contam como ausentes
+        yield start, {name: value for name, value in zip(header, values) if value != ""}
+    if record:
+        raise ImportFormatError(f"Linha {start}: campo entre aspas sem fim")
+    if header is None:
+        raise ImportFormatError("Ficheiro CSV sem cabeçalho")
+
+
+async def iter_ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Dict]]:
+    """Registos NDJSON (um objeto JSON por linha; linhas vazias são ignoradas)."""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, {"__error__": f"JSON inválido: {e}"}
+            continue
+        if not isinstance(record, dict):
+            yield line_number, {"__error__": "Cada linha deve ser um objeto JSON"}
+            continue
+        yield line_number, record
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors())
+
+
+def parse_record(line: int, record: Dict) -> ImportRow:
+    """Valida um registo contra CreateSkinRequest/EditSkinRequest. Levanta ValueError com o motivo."""
+    if "__error__" in record:
+        raise ValueError(record["__error__"])
+    record = dict(record)
+    raw_id = record.pop("id", None)
+    op = record.pop("op", None) or ("create" if raw_id is None else "update")
+    if op not in OPERATIONS:
+        raise ValueError(f"Operação inválida: {op} (esperado {', '.join(OPERATIONS)})")
+
+    skin_id = None
+    if op != "create":
+        try:
+            skin_id = int(raw_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{op}' requer um id inteiro") from None
+
+    try:
+        if op == "create":
+            fields = CreateSkinRequest.model_validate(record).model_dump()
+        elif op == "update":
+            fields = EditSkinRequest.model_validate(record).model_dump(exclude_none=True)
+            if not fields:
+                raise ValueError("'update' sem campos a alterar")
+        else:
+            fields = {}
+    except ValidationError as e:
+        raise ValueError(_validation_message(e)) from None
+    return ImportRow(line, op, skin_id, fields)
+
+
+class ImportReport:
+    """Contadores e erros por linha de uma importação (a lista de erros é limitada)."""
+
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.started = time.perf_counter()
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors: List[Dict] = []
+        self.aborted: Optional[str] = None
+
+    def error(self, line: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "processed": self.processed,
+            "created": self.created,
+            "updated": self.updated,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "aborted": self.aborted,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_second": round(self.processed / elapsed, 1) if elapsed else None,
+        }
+
+
+async def import_skins(
+    chunks: AsyncIterator[bytes],
+    import_format: str,
+    apply_batch: Callable[[List[ImportRow]], Awaitable[Dict]],
+    batch_size: int,
+    max_line_bytes: int,
+    max_errors: int,
+) -> Dict:
+    """
+    Lê, valida e aplica uma importação. `apply_batch` recebe um lote de linhas
+    válidas e devolve {"created", "updated", "deleted", "errors": [(linha, motivo)]}.
+
+    Um id repetido dentro do mesmo lote força a aplicação do lote pendente, para
+    que as operações sobre a mesma skin sejam aplicadas pela ordem do ficheiro.
+    """
+    report = ImportReport(max_errors)
+    lines = iter_lines(chunks, max_line_bytes)
+    records = iter_csv_records(lines, max_line_bytes) if import_format == "csv" else iter_ndjson_records(lines)
+    batch: List[ImportRow] = []
+    batch_ids = set()
+
+    async def flush():
+        result = await apply_batch(batch)
+        report.batches += 1
+        report.created += result["created"]
+        report.updated += result["updated"]
+        report.deleted += result["deleted"]
+        for line, message in result["errors"]:
+            report.error(line, message)
+        batch.clear()
+        batch_ids.clear()
+
+    try:
+        async for line, record in records:
+            report.processed += 1
+            try:
+                row = parse_record(line, record)
+            except ValueError as e:
+                report.error(line, str(e))
+                continue
+            if row.skin_id is not None:
+                if row.skin_id in batch_ids:
+                    await flush()
+                batch_ids.add(row.skin_id)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                await flush()
+    except ImportFormatError as e:
+        # Os lotes já aplicados ficam confirmados; as linhas pendentes também são aplicadas
+        report.aborted = str(e)
+    if batch:
+        await flush()
+    return report.as_dict()
@@ -0,0 +1,52 @@
+"""
+Serialização JSON rápida para os endpoints de leitura.
+
+Usa o orjson, dependência do projeto (codifica dicts, listas, datas e floats em
+C, diretamente para bytes). Num ambiente sem ele, recorre ao json da biblioteca
+padrão com o mesmo formato de saída (compacto, UTF-8, datas em ISO 8601).
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, Mapping
+
+try:
+    import orjson
+except ImportError:  # ambiente sem as dependências do pyproject
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def _default(value: Any) -> Any:
+    # Mesmo formato que o jsonable_encoder do FastAPI para datas
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Tipo não serializável em JSON: {type(value).__name__}")
+
+
+if orjson is not None:
+    def dumps(value: Any) -> bytes:
+        """Serializa um valor em JSON (bytes)."""
+        return orjson.dumps(value, default=_default)
+else:
+    def dumps(value: Any) -> bytes:
+        """Serializa um valor em JSON (bytes)."""
+        return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def dumps_rows(rows: Iterable[Any]) -> bytes:
+    """
+    Serializa linhas do SQLAlchemy (Row) como um array JSON de objetos, sem
+    passar por entidades ORM nem por validação Pydantic.
+    """
+    return dumps([row._asdict() for row in rows])
+
+
+def dumps_envelope(fields: Mapping[str, Any], key: str, items_json: bytes) -> bytes:
+    """
+    Objeto JSON com `fields` e, em `key`, um array já serializado
+    (ex.: {"message": ..., "skins": [...]}), sem voltar a codificar os itens.
+    """
+    head = dumps(dict(fields))
+    separator = b"," if len(head) > 2 else b""
+    return head[:-1] + separator + dumps(key) + b":" + items_json + b"}"
@@ -0,0 +1,35 @@
+import base64
+import json
+from typing import Any, Tuple
+
+# Colunas pelas quais o marketplace pode ser ordenado (nome público -> chave do cursor)
+MARKETPLACE_SORT_FIELDS = ("price", "listed_at")
+SORT_ORDERS = ("asc", "desc")
+
+
+def encode_cursor(sort: str, order: str, last_value: Any, last_id: int) -> str:
+    """
+    Gera um cursor opaco (base64 url-safe) a partir do último registo de uma página.
+
+    O cursor guarda a ordenação usada para que não possa ser reutilizado
+    com outra ordenação (o que daria resultados incoerentes).
+    """
+    payload = json.dumps([sort, order, last_value, last_id], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple[Any, int]:
+    """
+    Descodifica um cursor gerado por `encode_cursor`.
+
+    Devolve o par (último valor da chave de ordenação, último id).
+    Levanta ValueError se o cursor for inválido ou de outra ordenação.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_order, last_value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
+    if cursor_sort != sort or cursor_order != order or not isinstance(last_id, int):
+        raise ValueError("Cursor não corresponde à ordenação pedida")
+    return last_value, last_id
@@ -0,0 +1,32 @@
+import random
+from sqlalchemy.exc import DBAPIError
+
+# SQLSTATEs do Postgres que indicam um conflito transitório entre transações:
+# 40001 serialization_failure, 40P01 deadlock_detected, 55P03 lock_not_available (NOWAIT)
+RETRYABLE_SQLSTATES = {"40001", "40P01", "55P03"}
+
+
+def is_retryable_db_error(error: BaseException) -> bool:
+    """
+    Indica se um erro da base de dados resulta de contenção entre transações
+    e pode ser resolvido repetindo a transação inteira.
+    """
+    if not isinstance(error, DBAPIError):
+        return False
+    original = error.orig
+    # psycopg2 expõe `pgcode`, asyncpg/psycopg3 expõem `sqlstate`
+    sqlstate = getattr(original, "pgcode", None) or getattr(original, "sqlstate", None)
+    if sqlstate in RETRYABLE_SQLSTATES:
+        return True
+    # SQLite (desenvolvimento/testes): escrita concorrente bloqueada
+    return "database is locked" in str(original)
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Tempo de espera antes da tentativa `attempt` (0 = primeira repetição).
+
+    Backoff exponencial limitado com "full jitter", para que compradores em
+    conflito não voltem a colidir todos no mesmo instante.
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
@@ -0,0 +1,124 @@
+"""
+Índice em memória dos termos pesquisáveis do catálogo (nomes e tipos de skins).
+
+O vocabulário (valores distintos de `name` e `type`) é pequeno comparado com o
+número de skins, pelo que cabe em memória e é servido a partir da cache de
+respostas:
+
+- autocomplete: uma trie com o termo normalizado a partir de cada palavra
+  ("gamma doppler" e "doppler"), pelo que "dop" sugere "Gamma Doppler";
+- pesquisa tolerante a erros: índice invertido de trigramas com a mesma regra
+  do pg_trgm (palavras com dois espaços antes e um depois) e similaridade
+  |A ∩ B| / |A ∪ B|. Em Postgres a pesquisa de linhas usa o próprio pg_trgm
+  (índice GIN); este índice é o fallback para SQLite e testes.
+"""
+import re
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+_WORD = re.compile(r"[^\W_]+")
+
+# Bónus somado à similaridade quando o termo começa (numa palavra) pela pesquisa,
+# para que os prefixos fiquem sempre à frente das correspondências aproximadas
+PREFIX_BONUS = 1.0
+
+
+def normalize(text: str) -> str:
+    """Minúsculas e apenas palavras alfanuméricas separadas por um espaço."""
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class _TrieNode:
+    __slots__ = ("children", "terms")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.terms: Set[str] = set()
+
+
+class TermIndex:
+    """Trie de prefixos e índice de trigramas sobre um conjunto de termos."""
+
+    def __init__(self, terms: Iterable[str]):
+        self._root = _TrieNode()
+        self._trigrams: Dict[str, FrozenSet[str]] = {}
+        self._postings: Dict[str, List[str]] = {}
+        for term in set(terms):
+            words = normalize(term or "").split()
+            if not words:
+                continue
+            grams = trigrams(term)
+            self._trigrams[term] = grams
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(term)
+            for start in range(len(words)):
+                self._insert(" ".join(words[start:]), term)
+
+    def __len__(self) -> int:
+        return len(self._trigrams)
+
+    def _insert(self, key: str, term: str) -> None:
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+        node.terms.add(term)
+
+    def _prefixed(self, prefix: str) -> Set[str]:
+        """Termos com uma palavra (e o resto do termo a partir dela) a começar por `prefix`."""
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        found, stack = set(), [node]
+        while stack:
+            node = stack.pop()
+            found.update(node.terms)
+            stack.extend(node.children.values())
+        return found
+
+    def autocomplete(self, prefix: str, limit: int) -> List[str]:
+        """
+        Sugestões para `prefix`: primeiro os termos que começam por ele, depois os
+        que têm uma palavra interior a começar por ele; os mais curtos primeiro.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        ranked = sorted(self._prefixed(prefix),
+                        key=lambda term: (not normalize(term).startswith(prefix), len(term), term.lower()))
+        return ranked[:limit]
+
+    def match(self, query: str, min_similarity: float) -> List[Tuple[str, float]]:
+        """
+        Termos que correspondem à pesquisa, com a pontuação, da melhor para a pior:
+        similaridade de trigramas (>= min_similarity) mais PREFIX_BONUS se o termo
+        tiver uma palavra a começar pela pesquisa.
+        """
+        grams = trigrams(query)
+        shared = Counter(term for gram in grams for term in self._postings.get(gram, ()))
+        scores = {}
+        for term, count in shared.items():
+            score = count / (len(grams) + len(self._trigrams[term]) - count)
+            if score >= min_similarity:
+                scores[term] = score
+        normalized = normalize(query)
+        if normalized:
+            for term in self._prefixed(normalized):
+                scores[term] = PREFIX_BONUS + similarity(grams, self._trigrams[term])
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
@@ -1,15 +1,48 @@
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import Depends, HTTPException
+from sqlalchemy.orm import Session
 from backend.src.utils.auth_utils import decode_access_token
+from backend.src.models import Identity
+from backend.src.database import DatabaseService, get_db, read_router
 
 security = HTTPBearer()
+db_service = DatabaseService()
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     payload = decode_access_token(token)
     return payload  # pode retornar o email, role, etc.
 
+def get_current_identity(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)) -> Identity:
+    """
+    Identidade do pedido (id, email, role) a partir do token.
+
+    O id vem da claim "uid", pelo que não há consulta à base de dados. Tokens
+    emitidos antes desta claim existir são resolvidos pelo email.
+    """
+    user_id = current_user.get("uid")
+    if user_id is None:
+        user = db_service.get_user_by_email(current_user["sub"], db)
+        if not user:
+            raise HTTPException(status_code=401, detail="Utilizador não encontrado")
+        user_id = user.id
+    # Escritas confirmadas nesta sessão contam para o read-your-writes deste utilizador
+    db.info["user_id"] = user_id
+    return Identity(user_id=user_id, email=current_user["sub"], role=current_user.get("role") or "player")
+
+def get_read_db(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Sessão para endpoints só de leitura: uma réplica, se configuradas, exceto logo
+    após uma escrita do mesmo utilizador (read-your-writes), em que é a do primário.
+    """
+    session = read_router.read_session(current_user.get("uid"), db)
+    try:
+        yield session
+    finally:
+        if session is not db:
+            session.close()
+
 def get_current_admin_user(current_user: dict = Depends(get_current_user)):
     if current_user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Access forbidden: Admins only")
-    return current_user
\ No newline at end of file
+    return current_user
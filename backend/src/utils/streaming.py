@@ -0,0 +1,45 @@
+from typing import Dict, Iterable, Iterator
+from backend.src.utils.fast_json import dumps as _encode
+
+# Tamanho mínimo de cada bloco enviado ao cliente (evita um write por linha)
+STREAM_CHUNK_BYTES = 64 * 1024
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _chunks(parts: Iterable[bytes], chunk_bytes: int) -> Iterator[bytes]:
+    buffer = bytearray()
+    for part in parts:
+        buffer += part
+        if len(buffer) >= chunk_bytes:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def json_array_stream(rows: Iterable[Dict], chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """Serializa as linhas como um único array JSON, emitido em blocos à medida que são lidas."""
+    def parts():
+        yield b"["
+        for index, row in enumerate(rows):
+            if index:
+                yield b","
+            yield _encode(row)
+        yield b"]"
+    return _chunks(parts(), chunk_bytes)
+
+
+def ndjson_stream(rows: Iterable[Dict], chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """Serializa as linhas em NDJSON (um objeto JSON por linha)."""
+    return _chunks((_encode(row) + b"\n" for row in rows), chunk_bytes)
+
+
+def encode_stream(rows: Iterable[Dict], stream_format: str) -> Iterator[bytes]:
+    """Escolhe o serializador pelo formato pedido ("json" ou "ndjson")."""
+    if stream_format == "ndjson":
+        return ndjson_stream(rows)
+    return json_array_stream(rows)
@@ -1,6 +1,9 @@
 from passlib.context import CryptContext
+from backend.src.settings import settings
 import re
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# O custo do bcrypt vem do Settings; hashes com outro custo são marcados para
+# atualização (needs_update / verify_and_update) e refeitos no próximo login.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.password_bcrypt_rounds)
 
 def hash_password(password: str) -> str:
     if isinstance(password, tuple) and len(password) > 0:
@@ -22,6 +25,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """
+    Verifica a password e, se o hash tiver sido feito com outro custo,
+    devolve também o novo hash: (válida, novo_hash_ou_None).
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 
 def validate_email_format(email: str) -> bool:
     # Simple email format validation
@@ -223,29 +223,103 @@ export async function getMarketplace() {
   const data = await response.json();
   if (!response.ok) throw new Error(data.detail || "Erro ao obter skins.");
 
-  const mapped = (data || []).map((s) => {
-    const knife = s.type || "";
-    const skin = s.name || "";
-
-    const displayName =
-      `${knife.charAt(0).toUpperCase() + knife.slice(1)} ` +
-      `${skin.charAt(0).toUpperCase() + skin.slice(1)}`;
-
-    return {
-      id: s.id,
-      name: displayName,
-      knifeType: knife,
-      skinType: skin,
-      float: s.float_value || "Unknown",
-      value: s.value ?? 0,
-      link: s.link || "/path/to/placeholder.png",
-    };
-  });
+  const mapped = (data || []).map(mapMarketplaceSkin);
 
   console.log(mapped);
   return mapped;
 }
 
+export function mapMarketplaceSkin(s) {
+  const knife = s.type || "";
+  const skin = s.name || "";
+
+  const displayName =
+    `${knife.charAt(0).toUpperCase() + knife.slice(1)} ` +
+    `${skin.charAt(0).toUpperCase() + skin.slice(1)}`;
+
+  return {
+    id: s.id,
+    name: displayName,
+    knifeType: knife,
+    skinType: skin,
+    float: s.float_value || "Unknown",
+    value: s.value ?? 0,
+    link: s.link || "/path/to/placeholder.png",
+  };
+}
+
+// -----------------------------
+// FEED EM TEMPO REAL DO MARKETPLACE (SSE)
+// -----------------------------
+// Usa fetch em vez de EventSource para enviar o token no header Authorization.
+// Volta a ligar-se sozinho (com Last-Event-ID) e devolve uma função para parar.
+export function subscribeMarketplaceEvents(onEvent) {
+  const controller = new AbortController();
+  let lastEventId = null;
+
+  async function connect() {
+    while (!controller.signal.aborted) {
+      try {
+        const headers = { Authorization: `Bearer ${getToken()}` };
+        if (lastEventId !== null) headers["Last-Event-ID"] = lastEventId;
+
+        const response = await fetch(`${API_BASE_URL}/marketplace/events`, {
+          headers,
+          signal: controller.signal,
+        });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = "";
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+
+          let boundary;
+          while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const event = parseSseMessage(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+            if (!event) continue;
+
+            // Depois de um resync o cliente recarrega tudo: não há eventos a repor
+            lastEventId = event.type === "resync" ? null : event.id ?? lastEventId;
+            onEvent(event.type, event.data);
+          }
+        }
+        continue; // ligação terminada pelo servidor: volta a ligar de imediato
+      } catch (err) {
+        if (controller.signal.aborted) return;
+        console.error("Feed do marketplace interrompido:", err);
+      }
+      await new Promise((resolve) => setTimeout(resolve, 3000));
+    }
+  }
+
+  connect();
+  return () => controller.abort();
+}
+
+function parseSseMessage(message) {
+  let id = null;
+  let type = "message";
+  let data = "";
+
+  for (const line of message.split("\n")) {
+    if (!line || line.startsWith(":")) continue; // comentário (keepalive)
+    const sep = line.indexOf(":");
+    const field = sep === -1 ? line : line.slice(0, sep);
+    const value = sep === -1 ? "" : line.slice(sep + 1).replace(/^ /, "");
+
+    if (field === "id") id = value;
+    else if (field === "event") type = value;
+    else if (field === "data") data += value;
+  }
+
+  if (!data) return null;
+  return { id, type, data: JSON.parse(data) };
+}
+
 // -----------------------------
 // COMPRAR SKIN
 // -----------------------------
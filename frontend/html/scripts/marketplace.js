@@ -6,6 +6,8 @@ import {
   getUserByEmail,
   getMyMarketplace,
   removeSkin,
+  mapMarketplaceSkin,
+  subscribeMarketplaceEvents,
 } from "./api.js";
 import "./dropdown_style.js";
 import "./main.js";
@@ -183,6 +185,24 @@ function renderList(list) {
   });
 }
 
+// Aplica os eventos do feed em tempo real à lista carregada no início
+async function handleMarketEvent(type, data) {
+  if (type === "listing-added") {
+    // O marketplace não mostra as listagens do próprio utilizador
+    const payload = JSON.parse(atob(getToken().split(".")[1]));
+    if (data.owner_id === payload.uid) return;
+    skins = skins.filter((s) => s.id !== data.id).concat(mapMarketplaceSkin(data));
+  } else if (type === "listing-removed" || type === "listing-sold") {
+    skins = skins.filter((s) => s.id !== data.id);
+  } else if (type === "resync") {
+    skins = await getMarketplace();
+    populateDropdowns(skins);
+  } else {
+    return;
+  }
+  applyFilters();
+}
+
 function handleBuyClick(skin) {
   if (!getToken()) {
     return Swal.fire({
@@ -311,4 +331,5 @@ document.addEventListener("DOMContentLoaded", async () => {
   populateDropdowns(skins);
   applyFilters();
   setupModalEvents();
+  subscribeMarketplaceEvents(handleMarketEvent);
 });
@@ -34,6 +34,32 @@ resource "kubernetes_deployment_v1" "api" {
             value = "/app"
           }
 
+          # Pool de ligações dimensionado para o limite de 500m CPU (1 worker uvicorn)
+          env {
+            name  = "DATABASE_POOL_SIZE"
+            value = "5"
+          }
+
+          env {
+            name  = "DATABASE_MAX_OVERFLOW"
+            value = "5"
+          }
+
+          env {
+            name  = "DATABASE_POOL_TIMEOUT"
+            value = "10"
+          }
+
+          env {
+            name  = "DATABASE_POOL_PRE_PING"
+            value = "true"
+          }
+
+          env {
+            name  = "DATABASE_POOL_RECYCLE"
+            value = "1800"
+          }
+
           env_from {
             secret_ref {
               name = kubernetes_secret_v1.cstrader-env.metadata[0].name